@@ -174,10 +174,33 @@ class RealAIService:
                 logger.error("No pixel data found in DICOM file")
                 return None
 
+            # Value range precomputed at ingest saves two passes over the pixels
+            from .pixel_stats import stats_for_file
+
+            stats = stats_for_file(dicom_path, str(ds.get("SOPInstanceUID", "")))
+            bounds = None
+            if stats:
+                # Statistics are in modality units, the array holds stored values
+                slope = float(ds.get("RescaleSlope", 1) or 1)
+                intercept = float(ds.get("RescaleIntercept", 0) or 0)
+                bounds = np.rint(
+                    (np.array([stats["min"], stats["max"]]) - intercept) / slope
+                ).astype(img.dtype)
+
             if hasattr(ds, "WindowCenter") and hasattr(ds, "WindowWidth"):
                 img = apply_voi_lut(img, ds)
+                if bounds is not None:
+                    # The VOI transform is monotonic, so it maps the range bounds
+                    bounds = apply_voi_lut(bounds, ds)
+
+            if bounds is not None:
+                low, high = float(bounds.min()), float(bounds.max())
+            else:
+                low, high = float(img.min()), float(img.max())
 
-            img = ((img - img.min()) / (img.max() - img.min()) * 255).astype(np.uint8)
+            img = (
+                (np.clip(img, low, high) - low) / max(high - low, 1e-6) * 255
+            ).astype(np.uint8)
 
             img = cv2.resize(img, (224, 224))
 
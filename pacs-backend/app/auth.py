@@ -4,14 +4,16 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import pyotp
 import qrcode
 import io
 import base64
 import secrets
 import json
-from .database import get_db, User, UserRole
+from .database import get_async_db, User, UserRole
+from .replicas import request_user
 from .session_manager import session_manager
 
 import os
@@ -86,17 +88,20 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
 
 
-def get_current_user(
-    username: str = Depends(verify_token), db: Session = Depends(get_db)
+async def get_current_user(
+    username: str = Depends(verify_token), db: AsyncSession = Depends(get_async_db)
 ):
     # Clean up expired sessions periodically
     session_manager.cleanup_expired_sessions()
 
-    user = db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
         )
+    # Lets read sessions keep this user on the primary after their own writes
+    request_user.set(user.username)
     return user
 
 
@@ -0,0 +1,326 @@
+"""
+Two-level cache for study files.
+
+Instances and derived artifacts live in the upload storage, which may be a slow
+disk or a mounted object store. Reads go through :data:`instance_cache`:
+
+* a byte-budgeted in-process LRU holds recently read files in memory;
+* entries evicted from memory spill into a byte-budgeted local directory
+  (``HOT_CACHE_DIR``, ideally SSD), which prefetch also warms directly.
+
+Both tiers are keyed by the storage path and are only trusted while the cached
+copy is not older than the source. Disk copies looked up within
+``HOT_CACHE_LEASE_SECONDS`` survive eviction, so a returned path can still be
+opened. One-off bulk reads (study downloads) use
+:meth:`TieredCache.resolve` or ``admit=False`` so they do not flush the
+working set.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from .monitoring import CACHE_BYTES, CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+HOT_CACHE_DIR = os.getenv(
+    "HOT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pacs-hot-cache")
+)
+HOT_CACHE_MAX_BYTES = int(os.getenv("HOT_CACHE_MAX_BYTES", str(10 * 1024**3)))
+# A hot copy looked up this recently is not evicted, so a path handed out by
+# resolve() still exists when the response (in any process) opens it
+HOT_CACHE_LEASE_SECONDS = float(os.getenv("HOT_CACHE_LEASE_SECONDS", "60"))
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(256 * 1024**2)))
+# Larger files are streamed from disk rather than held in memory
+MEMORY_CACHE_MAX_ITEM_BYTES = int(
+    os.getenv("MEMORY_CACHE_MAX_ITEM_BYTES", str(32 * 1024**2))
+)
+
+
+def _source_version(source_path: str):
+    """(size, mtime) of a storage file, or None if it is missing"""
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+class MemoryCache:
+    """Least-recently-used byte cache with a total size budget"""
+
+    tier = "memory"
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def admits(self, size: int) -> bool:
+        return 0 < size <= min(self.max_item_bytes, self.max_bytes)
+
+    def get(self, key: str, version) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def discard(self, key: str):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            CACHE_BYTES.labels(tier=self.tier).set(self._bytes)
+
+    def put(self, key: str, version, data: bytes) -> list:
+        """Store an entry; returns the evicted (key, version, data) entries"""
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (version, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, (old_version, old_data) = self._entries.popitem(last=False)
+                self._bytes -= len(old_data)
+                evicted.append((old_key, old_version, old_data))
+            CACHE_BYTES.labels(tier=self.tier).set(self._bytes)
+        if evicted:
+            CACHE_EVICTIONS.labels(tier=self.tier).inc(len(evicted))
+        return evicted
+
+
+class HotCache:
+    """Local mirror of storage files with a total size budget, keyed by storage path"""
+
+    tier = "disk"
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, source_path: str, variant: str = "") -> str:
+        digest = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()
+        name = digest
+        if variant:
+            # Variants share the source's digest prefix, so discard() finds them
+            name += "-" + hashlib.sha1(variant.encode()).hexdigest()[:16]
+        ext = os.path.splitext(source_path)[1]
+        return os.path.join(self.root, digest[:2], name + ext)
+
+    def _load_index(self):
+        """Index files left by earlier runs, oldest access first (lock held)"""
+        if self._index is not None:
+            return
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_atime, path, stat.st_size))
+        self._index = OrderedDict((path, size) for _, path, size in sorted(files))
+        self._bytes = sum(self._index.values())
+
+    def _touch(self, path: str):
+        # The mtime is the lease, seen by other processes sharing the directory
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._load_index()
+            if path in self._index:
+                self._index.move_to_end(path)
+
+    @staticmethod
+    def _leased(path: str, since: float) -> bool:
+        try:
+            return os.stat(path).st_mtime > since
+        except OSError:
+            return False
+
+    def _add(self, path: str, size: int):
+        with self._lock:
+            self._load_index()
+            self._bytes += size - self._index.pop(path, 0)
+            self._index[path] = size
+            # Oldest first, skipping leased copies; the budget may be exceeded
+            # until their leases run out
+            since = time.time() - HOT_CACHE_LEASE_SECONDS
+            excess = self._bytes - self.max_bytes
+            evicted = []
+            for old_path, old_size in self._index.items():
+                if excess <= 0 or old_path == path:
+                    break
+                if not self._leased(old_path, since):
+                    evicted.append(old_path)
+                    excess -= old_size
+            for old_path in evicted:
+                self._bytes -= self._index.pop(old_path)
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+            CACHE_BYTES.labels(tier=self.tier).set(self._bytes)
+        if evicted:
+            CACHE_EVICTIONS.labels(tier=self.tier).inc(len(evicted))
+
+    def discard(self, source_path: str):
+        """Remove the copies of ``source_path`` and of its variants"""
+        plain = self._path(source_path)
+        directory = os.path.dirname(plain)
+        digest = os.path.splitext(os.path.basename(plain))[0]
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        with self._lock:
+            self._load_index()
+            for name in names:
+                if not name.startswith(digest) or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                self._bytes -= self._index.pop(path, 0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            CACHE_BYTES.labels(tier=self.tier).set(self._bytes)
+
+    def lookup(self, source_path: str, variant: str = "") -> Optional[str]:
+        """
+        Local copy of ``source_path`` if cached and not older than the source.
+        ``variant`` names a derived encoding of the file (e.g. a transcoded
+        transfer syntax) cached alongside the plain copy.
+        """
+        path = self._path(source_path, variant)
+        try:
+            cached = os.stat(path)
+            source = os.stat(source_path)
+        except OSError:
+            return None
+        if cached.st_mtime < source.st_mtime:
+            return None
+        if not variant and cached.st_size != source.st_size:
+            return None
+        self._touch(path)
+        return path
+
+    def resolve(self, source_path: str) -> str:
+        """Path to read ``source_path`` from: the hot copy if any, else the source"""
+        path = self.lookup(source_path)
+        if path:
+            CACHE_HITS.labels(tier=self.tier).inc()
+            return path
+        CACHE_MISSES.labels(tier=self.tier).inc()
+        return source_path
+
+    def _write(self, path: str, writer) -> bool:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Unable to write cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self._add(path, os.path.getsize(path))
+        return True
+
+    def warm(self, source_path: str) -> Optional[str]:
+        """Copy a storage file into the hot tier"""
+        path = self.lookup(source_path)
+        if path:
+            return path
+        if not os.path.exists(source_path):
+            return None
+        path = self._path(source_path)
+        if not self._write(path, lambda tmp: shutil.copy2(source_path, tmp)):
+            return None
+        return path
+
+    def put(self, source_path: str, data: bytes, variant: str = ""):
+        """Store bytes read from ``source_path``, or a variant derived from it"""
+        if self.lookup(source_path, variant):
+            return
+
+        def writer(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+
+        self._write(self._path(source_path, variant), writer)
+
+
+class TieredCache:
+    """Memory LRU in front of the hot disk tier, in front of storage"""
+
+    def __init__(self, memory: MemoryCache, disk: HotCache):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, source_path: str, admit: bool = True) -> Optional[bytes]:
+        """
+        Contents of a storage file, or None when it is too large to hold in
+        memory (callers then stream from :meth:`resolve`). With ``admit=False``
+        a miss is read without being cached.
+        """
+        version = _source_version(source_path)
+        if version is None:
+            raise FileNotFoundError(source_path)
+
+        data = self.memory.get(source_path, version)
+        if data is not None:
+            CACHE_HITS.labels(tier=self.memory.tier).inc()
+            return data
+        CACHE_MISSES.labels(tier=self.memory.tier).inc()
+
+        if not self.memory.admits(version[0]):
+            return None
+
+        with open(self.disk.resolve(source_path), "rb") as f:
+            data = f.read()
+
+        if admit:
+            for old_path, old_version, old_data in self.memory.put(
+                source_path, version, data
+            ):
+                # Spill what memory drops so the next reader still avoids storage
+                if _source_version(old_path) == old_version:
+                    self.disk.put(old_path, old_data)
+        return data
+
+    def resolve(self, source_path: str) -> str:
+        return self.disk.resolve(source_path)
+
+    def discard(self, source_path: str):
+        """Forget a storage file that was deleted, in both tiers"""
+        self.memory.discard(source_path)
+        self.disk.discard(source_path)
+
+
+hot_cache = HotCache(HOT_CACHE_DIR, HOT_CACHE_MAX_BYTES)
+instance_cache = TieredCache(
+    MemoryCache(MEMORY_CACHE_MAX_BYTES, MEMORY_CACHE_MAX_ITEM_BYTES), hot_cache
+)
@@ -1,7 +1,10 @@
 from celery import Celery
 import os
 from .ai_service import RealAIService
-from .database import SessionLocal, Study
+from .database import DicomFile, SessionLocal, Study
+from .rollups import ROLLUP_RECONCILE_SECONDS, reconcile_rollups
+# Importing the worklist also keeps it current on task writes
+from .worklist import WORKLIST_RECONCILE_SECONDS, reconcile_worklist
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +21,16 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    beat_schedule={
+        "reconcile-dashboard-rollups": {
+            "task": "app.celery_app.reconcile_dashboard_rollups",
+            "schedule": ROLLUP_RECONCILE_SECONDS,
+        },
+        "reconcile-worklist": {
+            "task": "app.celery_app.reconcile_worklist_entries",
+            "schedule": WORKLIST_RECONCILE_SECONDS,
+        },
+    },
 )
 
 
@@ -46,6 +59,137 @@ def process_dicom_study_async(study_id: int):
         db.close()
 
 
+@celery_app.task
+def postprocess_study_async(study_id: str):
+    """Generate derived artifacts (thumbnails, statistics, metadata, pyramids, volumes) for a newly ingested study"""
+    from .thumbnails import generate_study_thumbnails
+    from .pixel_stats import generate_study_pixel_stats
+    from .study_metadata import ensure_study_metadata
+    from .pyramid import generate_study_pyramids
+    from .volume import generate_study_volumes
+
+    db = SessionLocal()
+    try:
+        study = db.query(Study).filter(Study.id == study_id).first()
+        if not study:
+            logger.error(f"Study {study_id} not found")
+            return
+
+        # Each step is independent; one failing must not skip the others
+        for step in (
+            generate_study_thumbnails,
+            # Statistics feed the metadata document, so they come first
+            generate_study_pixel_stats,
+            ensure_study_metadata,
+            generate_study_pyramids,
+            generate_study_volumes,
+        ):
+            try:
+                step(db, study)
+            except Exception as e:
+                logger.error(f"{step.__name__} failed for study {study_id}: {e}")
+
+        logger.info(f"Post-ingest processing completed for study {study_id}")
+
+    except Exception as e:
+        logger.error(f"Error post-processing study {study_id}: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def build_series_volume_async(study_id: str, series_uid: str):
+    """Assemble one series volume requested by a viewer"""
+    from .volume import build_requested_volume, volume_path
+    from .storage import release_build
+
+    db = SessionLocal()
+    try:
+        study = db.query(Study).filter(Study.id == study_id).first()
+        if not study:
+            logger.error(f"Study {study_id} not found")
+            return
+
+        instances = (
+            db.query(DicomFile)
+            .filter(DicomFile.study_id == study_id, DicomFile.series_uid == series_uid)
+            .all()
+        )
+        if not instances:
+            release_build(volume_path(study, series_uid))
+            return
+        build_requested_volume(study, series_uid, instances)
+
+    except Exception as e:
+        logger.error(f"Error assembling volume {series_uid} of study {study_id}: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def encode_cine_async(
+    study_id: str,
+    source: str,
+    file_ids: list,
+    output_format: str,
+    fps: float = None,
+    window_center: float = None,
+    window_width: float = None,
+):
+    """Encode a series or multi-frame instance cine loop requested by a viewer"""
+    from .cine import cine_params, cine_path, generate_requested_cine
+    from .storage import release_build
+
+    db = SessionLocal()
+    try:
+        study = db.query(Study).filter(Study.id == study_id).first()
+        if not study:
+            logger.error(f"Study {study_id} not found")
+            return
+
+        options = (output_format, fps, window_center, window_width)
+        instances = db.query(DicomFile).filter(DicomFile.id.in_(file_ids)).all()
+        if not instances:
+            release_build(cine_path(study, source, cine_params(*options)))
+            return
+        generate_requested_cine(study, source, instances, *options)
+
+    except Exception as e:
+        logger.error(f"Error encoding cine {source} of study {study_id}: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task
+def reconcile_dashboard_rollups():
+    """Recount the dashboard rollups, correcting any drift from writes they missed"""
+    db = SessionLocal()
+    try:
+        studies, dicom_files = reconcile_rollups(db.connection())
+        db.commit()
+        logger.info(f"Dashboard rollups reconciled: {studies} studies, {dicom_files} files")
+    except Exception as e:
+        logger.error(f"Error reconciling dashboard rollups: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+@celery_app.task
+def reconcile_worklist_entries():
+    """Rebuild the worklist, correcting rows left stale by writes outside the ORM"""
+    db = SessionLocal()
+    try:
+        entries = reconcile_worklist(db.connection())
+        db.commit()
+        logger.info(f"Worklist reconciled: {entries} studies")
+    except Exception as e:
+        logger.error(f"Error reconciling the worklist: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
 @celery_app.task
 def cleanup_old_sessions():
     """Clean up expired sessions and temporary files"""
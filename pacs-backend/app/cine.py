@@ -0,0 +1,275 @@
+"""
+Cine loop export of multi-frame instances and series.
+
+Frames are windowed to 8-bit once (one window for the whole loop, so
+brightness does not flicker) and encoded with OpenCV's VideoWriter. Loops are
+cached under ``derived/cine`` keyed by source and encoding parameters.
+"""
+
+from typing import Iterator, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+
+import cv2
+import numpy as np
+import pydicom
+
+from .database import DicomFile, Study
+from .imaging import (
+    frame_count,
+    get_frame,
+    header_window,
+    is_color,
+    percentile_window,
+    read_dataset,
+    resize_to_fit,
+    window_to_uint8,
+)
+from .pixel_stats import load_study_stats, stats_for_file
+from .series import dominant_slices, geometric_order, slice_sort_key
+from .storage import (
+    derived_dir,
+    inputs_version,
+    record_build_failure,
+    release_build,
+    safe_name,
+)
+
+logger = logging.getLogger(__name__)
+
+# Codecs tried in order; H.264 plays everywhere but needs an encoder build
+CINE_CODECS = {
+    "mp4": ["avc1", "mp4v"],
+    "webm": ["VP80", "VP90"],
+}
+CINE_MEDIA_TYPES = {"mp4": "video/mp4", "webm": "video/webm"}
+CINE_MAX_SIZE = int(os.getenv("CINE_MAX_SIZE", "512"))
+DEFAULT_SERIES_FPS = 10.0
+MAX_FPS = 120.0
+
+
+def cine_params(
+    output_format: str,
+    fps: Optional[float] = None,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+) -> dict:
+    return {
+        "format": output_format,
+        "fps": fps,
+        "window_center": window_center,
+        "window_width": window_width,
+    }
+
+
+def cine_path(study: Study, source: str, params: dict) -> str:
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(
+        derived_dir(study, "cine"), f"{safe_name(source)}-{key}.{params['format']}"
+    )
+
+
+def instance_fps(ds: pydicom.Dataset) -> Optional[float]:
+    """Acquisition frame rate of a multi-frame instance, if recorded"""
+    for keyword in ("CineRate", "RecommendedDisplayFrameRate"):
+        value = ds.get(keyword)
+        if value:
+            return float(value)
+    frame_time = ds.get("FrameTime")
+    if frame_time:
+        return 1000.0 / float(frame_time)
+    return None
+
+
+def _display_frames(
+    frames: Iterator[np.ndarray],
+    ds: pydicom.Dataset,
+    center: Optional[float],
+    width: Optional[float],
+) -> Iterator[np.ndarray]:
+    """8-bit BGR frames, windowed with one window for the whole loop"""
+    color = is_color(ds)
+    invert = str(ds.get("PhotometricInterpretation", "")) == "MONOCHROME1"
+    for pixels in frames:
+        if color:
+            image = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+        else:
+            if center is None or width is None:
+                center, width = percentile_window(pixels)
+            image = cv2.cvtColor(
+                window_to_uint8(pixels, center, width, invert), cv2.COLOR_GRAY2BGR
+            )
+        image = resize_to_fit(image, CINE_MAX_SIZE)
+        # Most encoders need even dimensions
+        height, width_px = image.shape[:2]
+        yield image[: height - height % 2, : width_px - width_px % 2]
+
+
+def _instance_frames(ds: pydicom.Dataset) -> Iterator[np.ndarray]:
+    for index in range(frame_count(ds)):
+        yield get_frame(ds, index)
+
+
+def _series_frames(instances: List[DicomFile]) -> Iterator[np.ndarray]:
+    for dicom_file in instances:
+        try:
+            ds = read_dataset(dicom_file.file_path)
+            if "PixelData" not in ds:
+                continue
+            yield from _instance_frames(ds)
+        except Exception as e:
+            logger.warning(f"Skipping cine frame {dicom_file.file_path}: {e}")
+
+
+def _series_order(instances: List[DicomFile]) -> List[DicomFile]:
+    """
+    Image instances of the series' stack along the slice normal (localizers
+    dropped, as in the volume), else all of them in slice-number order
+    """
+    files, headers = [], []
+    for dicom_file in instances:
+        try:
+            ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+        except Exception as e:
+            logger.warning(f"Unable to read {dicom_file.file_path}: {e}")
+            continue
+        if ds.get("Rows"):
+            files.append(dicom_file)
+            headers.append(ds)
+    stack = dominant_slices(headers)
+    order = geometric_order([headers[i] for i in stack])
+    if order is None:
+        return sorted(files, key=slice_sort_key)
+    return [files[stack[i]] for i in order]
+
+
+def _default_window(
+    study: Study, instances: List[DicomFile], ds: pydicom.Dataset
+) -> Optional[Tuple[float, float]]:
+    """Header window, else the ingest-time series or instance statistics window"""
+    window = header_window(ds)
+    if window or is_color(ds):
+        return window
+    if len(instances) == 1:
+        stats = stats_for_file(instances[0].file_path, instances[0].instance_uid)
+    else:
+        stats = ((load_study_stats(study) or {}).get("series") or {}).get(
+            instances[0].series_uid
+        )
+    if stats:
+        return stats["window_center"], stats["window_width"]
+    return None
+
+
+def encode_cine(frames: Iterator[np.ndarray], path: str, fps: float, output_format: str):
+    """Write frames to a video file, trying each codec for the format"""
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("No frames to encode")
+    height, width = first.shape[:2]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.{output_format}"
+    for codec in CINE_CODECS[output_format]:
+        writer = cv2.VideoWriter(
+            tmp_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height)
+        )
+        if writer.isOpened():
+            break
+    else:
+        raise RuntimeError(f"No {output_format} encoder available")
+
+    count = 0
+    try:
+        writer.write(first)
+        count = 1
+        for frame in frames:
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+            count += 1
+    finally:
+        writer.release()
+    os.replace(tmp_path, path)
+    logger.info(f"Encoded {count} frames with {codec} at {fps:g} fps to {path}")
+
+
+def generate_cine(
+    study: Study,
+    source: str,
+    instances: List[DicomFile],
+    output_format: str = "mp4",
+    fps: Optional[float] = None,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+) -> str:
+    """
+    Encode a cine loop of one multi-frame instance (a single entry in
+    ``instances``) or of a series in slice order; returns the cached path.
+    """
+    if output_format not in CINE_CODECS:
+        raise ValueError(f"format must be one of {', '.join(CINE_CODECS)}")
+    path = cine_path(
+        study, source, cine_params(output_format, fps, window_center, window_width)
+    )
+    if os.path.exists(path):
+        return path
+
+    if len(instances) > 1:
+        instances = _series_order(instances)
+        if not instances:
+            raise ValueError("Series has no image instances")
+    if len(instances) == 1:
+        ds = read_dataset(instances[0].file_path)
+        if "PixelData" not in ds:
+            raise ValueError("Instance has no pixel data")
+        frames = _instance_frames(ds)
+        rate = fps or instance_fps(ds) or DEFAULT_SERIES_FPS
+    else:
+        ds = read_dataset(instances[0].file_path, stop_before_pixels=True)
+        frames = _series_frames(instances)
+        rate = fps or DEFAULT_SERIES_FPS
+
+    if window_center is None or window_width is None:
+        window = _default_window(study, instances, ds)
+        if window:
+            window_center, window_width = window
+
+    encode_cine(
+        _display_frames(frames, ds, window_center, window_width),
+        path,
+        min(max(rate, 1.0), MAX_FPS),
+        output_format,
+    )
+    return path
+
+
+def generate_requested_cine(
+    study: Study,
+    source: str,
+    instances: List[DicomFile],
+    output_format: str = "mp4",
+    fps: Optional[float] = None,
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+) -> str:
+    """
+    Encode a cine loop claimed with ``claim_build`` by a viewer request,
+    recording why when it cannot be encoded, and release the claim
+    """
+    path = cine_path(
+        study, source, cine_params(output_format, fps, window_center, window_width)
+    )
+    try:
+        return generate_cine(
+            study, source, instances, output_format, fps, window_center, window_width
+        )
+    except Exception as e:
+        reason = str(e) if isinstance(e, ValueError) else f"Cine encoding failed: {e}"
+        record_build_failure(path, reason, inputs_version(instances))
+        raise
+    finally:
+        release_build(path)
@@ -9,19 +9,88 @@ from sqlalchemy import (
     ForeignKey,
     Enum,
     LargeBinary,
+    UniqueConstraint,
+    Index,
 )
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
 import enum
+import os
 from datetime import datetime
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./pacs.db"
+from .sqlite_profile import SQLITE_PROFILE, apply_sqlite_pragmas, configure_sqlite
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# Connection pool settings (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Server-side limit per statement in milliseconds, 0 disables (PostgreSQL)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Rows fetched per round trip when streaming with stream_results()
+DB_STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+
+
+def normalize_database_url(url: str) -> str:
+    """Route plain PostgreSQL URLs to the psycopg (v3) driver"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+SQLALCHEMY_DATABASE_URL = normalize_database_url(
+    os.getenv("DATABASE_URL", "sqlite:///./pacs.db")
 )
+
+
+def async_database_url(url: str) -> str:
+    """The asyncio driver for the same database: aiosqlite, or psycopg's async mode"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg:" + url[len(prefix):]
+    return url
+
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.startswith("postgresql") and DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        }
+    return options
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# In-process single-writer queue of the SQLite profile (None on other databases)
+write_queue = (
+    configure_sqlite(engine, SessionLocal) if engine.dialect.name == "sqlite" else None
+)
+
+# Read paths of request handlers use AsyncSession so a slow query does not
+# hold a threadpool worker. Writes stay on SessionLocal (and the SQLite write
+# queue); the async pool is sized by the same DB_POOL_* settings.
+ASYNC_DATABASE_URL = async_database_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+if async_engine.dialect.name == "sqlite" and SQLITE_PROFILE == "tuned":
+    apply_sqlite_pragmas(async_engine.sync_engine)
 
 Base = declarative_base()
 
@@ -122,6 +191,14 @@ class Patient(Base):
 
 class Study(Base):
     __tablename__ = "studies"
+    # Keyset pagination order, alone and under each role's or status filter
+    __table_args__ = (
+        Index("ix_studies_created", "created_at", "id"),
+        Index("ix_studies_uploader_created", "uploaded_by_id", "created_at", "id"),
+        Index("ix_studies_center_created", "diagnostic_center_id", "created_at", "id"),
+        Index("ix_studies_doctor_created", "assigned_doctor_id", "created_at", "id"),
+        Index("ix_studies_status_created", "status", "created_at", "id"),
+    )
 
     id = Column(String(8), primary_key=True, index=True)
     study_uid = Column(String, unique=True, index=True, nullable=False)
@@ -160,11 +237,21 @@ class Study(Base):
         "User", foreign_keys=[radiologist_id], back_populates="radiologist_studies"
     )
     dicom_files = relationship("DicomFile", back_populates="study")
-    annotations = relationship("Annotation", back_populates="study")
+    annotations = relationship(
+        "Annotation", back_populates="study", cascade="all, delete-orphan"
+    )
+    segmentations = relationship(
+        "Segmentation", back_populates="study", cascade="all, delete-orphan"
+    )
 
 
 class DicomFile(Base):
     __tablename__ = "dicom_files"
+    # Study and series lookups in slice order; recent-upload counts
+    __table_args__ = (
+        Index("ix_dicom_files_study_series", "study_id", "series_uid", "slice_number"),
+        Index("ix_dicom_files_created", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     study_id = Column(String(8), ForeignKey("studies.id"), nullable=False)
@@ -187,21 +274,95 @@ class DicomFile(Base):
 
 class Annotation(Base):
     __tablename__ = "annotations"
+    __table_args__ = (
+        Index("ix_annotations_study_user", "study_id", "user_id"),
+        # One measurement per client id, so retried sync creates stay idempotent
+        Index("ix_annotations_study_client", "study_id", "client_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    study_id = Column(String(8), ForeignKey("studies.id"), nullable=False)
+    study_id = Column(
+        String(8), ForeignKey("studies.id", ondelete="CASCADE"), nullable=False
+    )
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     annotation_type = Column(String)  # measurement, roi, text, etc.
     annotation_data = Column(Text)  # JSON data for coordinates, measurements, etc.
     notes = Column(Text)
+    client_id = Column(String, nullable=True)  # client-generated id for idempotent sync
+    version = Column(Integer, default=1, nullable=False, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Updates and deletes match the loaded version, so a concurrent edit
+    # raises StaleDataError instead of being overwritten; edits bump it
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
     study = relationship("Study", back_populates="annotations")
     user = relationship("User")
 
 
+class Segmentation(Base):
+    __tablename__ = "segmentations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    study_id = Column(
+        String(8),
+        ForeignKey("studies.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    series_uid = Column(String, nullable=False)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    label = Column(String, nullable=False)
+    description = Column(Text)
+    segments = Column(Text)  # JSON list of {number, label, color}
+    rows = Column(Integer, nullable=False)
+    columns = Column(Integer, nullable=False)
+    slice_count = Column(Integer, nullable=False)
+    instance_uids = Column(Text)  # JSON source instance per slice index
+    version = Column(Integer, default=1, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Updates and deletes match the loaded version, so a concurrent edit
+    # raises StaleDataError instead of being overwritten; edits bump it
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
+
+    study = relationship("Study", back_populates="segmentations")
+    created_by = relationship("User")
+    slices = relationship(
+        "SegmentationSlice",
+        back_populates="segmentation",
+        cascade="all, delete-orphan",
+        lazy="dynamic",
+    )
+
+
+class SegmentationSlice(Base):
+    __tablename__ = "segmentation_slices"
+    __table_args__ = (UniqueConstraint("segmentation_id", "slice_index"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    segmentation_id = Column(
+        Integer,
+        ForeignKey("segmentations.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    slice_index = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed run-length labelmap
+
+    segmentation = relationship("Segmentation", back_populates="slices")
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    # Newest-first log views, unfiltered or by action or user
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp", "timestamp"),
+        Index("ix_audit_logs_action_timestamp", "action", "timestamp"),
+        Index("ix_audit_logs_user_timestamp", "user_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -231,6 +392,11 @@ class SystemSettings(Base):
 
 class DeletionRequest(Base):
     __tablename__ = "deletion_requests"
+    # Newest-first review list, unfiltered or by status
+    __table_args__ = (
+        Index("ix_deletion_requests_created", "created_at", "id"),
+        Index("ix_deletion_requests_status_created", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     study_id = Column(String(8), ForeignKey("studies.id"), nullable=False)
@@ -246,9 +412,132 @@ class DeletionRequest(Base):
     approved_by = relationship("User", foreign_keys=[approved_by_id])
 
 
+class WorklistEntry(Base):
+    """
+    One row per study with the names the worklist shows, kept current by
+    app/worklist.py in the transaction that changes the study or a name
+    """
+
+    __tablename__ = "worklist"
+    # Most urgent, then oldest first: overall, per center, per radiologist
+    __table_args__ = (
+        Index(
+            "ix_worklist_status_rank",
+            "status",
+            "priority_rank",
+            "created_at",
+            "id",
+            postgresql_include=[
+                "patient_name",
+                "center_name",
+                "technician_name",
+                "modality",
+            ],
+        ),
+        Index(
+            "ix_worklist_center_status_rank",
+            "diagnostic_center_id",
+            "status",
+            "priority_rank",
+            "created_at",
+            "id",
+        ),
+        Index(
+            "ix_worklist_radiologist_status_rank",
+            "radiologist_id",
+            "status",
+            "priority_rank",
+            "created_at",
+            "id",
+        ),
+    )
+
+    id = Column(
+        String(8), ForeignKey("studies.id", ondelete="CASCADE"), primary_key=True
+    )
+    study_uid = Column(String, nullable=False)
+    status = Column(Enum(StudyStatus))
+    priority = Column(String)
+    priority_rank = Column(Integer, nullable=False)
+    modality = Column(String)
+    body_part = Column(String)
+    study_description = Column(Text)
+    patient_mrn = Column(String)
+    patient_name = Column(String)
+    diagnostic_center_id = Column(Integer)
+    center_name = Column(String)
+    technician_id = Column(Integer)
+    technician_name = Column(String)
+    radiologist_id = Column(Integer)
+    radiologist_name = Column(String)
+    assigned_doctor_id = Column(Integer)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+
+
+# Dashboard rollups: counters kept current by app/rollups.py as studies and
+# files are written, and recounted periodically by the reconciliation task
+
+
+class StudyRollup(Base):
+    """Studies per center, modality ("" when unknown) and status"""
+
+    __tablename__ = "study_rollups"
+
+    diagnostic_center_id = Column(Integer, primary_key=True)
+    modality = Column(String, primary_key=True)
+    status = Column(Enum(StudyStatus), primary_key=True)
+    studies = Column(Integer, nullable=False, default=0)
+
+
+class CenterRollup(Base):
+    """Studies and DICOM files per center"""
+
+    __tablename__ = "center_rollups"
+
+    diagnostic_center_id = Column(Integer, primary_key=True)
+    studies = Column(Integer, nullable=False, default=0)
+    dicom_files = Column(Integer, nullable=False, default=0)
+
+
+class ActivityRollup(Base):
+    """Studies and DICOM files created per center in each UTC hour"""
+
+    __tablename__ = "activity_rollups"
+
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    diagnostic_center_id = Column(Integer, primary_key=True)
+    studies = Column(Integer, nullable=False, default=0)
+    dicom_files = Column(Integer, nullable=False, default=0)
+
+
+class UploaderRollup(Base):
+    """Studies uploaded per user"""
+
+    __tablename__ = "uploader_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    studies = Column(Integer, nullable=False, default=0)
+
+
+def stream_results(query, batch_size: int = DB_STREAM_BATCH_SIZE):
+    """
+    Mark an ORM query or Core select to fetch its rows in batches instead of
+    loading them all (iterate it, or ``.partitions()`` of its result). On
+    PostgreSQL this reads through a server-side cursor, so consume the rows
+    promptly: the cursor holds its transaction open until exhausted.
+    """
+    return query.execution_options(yield_per=batch_size)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
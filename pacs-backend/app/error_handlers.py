@@ -203,6 +203,18 @@ async def sqlalchemy_exception_handler(
     return create_error_response(api_error, request)
 
 
+async def timeout_exception_handler(
+    request: Request, exc: TimeoutError
+) -> JSONResponse:
+    """Handle timeouts waiting for a shared resource, such as the SQLite write slot"""
+    logger.warning(f"Timeout: {exc}")
+    response = create_error_response(
+        ServiceUnavailableError("database", message=str(exc) or None), request
+    )
+    response.headers["Retry-After"] = "1"
+    return response
+
+
 async def general_exception_handler(request: Request, exc: Exception) -> JSONResponse:
     """Handle unexpected exceptions"""
     logger.error(
@@ -232,4 +244,5 @@ def setup_error_handlers(app):
     app.add_exception_handler(StarletteHTTPException, http_exception_handler)
     app.add_exception_handler(RequestValidationError, validation_exception_handler)
     app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)
+    app.add_exception_handler(TimeoutError, timeout_exception_handler)
     app.add_exception_handler(Exception, general_exception_handler)
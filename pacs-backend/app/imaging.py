@@ -0,0 +1,151 @@
+"""
+Pixel helpers shared by the derived-image services (thumbnails, previews, ...)
+"""
+
+from io import BytesIO
+from typing import Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+import pydicom
+from pydicom.multival import MultiValue
+from pydicom.pixels import apply_modality_lut
+
+logger = logging.getLogger(__name__)
+
+
+def read_dataset(
+    path: str, stop_before_pixels: bool = False, cached: bool = False
+) -> pydicom.Dataset:
+    """
+    Read a stored instance. ``cached`` reads through the instance cache, for
+    interactive requests likely to be repeated by other readers.
+    """
+    if cached:
+        from .cache import instance_cache
+
+        data = instance_cache.get(path)
+        if data is not None:
+            return pydicom.dcmread(
+                BytesIO(data), force=True, stop_before_pixels=stop_before_pixels
+            )
+        path = instance_cache.resolve(path)
+    return pydicom.dcmread(path, force=True, stop_before_pixels=stop_before_pixels)
+
+
+def is_color(ds: pydicom.Dataset) -> bool:
+    return int(ds.get("SamplesPerPixel", 1)) > 1
+
+
+def frame_count(ds: pydicom.Dataset) -> int:
+    return int(ds.get("NumberOfFrames", 1) or 1)
+
+
+def get_frame(ds: pydicom.Dataset, index: Optional[int] = None) -> np.ndarray:
+    """
+    Return one frame of the instance. Defaults to the middle frame.
+    Grayscale frames are returned in modality units (rescale applied) as float32,
+    color frames as RGB uint8.
+    """
+    pixels = ds.pixel_array
+    frames = frame_count(ds)
+    if frames > 1:
+        if index is None:
+            index = frames // 2
+        pixels = pixels[min(max(index, 0), frames - 1)]
+
+    if is_color(ds):
+        return pixels.astype(np.uint8, copy=False)
+
+    return apply_modality_lut(pixels, ds).astype(np.float32, copy=False)
+
+
+def first_value(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (MultiValue, list, tuple)):
+        value = value[0] if len(value) else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def modality_units(ds: pydicom.Dataset) -> str:
+    """Units of rescaled pixel values (RescaleType, HU for CT)"""
+    units = str(ds.get("RescaleType", "") or "")
+    if units and units != "US":
+        return units
+    return "HU" if ds.get("Modality") == "CT" else ""
+
+
+def header_window(ds: pydicom.Dataset) -> Optional[Tuple[float, float]]:
+    """Window center/width stored in the header, if any"""
+    center = first_value(ds.get("WindowCenter"))
+    width = first_value(ds.get("WindowWidth"))
+    if center is None or not width or width <= 0:
+        return None
+    return center, width
+
+
+def percentile_window(
+    pixels: np.ndarray, low: float = 1.0, high: float = 99.0
+) -> Tuple[float, float]:
+    """Window covering the given percentile range, sampled for speed"""
+    sample = pixels[::4, ::4] if pixels.ndim >= 2 else pixels
+    lo, hi = np.percentile(sample, [low, high])
+    if hi <= lo:
+        lo, hi = float(pixels.min()), float(pixels.max())
+    width = max(float(hi - lo), 1.0)
+    return float(lo + width / 2), width
+
+
+def window_to_uint8(
+    pixels: np.ndarray, center: float, width: float, invert: bool = False
+) -> np.ndarray:
+    """Apply a linear window and map to 0-255"""
+    lower = center - width / 2
+    scaled = (pixels.astype(np.float32) - lower) * (255.0 / max(width, 1e-6))
+    display = np.clip(scaled, 0, 255).astype(np.uint8)
+    if invert:
+        display = 255 - display
+    return display
+
+
+def to_display(
+    ds: pydicom.Dataset,
+    pixels: np.ndarray,
+    center: Optional[float] = None,
+    width: Optional[float] = None,
+) -> np.ndarray:
+    """Render a frame returned by :func:`get_frame` to 8-bit for display"""
+    if is_color(ds):
+        return pixels
+
+    if center is None or width is None:
+        center, width = header_window(ds) or percentile_window(pixels)
+
+    invert = str(ds.get("PhotometricInterpretation", "")) == "MONOCHROME1"
+    return window_to_uint8(pixels, center, width, invert=invert)
+
+
+def resize_to_fit(image: np.ndarray, max_size: int) -> np.ndarray:
+    """Downscale so the longest side is at most ``max_size`` pixels"""
+    height, width = image.shape[:2]
+    scale = max_size / float(max(height, width))
+    if scale >= 1:
+        return image
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_image(image: np.ndarray, ext: str = ".jpg", quality: int = 85) -> bytes:
+    """Encode an 8-bit grayscale or RGB image"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == ".jpg" else []
+    ok, buffer = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"Failed to encode image as {ext}")
+    return buffer.tobytes()
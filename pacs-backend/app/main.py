@@ -12,6 +12,7 @@ from fastapi import (
     Form,
     Request,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
@@ -21,10 +22,14 @@ import uuid
 import shutil
 from datetime import timedelta, datetime
 import time
+from contextlib import asynccontextmanager
 from starlette.middleware import Middleware
 from starlette.datastructures import UploadFile as StarletteUploadFile
 from starlette.requests import Request as StarletteRequest
 
+from alembic import command
+from alembic.config import Config
+
 from .database import engine, Base, get_db
 from .auth import (
     create_access_token,
@@ -50,11 +55,34 @@ from .monitoring import get_metrics
 from .dicom_service import DicomNodeConnector
 from .error_handlers import setup_error_handlers
 
-Base.metadata.create_all(bind=engine)
+# Flush hooks that keep the worklist and dashboard rollups current
+from . import rollups, worklist  # noqa: F401
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def migrate_database():
+    """Bring the database schema (and the tables derived from it) to head"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    # Keep the application's logging configuration
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Deployments run ``alembic upgrade head`` before starting the server; a
+    # local SQLite database is migrated here, existing or not
+    if engine.dialect.name == "sqlite":
+        await run_in_threadpool(migrate_database)
+    yield
+
 
 app = FastAPI(
     title="PACS System API",
     version="1.0.0",
+    lifespan=lifespan,
     max_request_size=10 * 1024 * 1024 * 1024,  # 10GB
 )
 
@@ -82,8 +110,21 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type", "Accept"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type", "Accept", "If-None-Match", "Range"],
+    # Imaging responses describe their payload in headers the viewer must read
+    expose_headers=[
+        "ETag",
+        "Retry-After",
+        "Content-Range",
+        "X-Pixel-Offset",
+        "X-Pyramid-Level",
+        "X-Volume-Shape",
+        "X-Volume-Dtype",
+        "X-Data-Offset",
+        "X-Segmentation-Version",
+        "X-Next-Cursor",
+    ],
 )
 
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -253,7 +294,17 @@ try:
 except Exception as e:
     print(f"⚠️ DICOM service initialization failed: {e}")
 
-from .routers import admin, diagnostic_center, studies, ai, mfa, audit
+from .routers import (
+    admin,
+    diagnostic_center,
+    studies,
+    ai,
+    mfa,
+    audit,
+    imaging,
+    segmentations,
+    measurements,
+)
 
 app.include_router(admin.router)
 app.include_router(diagnostic_center.router)
@@ -261,5 +312,11 @@ app.include_router(studies.router)
 app.include_router(ai.router)
 app.include_router(mfa.router)
 app.include_router(audit.router)
+app.include_router(imaging.router)
+app.include_router(segmentations.router)
+app.include_router(measurements.router)
 app.include_router(studies.router, prefix="/api")
 app.include_router(ai.router, prefix="/api")
+app.include_router(imaging.router, prefix="/api")
+app.include_router(segmentations.router, prefix="/api")
+app.include_router(measurements.router, prefix="/api")
@@ -3,6 +3,9 @@ from fastapi import Response
 import time
 from functools import wraps
 
+from .database import engine, write_queue
+from .replicas import replica_router
+
 REQUEST_COUNT = Counter(
     "pacs_requests_total", "Total requests", ["method", "endpoint", "status"]
 )
@@ -14,6 +17,49 @@ DICOM_PROCESSING_TIME = Histogram(
 )
 AI_ANALYSIS_COUNT = Counter("pacs_ai_analysis_total", "Total AI analyses", ["status"])
 STORAGE_USAGE = Gauge("pacs_storage_bytes", "Storage usage in bytes")
+CACHE_HITS = Counter("pacs_cache_hits_total", "Instance cache hits", ["tier"])
+CACHE_MISSES = Counter("pacs_cache_misses_total", "Instance cache misses", ["tier"])
+CACHE_EVICTIONS = Counter(
+    "pacs_cache_evictions_total", "Instance cache evictions", ["tier"]
+)
+CACHE_BYTES = Gauge("pacs_cache_bytes", "Bytes held by the instance cache", ["tier"])
+DB_POOL_CONNECTIONS = Gauge(
+    "pacs_db_pool_connections",
+    "Database pool connections by state (overflow is negative while filling)",
+    ["state"],
+)
+SQLITE_WRITE_QUEUE_DEPTH = Gauge(
+    "pacs_sqlite_write_queue_depth", "Sessions waiting for the SQLite write slot"
+)
+DB_REPLICA_LAG = Gauge(
+    "pacs_db_replica_lag_seconds",
+    "Replay lag of each read replica (-1 while unmeasured or unreachable)",
+    ["replica"],
+)
+
+
+def track_pool_stats():
+    """Read the engine pool's counters at scrape time"""
+    for state, method in (
+        ("size", "size"),
+        ("checked_in", "checkedin"),
+        ("checked_out", "checkedout"),
+        ("overflow", "overflow"),
+    ):
+        # Look the pool up on each scrape, engine.dispose() replaces it
+        if callable(getattr(engine.pool, method, None)):
+            DB_POOL_CONNECTIONS.labels(state=state).set_function(
+                lambda method=method: getattr(engine.pool, method)()
+            )
+
+
+track_pool_stats()
+if write_queue is not None:
+    SQLITE_WRITE_QUEUE_DEPTH.set_function(lambda: write_queue.depth)
+for replica in replica_router.replicas:
+    DB_REPLICA_LAG.labels(replica=replica.name).set_function(
+        lambda replica=replica: -1 if replica.lag is None else replica.lag
+    )
 
 
 def monitor_endpoint(func):
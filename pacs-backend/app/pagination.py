@@ -0,0 +1,142 @@
+"""
+Keyset (cursor) pagination.
+
+A list is ordered by a tuple of sort keys ending in a unique id; a cursor
+names the last row of a page, and the next page continues strictly after it.
+Each page is an index range scan regardless of depth and stays stable while
+new rows arrive. Cursors are opaque URL-safe tokens to clients.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+
+# (sort expression, descending, attribute name of the key on result rows)
+SortKey = Tuple[object, bool, str]
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def encode_cursor(values: Sequence, row_id) -> str:
+    payload = {"k": [_encode_value(v) for v in values], "i": row_id}
+    token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    return token.rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[List, object]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return [_decode_value(v) for v in payload["k"]], payload["i"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _resolve_order(model, order: Optional[List[SortKey]]) -> List[SortKey]:
+    return order or [(model.created_at, True, "created_at"), (model.id, True, "id")]
+
+
+def _after(order: List[SortKey], values: Sequence):
+    """Rows strictly after the anchor ``values`` in ``order``"""
+    clauses = []
+    for i, (expr, descending, _) in enumerate(order):
+        after = expr < values[i] if descending else expr > values[i]
+        ties = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*ties, after))
+    return or_(*clauses)
+
+
+def _order_by(order: List[SortKey]):
+    return [expr.desc() if descending else expr.asc() for expr, descending, _ in order]
+
+
+def _decode_for(order: List[SortKey], cursor: str) -> Tuple[List, object]:
+    values, row_id = decode_cursor(cursor)
+    if len(values) != len(order):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values, row_id
+
+
+def _split_page(rows: List, order: List[SortKey], limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            [getattr(last, name) for _, _, name in order], last.id
+        )
+    return rows, next_cursor
+
+
+def keyset_page(
+    db: Session,
+    query: Query,
+    model,
+    cursor: Optional[str],
+    limit: int,
+    order: Optional[List[SortKey]] = None,
+):
+    """
+    One page of ``query`` and the cursor of the following page (None on the
+    last page). ``order`` defaults to ``(created_at, id)`` newest first and
+    must end with ``model.id``; result rows must expose each key by name.
+    """
+    order = _resolve_order(model, order)
+    if cursor:
+        values, row_id = _decode_for(order, cursor)
+        # Compare against the stored anchor row so values (timestamp formats,
+        # computed ranks) match exactly; use the token's values if it is gone
+        if db.query(model.id).filter(model.id == row_id).first() is not None:
+            values = [
+                db.query(expr).filter(model.id == row_id).scalar_subquery()
+                for expr, _, _ in order
+            ]
+        query = query.filter(_after(order, values))
+
+    rows = query.order_by(*_order_by(order)).limit(limit + 1).all()
+    return _split_page(rows, order, limit)
+
+
+async def keyset_page_async(
+    db: AsyncSession,
+    statement: Select,
+    model,
+    cursor: Optional[str],
+    limit: int,
+    order: Optional[List[SortKey]] = None,
+):
+    """``keyset_page`` for a ``select()`` on an AsyncSession"""
+    order = _resolve_order(model, order)
+    if cursor:
+        values, row_id = _decode_for(order, cursor)
+        anchor = await db.execute(select(model.id).where(model.id == row_id))
+        if anchor.first() is not None:
+            values = [
+                select(expr).where(model.id == row_id).scalar_subquery()
+                for expr, _, _ in order
+            ]
+        statement = statement.where(_after(order, values))
+
+    result = await db.execute(statement.order_by(*_order_by(order)).limit(limit + 1))
+    # A select of one entity yields instances, of several columns yields rows
+    if len(statement.column_descriptions) == 1:
+        rows = list(result.scalars().all())
+    else:
+        rows = list(result.all())
+    return _split_page(rows, order, limit)
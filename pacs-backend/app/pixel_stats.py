@@ -0,0 +1,141 @@
+"""
+Per-instance pixel statistics and default window presets.
+
+Computed once after ingest and stored in ``derived/pixel_stats.json`` so the
+viewer (through the metadata document) and the AI preprocessing get value
+ranges and a default window without another pass over the pixels. Values are
+in modality units (rescale applied), the units window center/width refer to.
+"""
+
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import statistics
+
+import numpy as np
+import pydicom
+from pydicom.pixels import apply_modality_lut
+from sqlalchemy.orm import Session
+
+from .database import DicomFile, Study
+from .imaging import is_color, read_dataset
+from .series import group_by_series
+from .storage import DERIVED_DIRNAME, derived_dir, write_atomic
+
+logger = logging.getLogger(__name__)
+
+STATS_FILENAME = "pixel_stats.json"
+PERCENTILES = (0.5, 1, 5, 50, 95, 99, 99.5)
+# Default window spans this percentile range of the histogram
+WINDOW_PERCENTILES = (1, 99)
+HISTOGRAM_BINS = 1024
+
+
+def stats_path(study: Study) -> str:
+    return os.path.join(derived_dir(study), STATS_FILENAME)
+
+
+def compute_pixel_stats(ds: pydicom.Dataset) -> Optional[dict]:
+    """Range, percentiles and histogram window of a grayscale instance (all frames)"""
+    if "PixelData" not in ds or is_color(ds):
+        return None
+
+    pixels = apply_modality_lut(ds.pixel_array, ds)
+    values = pixels.ravel()
+
+    # Padding (e.g. the area outside a CT field of view) skews the window
+    padding = ds.get("PixelPaddingValue")
+    if padding is not None:
+        padding = apply_modality_lut(np.array([padding]), ds)[0]
+        values = values[values != padding]
+    if values.size == 0:
+        return None
+
+    low, high = float(values.min()), float(values.max())
+    if high > low:
+        counts, edges = np.histogram(values, bins=HISTOGRAM_BINS, range=(low, high))
+        cdf = np.cumsum(counts) / values.size
+        # Upper edge of the first bin reaching each percentile
+        quantiles = {
+            p: float(edges[min(np.searchsorted(cdf, p / 100.0) + 1, HISTOGRAM_BINS)])
+            for p in set(PERCENTILES) | set(WINDOW_PERCENTILES)
+        }
+    else:
+        quantiles = {p: low for p in set(PERCENTILES) | set(WINDOW_PERCENTILES)}
+
+    window_low, window_high = (quantiles[p] for p in WINDOW_PERCENTILES)
+    width = max(window_high - window_low, 1.0)
+    return {
+        "min": low,
+        "max": high,
+        "mean": float(values.mean()),
+        "percentiles": {str(p): quantiles[p] for p in PERCENTILES},
+        "window_center": window_low + width / 2,
+        "window_width": width,
+    }
+
+
+def series_stats(instance_stats: List[dict]) -> Optional[dict]:
+    """Series preset: overall range and the median instance window"""
+    if not instance_stats:
+        return None
+    return {
+        "min": min(s["min"] for s in instance_stats),
+        "max": max(s["max"] for s in instance_stats),
+        "window_center": statistics.median(s["window_center"] for s in instance_stats),
+        "window_width": statistics.median(s["window_width"] for s in instance_stats),
+    }
+
+
+def generate_study_pixel_stats(
+    db: Session, study: Study, overwrite: bool = False
+) -> Optional[str]:
+    """Compute statistics for every instance of a study into the sidecar"""
+    path = stats_path(study)
+    if os.path.exists(path) and not overwrite:
+        return path
+
+    files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    document: Dict[str, dict] = {"instances": {}, "series": {}}
+    for series_uid, instances in group_by_series(files).items():
+        collected = []
+        for dicom_file in instances:
+            try:
+                stats = compute_pixel_stats(read_dataset(dicom_file.file_path))
+            except Exception as e:
+                logger.warning(f"Pixel statistics failed for {dicom_file.file_path}: {e}")
+                continue
+            if stats:
+                document["instances"][dicom_file.instance_uid] = stats
+                collected.append(stats)
+        preset = series_stats(collected)
+        if preset:
+            document["series"][series_uid] = preset
+
+    write_atomic(path, json.dumps(document).encode())
+    logger.info(
+        f"Pixel statistics for study {study.id}: {len(document['instances'])} instances"
+    )
+    return path
+
+
+def load_study_stats(study: Study) -> Optional[dict]:
+    path = stats_path(study)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def stats_for_file(file_path: str, instance_uid: str) -> Optional[dict]:
+    """
+    Statistics of one stored instance, located from its path alone
+    (instances live directly in the study directory, next to ``derived``).
+    """
+    path = os.path.join(os.path.dirname(file_path), DERIVED_DIRNAME, STATS_FILENAME)
+    try:
+        with open(path) as f:
+            return json.load(f)["instances"].get(instance_uid)
+    except (OSError, ValueError, KeyError):
+        return None
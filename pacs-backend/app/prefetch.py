@@ -0,0 +1,124 @@
+"""
+Study prefetch into the hot cache tier.
+
+Assigning a study enqueues it here; a background worker thread then generates
+its metadata document and renders if ingest has not yet, and copies them and
+the instances into :data:`cache.hot_cache`. The queue is ordered by study
+priority so STAT work is warmed before routine work.
+"""
+
+from typing import Dict, Optional
+import itertools
+import logging
+import queue
+import threading
+
+from .cache import hot_cache
+from .database import DicomFile, SessionLocal, Study
+from .series import group_by_series
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first; unknown priorities are treated as normal
+PRIORITY_ORDER = {
+    "stat": 0,
+    "urgent": 1,
+    "high": 2,
+    "normal": 3,
+    "routine": 3,
+    "low": 4,
+}
+
+
+def priority_rank(priority: Optional[str]) -> int:
+    return PRIORITY_ORDER.get((priority or "normal").lower(), PRIORITY_ORDER["normal"])
+
+
+def warm_study(study_id: str) -> int:
+    """Warm one study into the hot tier; returns the number of files cached"""
+    from .pyramid import generate_instance_pyramid, level_path
+    from .study_metadata import ensure_study_metadata
+    from .thumbnails import generate_study_thumbnails
+    from .volume import load_geometry, volume_path
+
+    db = SessionLocal()
+    try:
+        study = db.query(Study).filter(Study.id == study_id).first()
+        if not study:
+            logger.warning(f"Prefetch skipped, study {study_id} not found")
+            return 0
+
+        # What the viewer requests first: metadata, then thumbnails
+        paths = []
+        metadata = ensure_study_metadata(db, study)
+        if metadata:
+            paths.append(metadata)
+        paths.extend(generate_study_thumbnails(db, study).values())
+
+        files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+        for series_uid, instances in group_by_series(files).items():
+            if load_geometry(study, series_uid):
+                paths.append(volume_path(study, series_uid))
+            for dicom_file in instances:
+                paths.append(dicom_file.file_path)
+                try:
+                    manifest = generate_instance_pyramid(study, dicom_file)
+                except Exception as e:
+                    logger.warning(f"Prefetch render failed for {dicom_file.file_path}: {e}")
+                    manifest = None
+                for entry in (manifest or {}).get("levels", []):
+                    paths.append(level_path(study, dicom_file, entry["level"]))
+
+        cached = sum(1 for path in paths if hot_cache.warm(path))
+        logger.info(f"Prefetched study {study_id}: {cached}/{len(paths)} files cached")
+        return cached
+    finally:
+        db.close()
+
+
+class PrefetchQueue:
+    """Priority queue of studies to warm, drained by one daemon thread"""
+
+    def __init__(self):
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def enqueue(self, study_id: str, priority: Optional[str] = None):
+        """Schedule a study; re-enqueueing with a higher priority moves it up"""
+        rank = priority_rank(priority)
+        with self._lock:
+            if study_id in self._pending and self._pending[study_id] <= rank:
+                return
+            self._pending[study_id] = rank
+            self._queue.put((rank, next(self._counter), study_id))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="study-prefetch", daemon=True
+                )
+                self._worker.start()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            rank, _, study_id = self._queue.get()
+            with self._lock:
+                # A stale entry superseded by a higher-priority one
+                if self._pending.get(study_id) != rank:
+                    continue
+            try:
+                warm_study(study_id)
+            except Exception as e:
+                logger.error(f"Prefetch of study {study_id} failed: {e}")
+            finally:
+                with self._lock:
+                    if self._pending.get(study_id) == rank:
+                        del self._pending[study_id]
+
+
+prefetch_queue = PrefetchQueue()
@@ -0,0 +1,164 @@
+"""
+Multi-resolution pixel pyramid for large single-frame images.
+
+Levels 1..N hold the stored pixel values downsampled by 2**level, encoded as
+lossless PNG (16-bit for grayscale) under ``derived/pyramid/<instance>``.
+A ``manifest.json`` next to them records the level sizes and the offset that
+was added to signed pixel data so the PNG could be unsigned. Level 0 is the
+original instance.
+"""
+
+from typing import List, Optional, Tuple
+import json
+import logging
+import os
+
+import cv2
+import numpy as np
+import pydicom
+from pydicom.pixels import apply_modality_lut
+from sqlalchemy.orm import Session
+
+from .cache import instance_cache
+from .database import DicomFile, Study
+from .imaging import encode_image, frame_count, is_color, read_dataset
+from .storage import derived_dir, safe_name, write_atomic
+
+logger = logging.getLogger(__name__)
+
+PYRAMID_MIN_SIZE = int(os.getenv("PYRAMID_MIN_SIZE", "1024"))
+PYRAMID_MAX_LEVELS = int(os.getenv("PYRAMID_MAX_LEVELS", "3"))
+# Levels whose longest side would drop below this are not generated
+PYRAMID_MIN_LEVEL_SIZE = 256
+
+
+def pyramid_dir(study: Study, dicom_file: DicomFile) -> str:
+    return derived_dir(
+        study, "pyramid", safe_name(dicom_file.instance_uid, str(dicom_file.id))
+    )
+
+
+def level_path(study: Study, dicom_file: DicomFile, level: int) -> str:
+    return os.path.join(pyramid_dir(study, dicom_file), f"L{level}.png")
+
+
+def manifest_path(study: Study, dicom_file: DicomFile) -> str:
+    return os.path.join(pyramid_dir(study, dicom_file), "manifest.json")
+
+
+def load_manifest(study: Study, dicom_file: DicomFile) -> Optional[dict]:
+    path = manifest_path(study, dicom_file)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def needs_pyramid(ds: pydicom.Dataset) -> bool:
+    """Only large single-frame images benefit from a pyramid (header-only check)"""
+    if frame_count(ds) > 1:
+        return False
+    size = max(int(ds.get("Rows", 0) or 0), int(ds.get("Columns", 0) or 0))
+    return size >= PYRAMID_MIN_SIZE
+
+
+def pyramid_levels(rows: int, columns: int) -> List[Tuple[int, int, int]]:
+    """(level, rows, columns) of every level to generate"""
+    levels = []
+    for level in range(1, PYRAMID_MAX_LEVELS + 1):
+        scale = 2 ** level
+        level_rows, level_columns = max(1, rows // scale), max(1, columns // scale)
+        if max(level_rows, level_columns) < PYRAMID_MIN_LEVEL_SIZE:
+            break
+        levels.append((level, level_rows, level_columns))
+    return levels
+
+
+def storable_pixels(ds: pydicom.Dataset, pixels: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Convert stored values to an array PNG can hold losslessly, with its offset"""
+    if is_color(ds):
+        return pixels.astype(np.uint8, copy=False), 0
+    if pixels.dtype.kind == "i":
+        return (pixels.astype(np.int32) + 32768).astype(np.uint16), 32768
+    if pixels.dtype.itemsize == 1:
+        return pixels, 0
+    return pixels.astype(np.uint16, copy=False), 0
+
+
+def generate_instance_pyramid(
+    study: Study, dicom_file: DicomFile, overwrite: bool = False
+) -> Optional[dict]:
+    """Build the pyramid of one instance; returns its manifest or None if not needed"""
+    if not overwrite:
+        manifest = load_manifest(study, dicom_file)
+        if manifest:
+            return manifest
+
+    ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+    if not needs_pyramid(ds):
+        return None
+
+    ds = read_dataset(dicom_file.file_path)
+    if "PixelData" not in ds:
+        return None
+    pixels, offset = storable_pixels(ds, ds.pixel_array)
+    rows, columns = pixels.shape[:2]
+
+    levels = []
+    for level, level_rows, level_columns in pyramid_levels(rows, columns):
+        # INTER_AREA averages each block, the right filter for decimation
+        resized = cv2.resize(
+            pixels, (level_columns, level_rows), interpolation=cv2.INTER_AREA
+        )
+        write_atomic(level_path(study, dicom_file, level), encode_image(resized, ".png"))
+        levels.append({"level": level, "rows": level_rows, "columns": level_columns})
+
+    manifest = {
+        "file_id": dicom_file.id,
+        "instance_uid": dicom_file.instance_uid,
+        "rows": rows,
+        "columns": columns,
+        "pixel_offset": offset,
+        "color": is_color(ds),
+        "levels": levels,
+    }
+    write_atomic(manifest_path(study, dicom_file), json.dumps(manifest).encode())
+    return manifest
+
+
+def generate_study_pyramids(db: Session, study: Study, overwrite: bool = False) -> int:
+    """Build pyramids for every large single-frame instance of a study"""
+    files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    generated = 0
+    for dicom_file in files:
+        try:
+            if generate_instance_pyramid(study, dicom_file, overwrite=overwrite):
+                generated += 1
+        except Exception as e:
+            logger.warning(f"Pyramid generation failed for {dicom_file.file_path}: {e}")
+
+    logger.info(f"Generated {generated} pixel pyramids for study {study.id}")
+    return generated
+
+
+def read_level(
+    study: Study, dicom_file: DicomFile, level: int
+) -> Tuple[pydicom.Dataset, np.ndarray]:
+    """
+    Header and pixels of a pyramid level, in the same form as
+    :func:`imaging.get_frame` (modality units for grayscale, RGB for color).
+    """
+    manifest = load_manifest(study, dicom_file)
+    path = level_path(study, dicom_file, level)
+    if not manifest or not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+    pixels = cv2.imread(instance_cache.resolve(path), cv2.IMREAD_UNCHANGED)
+    if pixels is None:
+        raise ValueError(f"Unable to decode {path}")
+    if manifest["color"]:
+        return ds, cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+
+    stored = pixels.astype(np.int32) - manifest["pixel_offset"]
+    return ds, apply_modality_lut(stored, ds).astype(np.float32, copy=False)
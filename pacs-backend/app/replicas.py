@@ -0,0 +1,245 @@
+"""
+Read replica routing.
+
+Read-only endpoints (study lists and detail, status, audit logs, admin
+monitoring and analytics) take their session from ``get_read_db`` or
+``get_async_read_db``. On its first statement such a session picks a replica
+from ``DATABASE_REPLICA_URLS`` round-robin, so worklist polling and dashboards
+stop competing with ingest commits on the primary. Anything it flushes still
+goes to the primary.
+
+A daemon thread measures each replica's replay lag; replicas behind by more
+than ``DB_REPLICA_MAX_LAG_SECONDS`` or unreachable are skipped, and with none
+left reads fall back to the primary. A user who has just committed a write
+reads from the primary for ``DB_READ_YOUR_WRITES_SECONDS`` so they see it,
+whichever API process serves the read: recent writers are marked in Redis
+with that expiry. While Redis is unreachable, user reads use the primary.
+
+Without replicas configured these sessions simply use the primary.
+"""
+
+from contextvars import ContextVar
+from typing import List, Optional
+import logging
+import os
+import threading
+import time
+
+import redis
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import (
+    SessionLocal,
+    async_database_url,
+    async_engine,
+    engine,
+    engine_options,
+    normalize_database_url,
+)
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated replica URLs, empty to read from the primary only
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# A usable replica was at most MAX_LAG behind when last checked and may have
+# fallen further behind for up to one CHECK_INTERVAL since
+DB_READ_YOUR_WRITES_SECONDS = float(
+    os.getenv(
+        "DB_READ_YOUR_WRITES_SECONDS",
+        str(DB_REPLICA_MAX_LAG_SECONDS + DB_REPLICA_CHECK_INTERVAL),
+    )
+)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Recent writers are marked under this prefix, shared by all API processes
+READ_YOUR_WRITES_KEY = "pacs:recent-write:"
+
+# Seconds since the last replayed transaction, 0 when all received WAL is replayed
+POSTGRES_REPLAY_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Username of the authenticated request, set by auth.get_current_user
+request_user: ContextVar[Optional[str]] = ContextVar("request_user", default=None)
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = normalize_database_url(url)
+        self.name = make_url(self.url).render_as_string(hide_password=True)
+        self.engine = create_engine(self.url, **engine_options(self.url))
+        async_url = async_database_url(self.url)
+        self.async_engine = create_async_engine(async_url, **engine_options(async_url))
+        # Seconds behind the primary; None until measured or while unreachable
+        self.lag: Optional[float] = None
+
+    @property
+    def usable(self) -> bool:
+        return self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG_SECONDS
+
+    def check_lag(self):
+        try:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == "postgresql":
+                    lag = connection.execute(POSTGRES_REPLAY_LAG).scalar()
+                else:
+                    connection.execute(text("SELECT 1"))
+                    lag = 0
+            self.lag = float(lag or 0)
+        except Exception as e:
+            if self.lag is not None:
+                logger.warning(f"Replica {self.name} unavailable, reading from primary: {e}")
+            self.lag = None
+
+
+class ReplicaRouter:
+    """Chooses the database a read session uses"""
+
+    def __init__(self, urls: List[str], store: Optional[redis.Redis] = None):
+        self.replicas = [Replica(url) for url in urls]
+        self.store = store or redis.Redis.from_url(
+            REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+        # While Redis is down it is retried once per check interval
+        self._store_retry_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._next = 0
+        self._monitor: Optional[threading.Thread] = None
+
+    def _store_failed(self, error: Exception):
+        if self._store_retry_at is None:
+            logger.warning(f"Redis unavailable, reading from primary: {error}")
+        self._store_retry_at = time.monotonic() + DB_REPLICA_CHECK_INTERVAL
+
+    def _store_waiting(self) -> bool:
+        retry_at = self._store_retry_at
+        return retry_at is not None and time.monotonic() < retry_at
+
+    def record_write(self, username: str):
+        if self._store_waiting():
+            return
+        try:
+            self.store.set(
+                READ_YOUR_WRITES_KEY + username,
+                1,
+                px=max(int(DB_READ_YOUR_WRITES_SECONDS * 1000), 1),
+            )
+        except redis.RedisError as e:
+            self._store_failed(e)
+
+    def wrote_recently(self, username: str) -> bool:
+        """Whether ``username`` committed within the window; True if unknown"""
+        if self._store_waiting():
+            return True
+        try:
+            wrote = bool(self.store.exists(READ_YOUR_WRITES_KEY + username))
+        except redis.RedisError as e:
+            self._store_failed(e)
+            return True
+        self._store_retry_at = None
+        return wrote
+
+    def choose(self, username: Optional[str]) -> Optional[Replica]:
+        """A usable replica for ``username``'s reads, or None for the primary"""
+        if not self.replicas:
+            return None
+        self._ensure_monitor()
+        if username and self.wrote_recently(username):
+            return None
+        with self._lock:
+            usable = [replica for replica in self.replicas if replica.usable]
+            if not usable:
+                return None
+            self._next += 1
+            return usable[self._next % len(usable)]
+
+    def _ensure_monitor(self):
+        with self._lock:
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = threading.Thread(
+                    target=self._run, name="replica-lag", daemon=True
+                )
+                self._monitor.start()
+
+    def _run(self):
+        while True:
+            for replica in self.replicas:
+                replica.check_lag()
+            time.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+class ReadSession(Session):
+    """Reads from the replica chosen on its first statement; flushes go to the primary"""
+
+    primary = engine
+
+    def _replica_engine(self, replica: Replica):
+        return replica.engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing:
+            return self.primary
+        if "replica" not in self.info:
+            self.info["replica"] = replica_router.choose(request_user.get())
+        replica = self.info["replica"]
+        return self.primary if replica is None else self._replica_engine(replica)
+
+
+class AsyncReadSession(ReadSession):
+    """ReadSession behind an AsyncSession, bound to the async engines"""
+
+    primary = async_engine.sync_engine
+
+    def _replica_engine(self, replica: Replica):
+        return replica.async_engine.sync_engine
+
+
+ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False)
+AsyncReadSessionLocal = async_sessionmaker(
+    sync_session_class=AsyncReadSession, autoflush=False, expire_on_commit=False
+)
+
+if replica_router.replicas:
+
+    @event.listens_for(SessionLocal, "after_flush")
+    def note_write(session, flush_context):
+        session.info["wrote"] = True
+
+    @event.listens_for(SessionLocal, "after_commit")
+    def keep_writer_on_primary(session):
+        username = request_user.get()
+        if session.info.pop("wrote", False) and username:
+            replica_router.record_write(username)
+
+    @event.listens_for(SessionLocal, "after_rollback")
+    def forget_write(session):
+        session.info.pop("wrote", None)
+
+    logger.info(
+        f"Read replicas: {', '.join(r.name for r in replica_router.replicas)} "
+        f"(max lag {DB_REPLICA_MAX_LAG_SECONDS:g}s)"
+    )
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
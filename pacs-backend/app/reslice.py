@@ -0,0 +1,276 @@
+"""
+Server-side reformatting of assembled series volumes.
+
+Planes are sampled in patient coordinates (mm) and mapped into the volume's
+index space with its geometry, then read with vectorized trilinear
+interpolation from the memory-mapped array. Supported reformats:
+
+* ``mpr``   - a single oblique plane;
+* ``mip`` / ``minip`` / ``avg`` - a slab of ``thickness`` mm around the plane;
+* ``curved`` - a curved planar reformat along a polyline.
+
+Results are cached as variants of the volume file in the hot cache tier, so
+they are evicted with its budget and invalidated when the volume is rebuilt.
+"""
+
+from io import BytesIO
+from typing import Tuple
+import hashlib
+import json
+
+import numpy as np
+
+from .cache import hot_cache
+from .imaging import encode_image, percentile_window, window_to_uint8
+from .volume import open_volume, volume_path
+
+RESLICE_MODES = {"mpr", "mip", "minip", "avg", "curved"}
+RESLICE_FORMATS = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "npy": "application/octet-stream",
+}
+MAX_OUTPUT_SIZE = 2048
+MAX_SLAB_SAMPLES = 256
+
+
+class ResliceError(ValueError):
+    """Invalid reformat request"""
+
+
+def _unit(vector, name: str) -> np.ndarray:
+    vector = np.asarray(vector, dtype=float)
+    if vector.shape != (3,) or not np.linalg.norm(vector):
+        raise ResliceError(f"{name} must be a non-zero 3-vector")
+    return vector / np.linalg.norm(vector)
+
+
+class VolumeSampler:
+    """Maps patient coordinates into a volume and samples it"""
+
+    def __init__(self, volume: np.ndarray, geometry: dict):
+        self.volume = volume
+        self.origin = np.array(geometry["origin"], dtype=float)
+        orientation = geometry["orientation"]
+        self.row = np.array(orientation[:3], dtype=float)
+        self.column = np.array(orientation[3:], dtype=float)
+        self.normal = np.array(geometry["normal"], dtype=float)
+        # PixelSpacing is (between rows, between columns)
+        self.row_spacing, self.column_spacing = geometry["pixel_spacing"]
+        self.locations = np.array(geometry["slice_locations"], dtype=float)
+        self.slice_spacing = abs(geometry.get("slice_spacing") or 1.0)
+
+    @property
+    def center(self) -> np.ndarray:
+        slices, rows, columns = self.volume.shape
+        return (
+            self.origin
+            + self.row * (columns - 1) / 2 * self.column_spacing
+            + self.column * (rows - 1) / 2 * self.row_spacing
+            + self.normal * (self.locations[-1] - self.locations[0]) / 2
+        )
+
+    @property
+    def extent(self) -> float:
+        """Length of the volume's bounding-box diagonal in mm"""
+        slices, rows, columns = self.volume.shape
+        return float(
+            np.linalg.norm(
+                [
+                    columns * self.column_spacing,
+                    rows * self.row_spacing,
+                    self.locations[-1] - self.locations[0] + self.slice_spacing,
+                ]
+            )
+        )
+
+    def to_index(
+        self, points: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(z, y, x) fractional indices of patient points ``(..., 3)``; NaN outside"""
+        offset = points - self.origin
+        x = offset @ self.row / self.column_spacing
+        y = offset @ self.column / self.row_spacing
+        # Slice locations need not be evenly spaced
+        z = np.interp(
+            points @ self.normal,
+            self.locations,
+            np.arange(len(self.locations), dtype=float),
+            left=np.nan,
+            right=np.nan,
+        )
+        return z, y, x
+
+    def sample(self, points: np.ndarray) -> np.ndarray:
+        """Trilinear interpolation at patient points; NaN outside the volume"""
+        z, y, x = self.to_index(points)
+        slices, rows, columns = self.volume.shape
+        inside = (
+            ~np.isnan(z)
+            & (y >= 0)
+            & (y <= rows - 1)
+            & (x >= 0)
+            & (x <= columns - 1)
+        )
+        z, y, x = (np.where(inside, axis, 0.0) for axis in (z, y, x))
+
+        z0, y0, x0 = (np.floor(axis).astype(np.intp) for axis in (z, y, x))
+        z1 = np.minimum(z0 + 1, slices - 1)
+        y1 = np.minimum(y0 + 1, rows - 1)
+        x1 = np.minimum(x0 + 1, columns - 1)
+        fz, fy, fx = z - z0, y - y0, x - x0
+
+        v = self.volume
+
+        def lerp_x(zi, yi):
+            return v[zi, yi, x0] * (1 - fx) + v[zi, yi, x1] * fx
+
+        front = lerp_x(z0, y0) * (1 - fy) + lerp_x(z0, y1) * fy
+        back = lerp_x(z1, y0) * (1 - fy) + lerp_x(z1, y1) * fy
+        values = (front * (1 - fz) + back * fz).astype(np.float32)
+        values[~inside] = np.nan
+        return values
+
+
+def _plane_grid(
+    center: np.ndarray,
+    row: np.ndarray,
+    column: np.ndarray,
+    width: int,
+    height: int,
+    spacing: float,
+) -> np.ndarray:
+    """Patient coordinates ``(height, width, 3)`` of a plane's pixels"""
+    u = (np.arange(width) - (width - 1) / 2) * spacing
+    v = (np.arange(height) - (height - 1) / 2) * spacing
+    return center + v[:, None, None] * column + u[None, :, None] * row
+
+
+def _curve_samples(points, spacing: float) -> np.ndarray:
+    """Polyline resampled at ``spacing`` mm along its length"""
+    points = np.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 3 or len(points) < 2:
+        raise ResliceError("points must be a polyline of at least two 3D points")
+    segments = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    lengths = np.concatenate([[0], np.cumsum(segments)])
+    if lengths[-1] <= 0:
+        raise ResliceError("points must not all coincide")
+    count = min(int(lengths[-1] / spacing) + 1, MAX_OUTPUT_SIZE)
+    positions = np.linspace(0, lengths[-1], count)
+    return np.stack(
+        [np.interp(positions, lengths, points[:, i]) for i in range(3)], axis=1
+    )
+
+
+def compute_reslice(volume: np.ndarray, geometry: dict, params: dict) -> np.ndarray:
+    """Reformatted image in modality units (NaN outside the volume)"""
+    sampler = VolumeSampler(volume, geometry)
+    mode = params.get("mode", "mpr")
+    if mode not in RESLICE_MODES:
+        raise ResliceError(f"mode must be one of {', '.join(sorted(RESLICE_MODES))}")
+
+    spacing = float(
+        params.get("spacing") or min(sampler.row_spacing, sampler.column_spacing)
+    )
+    if spacing <= 0:
+        raise ResliceError("spacing must be positive")
+    default_size = min(int(sampler.extent / spacing), MAX_OUTPUT_SIZE)
+    height = int(params.get("height") or default_size)
+
+    if mode == "curved":
+        # Each curve sample contributes one column, extended along column_direction
+        up = _unit(
+            params.get("column_direction") or sampler.normal, "column_direction"
+        )
+        curve = _curve_samples(params.get("points"), spacing)
+        if not 0 < height <= MAX_OUTPUT_SIZE:
+            raise ResliceError(f"height must be between 1 and {MAX_OUTPUT_SIZE}")
+        v = (np.arange(height) - (height - 1) / 2) * spacing
+        return sampler.sample(curve[None, :, :] + v[:, None, None] * up)
+
+    row = _unit(params.get("row_direction") or sampler.row, "row_direction")
+    column = _unit(
+        params.get("column_direction") or sampler.column, "column_direction"
+    )
+    # Make the column direction orthogonal to the row direction
+    column = column - (column @ row) * row
+    if np.linalg.norm(column) < 1e-6:
+        raise ResliceError("row_direction and column_direction must not be parallel")
+    column /= np.linalg.norm(column)
+    normal = np.cross(row, column)
+
+    center = np.asarray(params.get("center") or sampler.center, dtype=float)
+    if center.shape != (3,):
+        raise ResliceError("center must be a 3D point")
+    width = int(params.get("width") or default_size)
+    if not (0 < width <= MAX_OUTPUT_SIZE and 0 < height <= MAX_OUTPUT_SIZE):
+        raise ResliceError(f"width and height must be between 1 and {MAX_OUTPUT_SIZE}")
+    grid = _plane_grid(center, row, column, width, height, spacing)
+
+    thickness = float(params.get("thickness") or 0)
+    if mode == "mpr" or thickness <= 0:
+        return sampler.sample(grid)
+
+    step = min(spacing, sampler.slice_spacing)
+    count = min(max(int(round(thickness / step)) + 1, 2), MAX_SLAB_SAMPLES)
+    result = None
+    valid = np.zeros((height, width), dtype=np.int32)
+    for offset in np.linspace(-thickness / 2, thickness / 2, count):
+        plane = sampler.sample(grid + offset * normal)
+        inside = ~np.isnan(plane)
+        valid += inside
+        if result is None:
+            result = plane if mode != "avg" else np.where(inside, plane, 0)
+        elif mode == "mip":
+            result = np.fmax(result, plane)
+        elif mode == "minip":
+            result = np.fmin(result, plane)
+        else:
+            result += np.where(inside, plane, 0)
+
+    if mode == "avg":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.where(valid > 0, result / valid, np.nan).astype(np.float32)
+    return result
+
+
+def render_reslice(image: np.ndarray, params: dict, geometry: dict) -> bytes:
+    """Encode a reformat as windowed PNG/JPEG or raw float32 ``.npy``"""
+    output_format = params.get("format", "png")
+    if output_format == "npy":
+        buffer = BytesIO()
+        np.save(buffer, image.astype(np.float32))
+        return buffer.getvalue()
+
+    finite = image[~np.isnan(image)]
+    if finite.size == 0:
+        raise ResliceError("The requested plane does not intersect the volume")
+    background = float(finite.min())
+    image = np.where(np.isnan(image), background, image)
+
+    center = params.get("window_center", geometry.get("window_center"))
+    width = params.get("window_width", geometry.get("window_width"))
+    if center is None or not width:
+        center, width = percentile_window(image)
+    display = window_to_uint8(image, center, width)
+    return encode_image(display, ".jpg" if output_format == "jpeg" else ".png")
+
+
+def reslice(study, series_uid: str, geometry: dict, params: dict) -> bytes:
+    """Cached reformat of a series volume"""
+    if params.get("format", "png") not in RESLICE_FORMATS:
+        raise ResliceError(f"format must be one of {', '.join(RESLICE_FORMATS)}")
+
+    source = volume_path(study, series_uid)
+    variant = "reslice-" + hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()
+    cached = hot_cache.lookup(source, variant=variant)
+    if cached:
+        with open(cached, "rb") as f:
+            return f.read()
+
+    image = compute_reslice(open_volume(study, series_uid), geometry, params)
+    data = render_reslice(image, params, geometry)
+    hot_cache.put(source, data, variant=variant)
+    return data
@@ -0,0 +1,224 @@
+"""
+Region-of-interest statistics over decoded pixels and series volumes.
+
+2D regions (polygon, ellipse, rectangle) are given in image pixel
+coordinates ``[column, row]`` of one frame; 3D regions (sphere in patient
+coordinates, or a bit-packed voxel mask) are evaluated on the memory-mapped
+series volume. All values are in modality units (HU for CT) and sizes are
+reported in mm using PixelSpacing and the slice spacing.
+"""
+
+from typing import Optional, Tuple
+import base64
+
+import cv2
+import numpy as np
+import pydicom
+
+from .imaging import (
+    first_value,
+    frame_count,
+    get_frame,
+    is_color,
+    modality_units,
+    read_dataset,
+)
+
+ROI_SHAPES = {"polygon", "ellipse", "rectangle"}
+VOLUME_ROI_SHAPES = {"sphere", "mask"}
+DEFAULT_BINS = 64
+MAX_BINS = 4096
+
+
+class RoiError(ValueError):
+    """Invalid region of interest"""
+
+
+def pixel_spacing(ds: pydicom.Dataset) -> Tuple[Optional[float], Optional[float]]:
+    """(row, column) spacing in mm, from PixelSpacing or ImagerPixelSpacing"""
+    for keyword in ("PixelSpacing", "ImagerPixelSpacing"):
+        value = ds.get(keyword)
+        if value is not None and len(value) == 2:
+            return float(value[0]), float(value[1])
+    return None, None
+
+
+def region_statistics(values: np.ndarray, bins: int = DEFAULT_BINS) -> dict:
+    """Summary statistics and histogram of the values inside a region"""
+    if values.size == 0:
+        raise RoiError("The region contains no pixels")
+    values = values.astype(np.float64, copy=False)
+    bins = min(max(int(bins), 1), MAX_BINS)
+    counts, edges = np.histogram(values, bins=bins)
+    p5, median, p95 = np.percentile(values, [5, 50, 95])
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "median": float(median),
+        "p5": float(p5),
+        "p95": float(p95),
+        "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+    }
+
+
+def _points(value, name: str, count: Optional[int] = None) -> np.ndarray:
+    points = np.asarray(value if value is not None else [], dtype=float)
+    if points.ndim == 1:
+        points = points[None, :]
+    if points.shape[-1] != 2 or (count and len(points) != count):
+        raise RoiError(f"{name} must be {count or 'a list of'} [column, row] points")
+    return points
+
+
+def region_mask(shape: Tuple[int, int], roi: dict) -> np.ndarray:
+    """Boolean mask of a 2D region on an image of ``shape`` (rows, columns)"""
+    kind = roi.get("shape")
+    mask = np.zeros(shape, dtype=np.uint8)
+    if kind == "polygon":
+        points = _points(roi.get("points"), "points")
+        if len(points) < 3:
+            raise RoiError("A polygon needs at least three points")
+        # Sub-pixel vertices, rasterized by pixel centers
+        cv2.fillPoly(mask, [np.round(points * 16).astype(np.int32)], 1, shift=4)
+    elif kind == "rectangle":
+        (x0, y0), (x1, y1) = _points(roi.get("points"), "points", 2)
+        rows, columns = np.ogrid[: shape[0], : shape[1]]
+        mask = (
+            (columns >= min(x0, x1))
+            & (columns <= max(x0, x1))
+            & (rows >= min(y0, y1))
+            & (rows <= max(y0, y1))
+        )
+    elif kind == "ellipse":
+        (cx, cy), = _points(roi.get("center"), "center", 1)
+        radii = roi.get("radii") or []
+        if len(radii) != 2 or min(radii) <= 0:
+            raise RoiError("radii must be two positive [column, row] radii")
+        rows, columns = np.ogrid[: shape[0], : shape[1]]
+        mask = ((columns - cx) / radii[0]) ** 2 + ((rows - cy) / radii[1]) ** 2 <= 1
+    else:
+        raise RoiError(f"shape must be one of {', '.join(sorted(ROI_SHAPES))}")
+    return mask.astype(bool)
+
+
+def instance_roi_stats(file_path: str, roi: dict) -> dict:
+    """Statistics of a 2D region on one frame of an instance"""
+    ds = read_dataset(file_path, cached=True)
+    if "PixelData" not in ds:
+        raise RoiError("Instance has no pixel data")
+    if is_color(ds):
+        raise RoiError("Statistics are only available for grayscale images")
+    frame = int(roi.get("frame") or 0)
+    if not 0 <= frame < frame_count(ds):
+        raise RoiError(f"frame must be between 0 and {frame_count(ds) - 1}")
+
+    pixels = get_frame(ds, frame)
+    mask = region_mask(pixels.shape, roi)
+    stats = region_statistics(pixels[mask], roi.get("bins") or DEFAULT_BINS)
+
+    row_spacing, column_spacing = pixel_spacing(ds)
+    pixel_area = row_spacing * column_spacing if row_spacing else None
+    stats.update(
+        {
+            "shape": roi["shape"],
+            "frame": frame,
+            "units": modality_units(ds),
+            "pixel_spacing": [row_spacing, column_spacing] if row_spacing else None,
+            "area_mm2": stats["count"] * pixel_area if pixel_area else None,
+        }
+    )
+    thickness = first_value(ds.get("SliceThickness"))
+    if pixel_area and thickness:
+        stats["volume_mm3"] = stats["area_mm2"] * thickness
+    return stats
+
+
+def _voxel_size(geometry: dict) -> Tuple[float, float, float]:
+    row_spacing, column_spacing = geometry["pixel_spacing"]
+    slice_spacing = abs(geometry.get("slice_spacing") or 0) or float(
+        geometry.get("slice_thickness") or 1.0
+    )
+    return slice_spacing, row_spacing, column_spacing
+
+
+def _sphere_region(volume: np.ndarray, geometry: dict, roi: dict):
+    """Bounding sub-volume of a sphere and the voxels inside it"""
+    center = np.asarray(roi.get("center") or [], dtype=float)
+    radius = float(roi.get("radius") or 0)
+    if center.shape != (3,) or radius <= 0:
+        raise RoiError("A sphere needs a 3D center and a positive radius (mm)")
+
+    origin = np.array(geometry["origin"], dtype=float)
+    orientation = geometry["orientation"]
+    row = np.array(orientation[:3], dtype=float)
+    column = np.array(orientation[3:], dtype=float)
+    normal = np.array(geometry["normal"], dtype=float)
+    locations = np.array(geometry["slice_locations"], dtype=float)
+    row_spacing, column_spacing = geometry["pixel_spacing"]
+    slices, rows, columns = volume.shape
+
+    # In-plane offsets along the image axes, out-of-plane along the normal
+    offset = center - origin
+    cx = offset @ row / column_spacing
+    cy = offset @ column / row_spacing
+    cz = center @ normal
+
+    z = np.nonzero(np.abs(locations - cz) <= radius)[0]
+    y0 = max(int(np.floor(cy - radius / row_spacing)), 0)
+    y1 = min(int(np.ceil(cy + radius / row_spacing)) + 1, rows)
+    x0 = max(int(np.floor(cx - radius / column_spacing)), 0)
+    x1 = min(int(np.ceil(cx + radius / column_spacing)) + 1, columns)
+    if not len(z) or y0 >= y1 or x0 >= x1:
+        raise RoiError("The sphere does not intersect the volume")
+
+    z0, z1 = int(z[0]), int(z[-1]) + 1
+    dz = (locations[z0:z1] - cz)[:, None, None]
+    dy = ((np.arange(y0, y1) - cy) * row_spacing)[None, :, None]
+    dx = ((np.arange(x0, x1) - cx) * column_spacing)[None, None, :]
+    inside = dz**2 + dy**2 + dx**2 <= radius**2
+    return volume[z0:z1, y0:y1, x0:x1], inside
+
+
+def _mask_region(volume: np.ndarray, roi: dict):
+    """Whole volume and a bit-packed (``np.packbits``, C order) voxel mask"""
+    try:
+        packed = np.frombuffer(base64.b64decode(roi.get("mask") or ""), dtype=np.uint8)
+    except ValueError:
+        raise RoiError("mask must be base64-encoded packed bits")
+    if packed.size != (volume.size + 7) // 8:
+        raise RoiError(
+            f"mask must hold {volume.size} bits for volume shape {list(volume.shape)}"
+        )
+    inside = np.unpackbits(packed, count=volume.size).astype(bool)
+    return volume, inside.reshape(volume.shape)
+
+
+def volume_roi_stats(volume: np.ndarray, geometry: dict, roi: dict) -> dict:
+    """Statistics of a 3D region of a series volume"""
+    kind = roi.get("shape")
+    if kind == "sphere":
+        region, inside = _sphere_region(volume, geometry, roi)
+    elif kind == "mask":
+        region, inside = _mask_region(volume, roi)
+    else:
+        raise RoiError(f"shape must be one of {', '.join(sorted(VOLUME_ROI_SHAPES))}")
+
+    stats = region_statistics(
+        np.asarray(region)[inside], roi.get("bins") or DEFAULT_BINS
+    )
+    voxel = _voxel_size(geometry)
+    voxel_volume = float(np.prod(voxel))
+    stats.update(
+        {
+            "shape": kind,
+            "units": geometry.get("units", ""),
+            "voxel_size": list(voxel),
+            "slice_count": int(inside.any(axis=(1, 2)).sum()),
+            "volume_mm3": stats["count"] * voxel_volume,
+            "volume_ml": stats["count"] * voxel_volume / 1000.0,
+        }
+    )
+    return stats
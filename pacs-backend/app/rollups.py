@@ -0,0 +1,314 @@
+"""
+Dashboard rollups.
+
+Admin monitoring and center analytics read small counter tables instead of
+counting and grouping every study and DICOM file on each refresh:
+
+- ``study_rollups``: studies per center, modality and status
+- ``center_rollups``: studies and DICOM files per center
+- ``activity_rollups``: studies and files created per center and UTC hour
+  (a day is 24 rows, so "last 24 hours" is read to the hour)
+- ``uploader_rollups``: studies uploaded per user
+
+Every ORM flush that creates, deletes or re-files a study (moving its files'
+counts along), or creates or deletes a DICOM file, adds its deltas with
+upserts in the same transaction, so concurrent writers never overwrite each
+other's counts. Writes outside the ORM are not seen; ``reconcile_rollups``
+recounts everything from the base tables and Celery beat runs it every
+``ROLLUP_RECONCILE_SECONDS``.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+import logging
+import os
+
+from sqlalchemy import (
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    literal,
+    literal_column,
+    select,
+    text,
+    union_all,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from .database import (
+    ActivityRollup,
+    CenterRollup,
+    DicomFile,
+    Study,
+    StudyRollup,
+    UploaderRollup,
+)
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_RECONCILE_SECONDS = float(os.getenv("ROLLUP_RECONCILE_SECONDS", "3600"))
+
+ROLLUPS = (StudyRollup, CenterRollup, ActivityRollup, UploaderRollup)
+# Study columns the rollups are keyed by
+STUDY_KEYS = ("diagnostic_center_id", "modality", "status", "uploaded_by_id", "created_at")
+
+
+def _track_previous(target, value, oldvalue, initiator):
+    """No-op; registered for its active_history"""
+
+
+# Load the replaced value of an unloaded key, so its old counter can be decremented
+for _field in STUDY_KEYS[:4]:
+    event.listen(getattr(Study, _field), "set", _track_previous, active_history=True)
+
+
+def hour_of(value: Optional[datetime]) -> datetime:
+    """UTC hour of a timestamp (naive ones are UTC, as SQLite stores them), or of now"""
+    if value is None:
+        value = datetime.now(timezone.utc)
+    elif value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    else:
+        value = value.astimezone(timezone.utc)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_bucket(column, dialect: str):
+    """SQL counterpart of ``hour_of``, stored in the same form"""
+    if dialect == "postgresql":
+        return func.timezone("UTC", func.date_trunc("hour", func.timezone("UTC", column)))
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+
+Deltas = Dict[Tuple[type, tuple, str], int]
+
+
+def _study_values(instance) -> Tuple[dict, dict]:
+    """Rollup keys of a flushed study before and after the flush"""
+    state = inspect(instance)
+    old, new = {}, {}
+    for field in STUDY_KEYS:
+        history = state.attrs[field].history
+        current = history.added or history.unchanged
+        new[field] = current[0] if current else None
+        old[field] = history.deleted[0] if history.deleted else new[field]
+    return old, new
+
+
+def _count_study(deltas: Deltas, values: dict, sign: int):
+    center = values["diagnostic_center_id"]
+    if center is None or values["status"] is None:
+        return
+    deltas[StudyRollup, (center, values["modality"] or "", values["status"]), "studies"] += sign
+    deltas[CenterRollup, (center,), "studies"] += sign
+    deltas[ActivityRollup, (hour_of(values["created_at"]), center), "studies"] += sign
+    if values["uploaded_by_id"] is not None:
+        deltas[UploaderRollup, (values["uploaded_by_id"],), "studies"] += sign
+
+
+def _study_centers(session, study_ids) -> Dict[str, int]:
+    """Center of each study, from the session where loaded"""
+    centers = {}
+    for study_id in study_ids:
+        instance = session.identity_map.get(identity_key(Study, study_id))
+        if instance is not None and "diagnostic_center_id" in inspect(instance).dict:
+            centers[study_id] = instance.diagnostic_center_id
+    missing = set(study_ids) - set(centers)
+    if missing:
+        rows = session.connection().execute(
+            select(Study.id, Study.diagnostic_center_id).where(Study.id.in_(missing))
+        )
+        centers.update(dict(rows.all()))
+    return centers
+
+
+def _apply(connection, deltas: Deltas):
+    """Add the deltas to the rollup rows, creating missing rows"""
+    rows = defaultdict(lambda: defaultdict(dict))
+    for (model, key, column), count in deltas.items():
+        if count:
+            rows[model][key][column] = count
+    dml = postgresql if connection.dialect.name == "postgresql" else sqlite
+    for model in ROLLUPS:
+        if not rows[model]:
+            continue
+        table = model.__table__
+        keys = [column.name for column in table.primary_key.columns]
+        counters = [column.name for column in table.columns if not column.primary_key]
+        values = [
+            {**dict(zip(keys, key)), **{column: counts.get(column, 0) for column in counters}}
+            # One order across writers, so concurrent upserts cannot deadlock
+            for key, counts in sorted(rows[model].items(), key=lambda item: str(item[0]))
+        ]
+        statement = dml.insert(table).values(values)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=keys,
+                set_={column: table.c[column] + statement.excluded[column] for column in counters},
+            )
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def load_rollup_keys(session, flush_context, instances):
+    # Expired keys of changed and deleted rows cannot be read once flushed;
+    # reading one attribute loads them all
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, (Study, DicomFile)):
+            instance.created_at
+
+
+def _count_files(deltas: Deltas, center, created_at, count: int):
+    if center is None:
+        return
+    deltas[CenterRollup, (center,), "dicom_files"] += count
+    deltas[ActivityRollup, (hour_of(created_at), center), "dicom_files"] += count
+
+
+def _move_files(session, deltas: Deltas, refiled: Dict[str, Tuple], flushed_ids):
+    """Move the counts of re-filed studies' files written before this flush"""
+    rows = session.connection().execute(
+        select(DicomFile.study_id, DicomFile.created_at).where(
+            DicomFile.study_id.in_(refiled), DicomFile.id.notin_(flushed_ids)
+        )
+    )
+    for study_id, created_at in rows:
+        old, new = refiled[study_id]
+        _count_files(deltas, old, created_at, -1)
+        _count_files(deltas, new, created_at, 1)
+
+
+@event.listens_for(Session, "after_flush")
+def count_writes(session, flush_context):
+    deltas: Deltas = defaultdict(int)
+    files = []
+    # Study id: (old center, new center)
+    refiled: Dict[str, Tuple] = {}
+
+    for instance in session.new:
+        if isinstance(instance, Study):
+            _count_study(deltas, _study_values(instance)[1], 1)
+        elif isinstance(instance, DicomFile):
+            files.append((instance, 1))
+    for instance in session.dirty:
+        if isinstance(instance, Study):
+            old, new = _study_values(instance)
+            if old != new:
+                _count_study(deltas, old, -1)
+                _count_study(deltas, new, 1)
+            if old["diagnostic_center_id"] != new["diagnostic_center_id"]:
+                refiled[instance.id] = (
+                    old["diagnostic_center_id"],
+                    new["diagnostic_center_id"],
+                )
+    for instance in session.deleted:
+        if isinstance(instance, Study):
+            _count_study(deltas, _study_values(instance)[0], -1)
+        elif isinstance(instance, DicomFile):
+            files.append((instance, -1))
+
+    if files:
+        centers = _study_centers(session, {instance.study_id for instance, _ in files})
+        for instance, sign in files:
+            center = centers.get(instance.study_id)
+            if sign < 0 and instance.study_id in refiled:
+                # Counted where its study was filed before this flush
+                center = refiled[instance.study_id][0]
+            # A new file's server-set created_at is not loaded; it is now
+            _count_files(deltas, center, inspect(instance).dict.get("created_at"), sign)
+    if refiled:
+        _move_files(
+            session,
+            deltas,
+            refiled,
+            [instance.id for instance, sign in files if sign > 0],
+        )
+
+    if any(deltas.values()):
+        _apply(session.connection(), deltas)
+
+
+def _totals(connection) -> Tuple[int, int]:
+    return tuple(
+        connection.execute(
+            select(
+                func.coalesce(func.sum(CenterRollup.studies), 0),
+                func.coalesce(func.sum(CenterRollup.dicom_files), 0),
+            )
+        ).one()
+    )
+
+
+def reconcile_rollups(connection):
+    """Recount every rollup from the studies and files tables"""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        # Writers' upserts wait for the recount to commit, so none is lost
+        connection.execute(
+            text(
+                "LOCK TABLE study_rollups, center_rollups, activity_rollups, "
+                "uploader_rollups IN EXCLUSIVE MODE"
+            )
+        )
+    before = _totals(connection)
+    for model in ROLLUPS:
+        connection.execute(delete(model))
+
+    modality = func.coalesce(Study.modality, literal_column("''"))
+    connection.execute(
+        insert(StudyRollup).from_select(
+            ["diagnostic_center_id", "modality", "status", "studies"],
+            select(Study.diagnostic_center_id, modality, Study.status, func.count())
+            .where(Study.status.isnot(None))
+            .group_by(Study.diagnostic_center_id, modality, Study.status),
+        )
+    )
+    connection.execute(
+        insert(UploaderRollup).from_select(
+            ["user_id", "studies"],
+            select(Study.uploaded_by_id, func.count()).group_by(Study.uploaded_by_id),
+        )
+    )
+
+    items = union_all(
+        select(
+            Study.diagnostic_center_id.label("center"),
+            hour_bucket(Study.created_at, dialect).label("hour"),
+            literal(1).label("studies"),
+            literal(0).label("dicom_files"),
+        ),
+        select(
+            Study.diagnostic_center_id,
+            hour_bucket(DicomFile.created_at, dialect),
+            literal(0),
+            literal(1),
+        ).join(Study, Study.id == DicomFile.study_id),
+    ).subquery("items")
+    studies, dicom_files = func.sum(items.c.studies), func.sum(items.c.dicom_files)
+    connection.execute(
+        insert(CenterRollup).from_select(
+            ["diagnostic_center_id", "studies", "dicom_files"],
+            select(items.c.center, studies, dicom_files).group_by(items.c.center),
+        )
+    )
+    connection.execute(
+        insert(ActivityRollup).from_select(
+            ["hour", "diagnostic_center_id", "studies", "dicom_files"],
+            select(items.c.hour, items.c.center, studies, dicom_files)
+            .where(items.c.hour.isnot(None))
+            .group_by(items.c.hour, items.c.center),
+        )
+    )
+
+    after = _totals(connection)
+    if after != before:
+        logger.warning(
+            f"Dashboard rollups had drifted: {before[0]} studies and {before[1]} files "
+            f"counted, recounted {after[0]} and {after[1]}"
+        )
+    return after
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 import psutil
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy import func
 
 from ..database import (
@@ -12,11 +12,16 @@ from ..database import (
     DiagnosticCenter,
     UserRole,
     Study,
-    DicomFile,
     AuditLog,
     SystemSettings,
+    ActivityRollup,
+    CenterRollup,
+    StudyRollup,
+    UploaderRollup,
 )
 from ..auth import require_admin, get_password_hash
+from ..replicas import get_read_db
+from ..rollups import hour_of
 from .. import schemas
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -200,7 +205,7 @@ async def delete_diagnostic_center(
 
 @router.get("/system-monitoring")
 async def get_system_monitoring(
-    db: Session = Depends(get_db), current_user: User = Depends(require_admin)
+    db: Session = Depends(get_read_db), current_user: User = Depends(require_admin)
 ):
     """Get real-time system monitoring data"""
 
@@ -208,13 +213,20 @@ async def get_system_monitoring(
     memory = psutil.virtual_memory()
     disk = psutil.disk_usage("/")
 
-    total_studies = db.query(Study).count()
-    total_dicom_files = db.query(DicomFile).count()
+    # Counts come from the rollups (app/rollups.py), not the studies and files tables
+    total_studies, total_dicom_files = db.query(
+        func.coalesce(func.sum(CenterRollup.studies), 0),
+        func.coalesce(func.sum(CenterRollup.dicom_files), 0),
+    ).one()
 
-    yesterday = datetime.now() - timedelta(days=1)
-    recent_studies = db.query(Study).filter(Study.created_at >= yesterday).count()
-    recent_uploads = (
-        db.query(DicomFile).filter(DicomFile.created_at >= yesterday).count()
+    # Hourly buckets: the last 24 hours plus the part of the hour before them
+    recent_studies, recent_uploads = (
+        db.query(
+            func.coalesce(func.sum(ActivityRollup.studies), 0),
+            func.coalesce(func.sum(ActivityRollup.dicom_files), 0),
+        )
+        .filter(ActivityRollup.hour >= hour_of(datetime.now(timezone.utc) - timedelta(days=1)))
+        .one()
     )
 
     center_storage = db.query(
@@ -235,6 +247,7 @@ async def get_system_monitoring(
         {"name": "CT Scan AI", "status": "operational", "last_check": datetime.now()},
     ]
 
+    yesterday = datetime.now() - timedelta(days=1)
     recent_logs = (
         db.query(AuditLog)
         .filter(AuditLog.timestamp >= yesterday)
@@ -297,7 +310,7 @@ async def get_system_monitoring(
 @router.get("/center-analytics/{center_id}")
 async def get_center_analytics(
     center_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_admin),
 ):
     """Get detailed analytics for a specific center"""
@@ -306,17 +319,21 @@ async def get_center_analytics(
     if not center:
         raise HTTPException(status_code=404, detail="Diagnostic center not found")
 
+    # A few rollup rows per center instead of grouping all its studies
+    count = func.sum(StudyRollup.studies)
     studies_by_status = (
-        db.query(Study.status, func.count(Study.id).label("count"))
-        .filter(Study.diagnostic_center_id == center_id)
-        .group_by(Study.status)
+        db.query(StudyRollup.status, count.label("count"))
+        .filter(StudyRollup.diagnostic_center_id == center_id)
+        .group_by(StudyRollup.status)
+        .having(count > 0)
         .all()
     )
 
     studies_by_modality = (
-        db.query(Study.modality, func.count(Study.id).label("count"))
-        .filter(Study.diagnostic_center_id == center_id)
-        .group_by(Study.modality)
+        db.query(StudyRollup.modality, count.label("count"))
+        .filter(StudyRollup.diagnostic_center_id == center_id)
+        .group_by(StudyRollup.modality)
+        .having(count > 0)
         .all()
     )
 
@@ -330,15 +347,9 @@ async def get_center_analytics(
     )
 
     staff_stats = (
-        db.query(
-            User.id,
-            User.full_name,
-            User.role,
-            func.count(Study.id).label("studies_count"),
-        )
-        .join(Study, User.id == Study.uploaded_by_id)
-        .filter(User.diagnostic_center_id == center_id)
-        .group_by(User.id, User.full_name, User.role)
+        db.query(User.id, User.full_name, User.role, UploaderRollup.studies)
+        .join(UploaderRollup, UploaderRollup.user_id == User.id)
+        .filter(User.diagnostic_center_id == center_id, UploaderRollup.studies > 0)
         .all()
     )
 
@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from ..database import get_db, AuditLog, User
 from ..auth import get_current_user, require_admin
+from ..replicas import get_read_db
 from .. import schemas
 
 router = APIRouter(prefix="/admin", tags=["audit"])
@@ -16,7 +17,7 @@ async def get_audit_logs(
     action: Optional[str] = None,
     user_id: Optional[int] = None,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Get audit logs (admin only)"""
     query = db.query(AuditLog)
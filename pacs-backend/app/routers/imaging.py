@@ -0,0 +1,593 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response
+from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+import base64
+import gzip
+import os
+
+from ..database import get_db, User, Study, DicomFile
+from ..auth import check_medical_access
+from ..cache import instance_cache
+from ..cine import (
+    CINE_MEDIA_TYPES,
+    cine_params,
+    cine_path,
+    generate_requested_cine,
+)
+from ..imaging import (
+    encode_image,
+    frame_count,
+    get_frame,
+    header_window,
+    is_color,
+    read_dataset,
+    to_display,
+)
+from ..pixel_stats import stats_for_file
+from ..pyramid import (
+    generate_instance_pyramid,
+    level_path,
+    read_level,
+    storable_pixels,
+)
+from ..series import group_by_series
+from ..study_metadata import generate_study_metadata, metadata_path, study_etag
+from ..reslice import RESLICE_FORMATS, ResliceError, reslice
+from ..roi_stats import RoiError, instance_roi_stats, volume_roi_stats
+from ..storage import build_failure, claim_build, inputs_version
+from ..volume import build_requested_volume, load_geometry, open_volume, volume_path
+from .. import schemas
+from ..thumbnails import (
+    generate_series_thumbnail,
+    key_image_uids,
+    representative_instance,
+    thumbnail_path,
+)
+
+router = APIRouter(prefix="/studies", tags=["imaging"])
+
+
+def _get_study(db: Session, study_id: str) -> Study:
+    study = db.query(Study).filter(Study.id == study_id).first()
+    if not study:
+        raise HTTPException(status_code=404, detail="Study not found")
+    return study
+
+
+def _get_instance(db: Session, file_id: int):
+    dicom_file = db.query(DicomFile).filter(DicomFile.id == file_id).first()
+    if not dicom_file:
+        raise HTTPException(status_code=404, detail="DICOM file not found")
+    study = _get_study(db, dicom_file.study_id)
+    if not os.path.exists(dicom_file.file_path):
+        raise HTTPException(status_code=404, detail="DICOM file not found on disk")
+    return dicom_file, study
+
+
+async def _resolve_level(
+    study: Study, dicom_file: DicomFile, level: int
+) -> Tuple[int, Optional[dict]]:
+    """
+    Closest available pyramid level not finer than requested (0 = original),
+    and the pyramid manifest when it was loaded
+    """
+    if level == 0:
+        return 0, None
+    manifest = await run_in_threadpool(generate_instance_pyramid, study, dicom_file)
+    if not manifest or not manifest["levels"]:
+        return 0, manifest
+    return min(level, max(entry["level"] for entry in manifest["levels"])), manifest
+
+
+@router.get("/{study_id}/thumbnails")
+async def get_study_thumbnails(
+    study_id: str,
+    inline: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """List one thumbnail per series; ``inline=true`` embeds the JPEG data"""
+    study = _get_study(db, study_id)
+    files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    series = group_by_series(files)
+    key_uids = key_image_uids(files) if inline else set()
+
+    thumbnails = []
+    for series_uid, instances in series.items():
+        path = thumbnail_path(study, series_uid)
+        if inline and not os.path.exists(path):
+            path = await run_in_threadpool(
+                generate_series_thumbnail, study, series_uid, instances, key_uids
+            )
+
+        entry = {
+            "series_uid": series_uid,
+            "modality": instances[0].modality_dicom,
+            "instance_count": len(instances),
+            "file_id": representative_instance(instances, key_uids).id,
+            "url": f"/studies/{study.id}/thumbnails/{series_uid}",
+            "available": bool(path and os.path.exists(path)),
+        }
+        if inline and entry["available"]:
+            with open(path, "rb") as f:
+                entry["data"] = "data:image/jpeg;base64," + base64.b64encode(
+                    f.read()
+                ).decode()
+        thumbnails.append(entry)
+
+    return {"study_id": study.id, "thumbnails": thumbnails}
+
+
+@router.get("/{study_id}/thumbnails/{series_uid}")
+async def get_series_thumbnail(
+    study_id: str,
+    series_uid: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Series thumbnail as JPEG, rendered on first request if ingest has not yet"""
+    study = _get_study(db, study_id)
+
+    path = thumbnail_path(study, series_uid)
+    if not os.path.exists(path):
+        files = (
+            db.query(DicomFile)
+            .filter(DicomFile.study_id == study.id, DicomFile.series_uid == series_uid)
+            .all()
+        )
+        if not files:
+            raise HTTPException(status_code=404, detail="Series not found")
+        instances = group_by_series(files)[series_uid]
+        key_uids = key_image_uids(
+            db.query(DicomFile)
+            .filter(DicomFile.study_id == study.id, DicomFile.modality_dicom == "KO")
+            .all()
+        )
+        path = await run_in_threadpool(
+            generate_series_thumbnail, study, series_uid, instances, key_uids
+        )
+        if not path:
+            raise HTTPException(
+                status_code=404, detail="No renderable image in series"
+            )
+
+    return FileResponse(
+        instance_cache.resolve(path),
+        media_type="image/jpeg",
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
+@router.get("/{study_id}/metadata")
+async def get_study_metadata(
+    study_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """
+    DICOM JSON headers of every instance, grouped by series, in one response.
+    Clients revalidate with If-None-Match; the ETag changes with the study.
+    """
+    study = _get_study(db, study_id)
+    etag = study_etag(db, study)
+    etag_header = f'W/"{etag}"'
+    headers = {
+        "ETag": etag_header,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag_header in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    path = metadata_path(study, etag)
+    if not os.path.exists(path):
+        files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+        if not files:
+            raise HTTPException(status_code=404, detail="Study has no files")
+        path = await run_in_threadpool(generate_study_metadata, study, files, etag)
+
+    with open(instance_cache.resolve(path), "rb") as f:
+        content = f.read()
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        content = gzip.decompress(content)
+
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip (RFC 9110 12.5.3)"""
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        parts = [part.strip() for part in coding.split(";")]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[parts[0].lower()] = quality
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+@router.get("/dicom/files/{file_id}/pyramid")
+async def get_pyramid_manifest(
+    file_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Available resolution levels of an instance; empty for small images"""
+    dicom_file, study = _get_instance(db, file_id)
+    manifest = await run_in_threadpool(generate_instance_pyramid, study, dicom_file)
+    return manifest or {"file_id": dicom_file.id, "levels": []}
+
+
+@router.get("/dicom/files/{file_id}/pixels")
+async def get_instance_pixels(
+    file_id: int,
+    level: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """
+    Stored pixel values at a pyramid level as lossless PNG (16-bit grayscale).
+    Signed data is shifted by the ``X-Pixel-Offset`` header value.
+    """
+    dicom_file, study = _get_instance(db, file_id)
+    level, manifest = await _resolve_level(study, dicom_file, level)
+    headers = {"Cache-Control": "private, max-age=86400", "X-Pyramid-Level": str(level)}
+
+    if level > 0:
+        headers["X-Pixel-Offset"] = str(manifest["pixel_offset"])
+        return FileResponse(
+            instance_cache.resolve(level_path(study, dicom_file, level)),
+            media_type="image/png",
+            headers=headers,
+        )
+
+    def encode_original():
+        ds = read_dataset(dicom_file.file_path, cached=True)
+        if "PixelData" not in ds:
+            raise HTTPException(status_code=404, detail="Instance has no pixel data")
+        pixels = ds.pixel_array
+        if frame_count(ds) > 1:
+            pixels = pixels[frame_count(ds) // 2]
+        pixels, offset = storable_pixels(ds, pixels)
+        return encode_image(pixels, ".png"), offset
+
+    content, offset = await run_in_threadpool(encode_original)
+    headers["X-Pixel-Offset"] = str(offset)
+    return Response(content=content, media_type="image/png", headers=headers)
+
+
+@router.get("/dicom/files/{file_id}/rendered")
+async def get_instance_rendered(
+    file_id: int,
+    level: int = Query(0, ge=0),
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = None,
+    quality: int = Query(85, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Windowed JPEG of an instance at a pyramid level, for progressive display"""
+    dicom_file, study = _get_instance(db, file_id)
+    level, _ = await _resolve_level(study, dicom_file, level)
+
+    def render():
+        if level > 0:
+            ds, pixels = read_level(study, dicom_file, level)
+        else:
+            ds = read_dataset(dicom_file.file_path, cached=True)
+            if "PixelData" not in ds:
+                raise HTTPException(status_code=404, detail="Instance has no pixel data")
+            pixels = get_frame(ds)
+
+        center, width = window_center, window_width
+        if (center is None or width is None) and not header_window(ds):
+            # Histogram window from ingest instead of a percentile pass here
+            stats = stats_for_file(dicom_file.file_path, dicom_file.instance_uid)
+            if stats and not is_color(ds):
+                center, width = stats["window_center"], stats["window_width"]
+        image = to_display(ds, pixels, center, width)
+        return encode_image(image, ".jpg", quality)
+
+    content = await run_in_threadpool(render)
+    return Response(
+        content=content,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "private, max-age=86400", "X-Pyramid-Level": str(level)},
+    )
+
+
+async def _series_volume(db: Session, study: Study, series_uid: str):
+    """
+    Geometry of the series volume. When it is missing, assembly is queued in
+    the background (None is returned, also while it is underway) or, without
+    a worker, done inline. A series that failed to assemble is a 422.
+    """
+    geometry = load_geometry(study, series_uid)
+    if geometry:
+        return geometry
+
+    instances = (
+        db.query(DicomFile)
+        .filter(DicomFile.study_id == study.id, DicomFile.series_uid == series_uid)
+        .all()
+    )
+    if not instances:
+        raise HTTPException(status_code=404, detail="Series not found")
+
+    path = volume_path(study, series_uid)
+    failure = build_failure(path, inputs_version(instances))
+    if failure:
+        raise HTTPException(status_code=422, detail=failure)
+    if not claim_build(path):
+        return None
+
+    try:
+        from ..celery_app import build_series_volume_async
+
+        build_series_volume_async.delay(study.id, series_uid)
+        return None
+    except Exception as e:
+        print(f"Background processing unavailable: {e}")
+
+    try:
+        geometry = await run_in_threadpool(
+            build_requested_volume, study, series_uid, instances
+        )
+    except Exception:
+        geometry = None
+    if not geometry:
+        raise HTTPException(
+            status_code=422,
+            detail=build_failure(path, inputs_version(instances))
+            or "Series cannot be assembled into a volume",
+        )
+    return geometry
+
+
+def _volume_pending():
+    return JSONResponse(
+        status_code=202,
+        content={"status": "building", "message": "Volume assembly queued"},
+        headers={"Retry-After": "5"},
+    )
+
+
+@router.get("/{study_id}/series/{series_uid}/volume/geometry")
+async def get_volume_geometry(
+    study_id: str,
+    series_uid: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Shape, dtype, data offset and patient-space geometry of a series volume"""
+    study = _get_study(db, study_id)
+    geometry = await _series_volume(db, study, series_uid)
+    if geometry is None:
+        return _volume_pending()
+    return geometry
+
+
+@router.get("/{study_id}/series/{series_uid}/volume")
+async def get_series_volume(
+    study_id: str,
+    series_uid: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """
+    The series as one ``.npy`` array (slices, rows, columns) in modality units.
+    Supports Range requests; slice ``z`` starts at
+    ``data_offset + z * rows * columns * itemsize``.
+    """
+    study = _get_study(db, study_id)
+    geometry = await _series_volume(db, study, series_uid)
+    if geometry is None:
+        return _volume_pending()
+
+    return FileResponse(
+        instance_cache.resolve(volume_path(study, series_uid)),
+        media_type="application/octet-stream",
+        headers={
+            "Cache-Control": "private, max-age=86400",
+            "X-Volume-Shape": ",".join(str(n) for n in geometry["shape"]),
+            "X-Volume-Dtype": geometry["dtype"],
+            "X-Data-Offset": str(geometry["data_offset"]),
+        },
+    )
+
+
+@router.post("/{study_id}/series/{series_uid}/reslice")
+async def reslice_series(
+    study_id: str,
+    series_uid: str,
+    request: schemas.ResliceRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Oblique MPR, thick-slab MIP/MinIP/average or curved reformat of a series"""
+    study = _get_study(db, study_id)
+    geometry = await _series_volume(db, study, series_uid)
+    if geometry is None:
+        return _volume_pending()
+
+    params = request.model_dump(exclude_none=True)
+    try:
+        content = await run_in_threadpool(reslice, study, series_uid, geometry, params)
+    except ResliceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return Response(
+        content=content,
+        media_type=RESLICE_FORMATS[request.format],
+        headers={"Cache-Control": "private, max-age=3600"},
+    )
+
+
+@router.post("/dicom/files/{file_id}/roi-stats")
+async def get_instance_roi_stats(
+    file_id: int,
+    request: schemas.RoiStatsRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Mean, std, range, histogram and area (mm²) of a 2D region in modality units"""
+    dicom_file, study = _get_instance(db, file_id)
+    try:
+        stats = await run_in_threadpool(
+            instance_roi_stats, dicom_file.file_path, request.model_dump()
+        )
+    except RoiError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"file_id": dicom_file.id, **stats}
+
+
+@router.post("/{study_id}/series/{series_uid}/roi-stats")
+async def get_volume_roi_stats(
+    study_id: str,
+    series_uid: str,
+    request: schemas.VolumeRoiStatsRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Mean, std, range, histogram and volume (mm³/ml) of a 3D region of a series"""
+    study = _get_study(db, study_id)
+    geometry = await _series_volume(db, study, series_uid)
+    if geometry is None:
+        return _volume_pending()
+
+    def compute():
+        return volume_roi_stats(
+            open_volume(study, series_uid), geometry, request.model_dump()
+        )
+
+    try:
+        stats = await run_in_threadpool(compute)
+    except RoiError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"series_uid": series_uid, **stats}
+
+
+def _cine_pending():
+    return JSONResponse(
+        status_code=202,
+        content={"status": "encoding", "message": "Cine encoding queued"},
+        headers={"Retry-After": "5"},
+    )
+
+
+async def _cine_response(
+    study: Study,
+    source: str,
+    instances: list,
+    output_format: str,
+    fps: Optional[float],
+    window_center: Optional[float],
+    window_width: Optional[float],
+):
+    """
+    Cached cine loop, or 202 while it is encoded in the background. A loop
+    that failed to encode is a 422.
+    """
+    options = (output_format, fps, window_center, window_width)
+    path = cine_path(study, source, cine_params(*options))
+    if not os.path.exists(path):
+        failure = build_failure(path, inputs_version(instances))
+        if failure:
+            raise HTTPException(status_code=422, detail=failure)
+        if not claim_build(path):
+            return _cine_pending()
+
+        try:
+            from ..celery_app import encode_cine_async
+
+            encode_cine_async.delay(
+                study.id, source, [f.id for f in instances], *options
+            )
+            return _cine_pending()
+        except Exception as e:
+            print(f"Background processing unavailable: {e}")
+
+        try:
+            path = await run_in_threadpool(
+                generate_requested_cine, study, source, instances, *options
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=422,
+                detail=build_failure(path, inputs_version(instances))
+                or "Cine loop cannot be encoded",
+            )
+
+    return FileResponse(
+        instance_cache.resolve(path),
+        media_type=CINE_MEDIA_TYPES[output_format],
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
+@router.get("/{study_id}/series/{series_uid}/cine")
+async def get_series_cine(
+    study_id: str,
+    series_uid: str,
+    format: str = Query("mp4", pattern="^(mp4|webm)$"),
+    fps: Optional[float] = Query(None, gt=0, le=120),
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = Query(None, gt=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Series as an MP4/WebM loop in slice order (multi-frame instances expanded)"""
+    study = _get_study(db, study_id)
+    instances = (
+        db.query(DicomFile)
+        .filter(DicomFile.study_id == study.id, DicomFile.series_uid == series_uid)
+        .all()
+    )
+    if not instances:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return await _cine_response(
+        study, series_uid, instances, format, fps, window_center, window_width
+    )
+
+
+@router.get("/dicom/files/{file_id}/cine")
+async def get_instance_cine(
+    file_id: int,
+    format: str = Query("mp4", pattern="^(mp4|webm)$"),
+    fps: Optional[float] = Query(None, gt=0, le=120),
+    window_center: Optional[float] = None,
+    window_width: Optional[float] = Query(None, gt=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """
+    Multi-frame instance as an MP4/WebM loop, at its recorded frame rate
+    unless ``fps`` is given
+    """
+    dicom_file, study = _get_instance(db, file_id)
+    return await _cine_response(
+        study,
+        dicom_file.instance_uid,
+        [dicom_file],
+        format,
+        fps,
+        window_center,
+        window_width,
+    )
@@ -0,0 +1,335 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Dict, List, Optional
+import json
+
+from ..database import get_db, User, UserRole, Study, Annotation
+from ..auth import check_medical_access
+from .. import schemas
+
+router = APIRouter(prefix="/studies", tags=["measurements"])
+
+# Payload fields held in their own columns rather than annotation_data
+_COLUMN_FIELDS = {"annotation_type", "annotation", "version"}
+
+
+def _get_study(db: Session, study_id: str) -> Study:
+    study = db.query(Study).filter(Study.id == study_id).first()
+    if not study:
+        raise HTTPException(status_code=404, detail="Study not found")
+    return study
+
+
+def _get_measurement(db: Session, study_id: str, measurement_id: int) -> Annotation:
+    annotation = (
+        db.query(Annotation)
+        .options(joinedload(Annotation.user))
+        .filter(Annotation.id == measurement_id, Annotation.study_id == study_id)
+        .first()
+    )
+    if not annotation:
+        raise HTTPException(status_code=404, detail="Measurement not found")
+    return annotation
+
+
+def _can_edit(annotation: Annotation, user: User) -> bool:
+    return annotation.user_id == user.id or user.role == UserRole.ADMIN
+
+
+def _serialize(annotation: Annotation) -> dict:
+    try:
+        data = json.loads(annotation.annotation_data or "{}")
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {"data": data}
+    return {
+        **data,
+        "id": annotation.id,
+        "studyId": annotation.study_id,
+        "annotation_type": annotation.annotation_type,
+        "annotation": annotation.notes,
+        "clientId": annotation.client_id,
+        "version": annotation.version or 1,
+        "createdBy": annotation.user.username if annotation.user else None,
+        "createdAt": annotation.created_at,
+        "modifiedAt": annotation.updated_at,
+    }
+
+
+def _apply(annotation: Annotation, measurement: schemas.MeasurementData):
+    payload = measurement.model_dump()
+    annotation.annotation_type = payload.get("annotation_type") or "measurement"
+    annotation.notes = payload.get("annotation")
+    # Identity and audit fields are server-owned
+    for key in ("id", "studyId", "clientId", "createdBy", "createdAt", "modifiedAt"):
+        payload.pop(key, None)
+    annotation.annotation_data = json.dumps(
+        {k: v for k, v in payload.items() if k not in _COLUMN_FIELDS}
+    )
+
+
+def _touch(annotation: Annotation):
+    annotation.version = (annotation.version or 1) + 1
+
+
+def _commit_edit(db: Session):
+    """Commit, or 409 when another edit changed the measurement meanwhile"""
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Measurement was changed by another edit",
+        )
+
+
+def _insert_once(db: Session, annotation: Annotation) -> Annotation:
+    """Insert a synced create, or return the row a concurrent retry already created"""
+    try:
+        with db.begin_nested():
+            db.add(annotation)
+    except IntegrityError:
+        created = (
+            db.query(Annotation)
+            .filter(
+                Annotation.study_id == annotation.study_id,
+                Annotation.client_id == annotation.client_id,
+            )
+            .first()
+        )
+        if created is None:
+            raise
+        return created
+    return annotation
+
+
+@router.get("/{study_id}/measurements")
+async def list_measurements(
+    study_id: str,
+    annotation_type: Optional[str] = None,
+    user_id: Optional[int] = None,
+    mine: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Measurements and other annotations of a study, in one response"""
+    study = _get_study(db, study_id)
+    query = (
+        db.query(Annotation)
+        .options(joinedload(Annotation.user))
+        .filter(Annotation.study_id == study.id)
+    )
+    if mine:
+        user_id = current_user.id
+    if user_id is not None:
+        query = query.filter(Annotation.user_id == user_id)
+    if annotation_type:
+        query = query.filter(Annotation.annotation_type == annotation_type)
+    return [_serialize(annotation) for annotation in query.order_by(Annotation.id)]
+
+
+@router.post("/{study_id}/measurements", status_code=201)
+async def create_measurement(
+    study_id: str,
+    measurement: schemas.MeasurementData,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Persist a measurement or annotation"""
+    study = _get_study(db, study_id)
+    annotation = Annotation(study_id=study.id, user_id=current_user.id, version=1)
+    _apply(annotation, measurement)
+    db.add(annotation)
+    db.commit()
+    return _serialize(_get_measurement(db, study.id, annotation.id))
+
+
+@router.get("/{study_id}/measurements/{measurement_id}")
+async def get_measurement(
+    study_id: str,
+    measurement_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    return _serialize(_get_measurement(db, study_id, measurement_id))
+
+
+@router.put("/{study_id}/measurements/{measurement_id}")
+async def update_measurement(
+    study_id: str,
+    measurement_id: int,
+    measurement: schemas.MeasurementUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Replace a measurement; ``version`` guards against overwriting newer edits"""
+    annotation = _get_measurement(db, study_id, measurement_id)
+    if not _can_edit(annotation, current_user):
+        raise HTTPException(
+            status_code=403, detail="Only the author can edit a measurement"
+        )
+    if measurement.version is not None and measurement.version != annotation.version:
+        raise HTTPException(
+            status_code=409, detail=f"Measurement is at version {annotation.version}"
+        )
+    _apply(annotation, measurement)
+    _touch(annotation)
+    _commit_edit(db)
+    return _serialize(_get_measurement(db, study_id, measurement_id))
+
+
+@router.delete("/{study_id}/measurements/{measurement_id}")
+async def delete_measurement(
+    study_id: str,
+    measurement_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    annotation = _get_measurement(db, study_id, measurement_id)
+    if not _can_edit(annotation, current_user):
+        raise HTTPException(
+            status_code=403, detail="Only the author can delete a measurement"
+        )
+    db.delete(annotation)
+    _commit_edit(db)
+    return {"message": "Measurement deleted"}
+
+
+@router.post("/{study_id}/measurements/sync")
+async def sync_measurements(
+    study_id: str,
+    request: schemas.MeasurementSyncRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """
+    Apply a batch of creates, updates and deletes in one transaction and
+    return what the client is missing relative to its ``versions`` vector.
+
+    Updates and deletes carrying a stale ``base_version`` (or touching another
+    user's measurement) are not applied and are reported as conflicts; the
+    server copy is then part of ``changed``. Creates are idempotent per
+    ``client_id``, so a retried batch does not duplicate measurements, even
+    when it races the original. An edit committed by another request between
+    the version check and this commit fails the batch with 409.
+    """
+    study = _get_study(db, study_id)
+    ids = [op.id for op in request.operations if op.id is not None]
+    client_ids = [op.client_id for op in request.operations if op.client_id]
+    existing: Dict[int, Annotation] = {
+        annotation.id: annotation
+        for annotation in db.query(Annotation).filter(
+            Annotation.study_id == study.id, Annotation.id.in_(ids)
+        )
+    }
+    by_client_id: Dict[str, Annotation] = {
+        annotation.client_id: annotation
+        for annotation in db.query(Annotation).filter(
+            Annotation.study_id == study.id, Annotation.client_id.in_(client_ids)
+        )
+    }
+
+    applied: List[dict] = []
+    conflicts: List[dict] = []
+    created: List[tuple] = []
+    try:
+        for index, op in enumerate(request.operations):
+            if op.op == "create":
+                if op.measurement is None:
+                    raise ValueError(f"operation {index}: create needs a measurement")
+                annotation = by_client_id.get(op.client_id) if op.client_id else None
+                if annotation is None:
+                    annotation = Annotation(
+                        study_id=study.id,
+                        user_id=current_user.id,
+                        client_id=op.client_id,
+                        version=1,
+                    )
+                    _apply(annotation, op.measurement)
+                    if op.client_id:
+                        annotation = _insert_once(db, annotation)
+                        by_client_id[op.client_id] = annotation
+                    else:
+                        db.add(annotation)
+                created.append((index, op.client_id, annotation))
+                continue
+
+            if op.op not in ("update", "delete"):
+                raise ValueError(f"operation {index}: unknown op {op.op!r}")
+            annotation = existing.get(op.id)
+            if annotation is None:
+                conflicts.append({"index": index, "id": op.id, "reason": "not_found"})
+            elif not _can_edit(annotation, current_user):
+                conflicts.append({"index": index, "id": op.id, "reason": "forbidden"})
+            elif op.base_version is not None and op.base_version != annotation.version:
+                conflicts.append(
+                    {
+                        "index": index,
+                        "id": op.id,
+                        "reason": "version",
+                        "version": annotation.version,
+                    }
+                )
+            elif op.op == "delete":
+                db.delete(annotation)
+                del existing[op.id]
+                applied.append({"index": index, "op": "delete", "id": op.id})
+            else:
+                if op.measurement is None:
+                    raise ValueError(f"operation {index}: update needs a measurement")
+                _apply(annotation, op.measurement)
+                _touch(annotation)
+                applied.append({"index": index, "op": "update", "id": op.id})
+
+        db.flush()
+        for index, client_id, annotation in created:
+            applied.append(
+                {
+                    "index": index,
+                    "op": "create",
+                    "id": annotation.id,
+                    "client_id": client_id,
+                }
+            )
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Measurements were changed by another edit; sync again",
+        )
+
+    # Delta against the client's version vector
+    versions = dict(
+        db.query(Annotation.id, Annotation.version).filter(
+            Annotation.study_id == study.id
+        )
+    )
+    changed_ids = [
+        annotation_id
+        for annotation_id, version in versions.items()
+        if request.versions.get(annotation_id) != version
+    ]
+    changed = (
+        db.query(Annotation)
+        .options(joinedload(Annotation.user))
+        .filter(Annotation.id.in_(changed_ids))
+        .order_by(Annotation.id)
+        .all()
+        if changed_ids
+        else []
+    )
+    return {
+        "applied": sorted(applied, key=lambda entry: entry["index"]),
+        "conflicts": conflicts,
+        "changed": [_serialize(annotation) for annotation in changed],
+        "deleted": sorted(set(request.versions) - set(versions)),
+        "versions": versions,
+    }
@@ -16,6 +16,11 @@ from .. import schemas
 router = APIRouter(prefix="/auth", tags=["mfa"])
 
 
+def _writable(db: Session, current_user: User) -> User:
+    """The current user in the write session (get_current_user reads via AsyncSession)"""
+    return db.get(User, current_user.id)
+
+
 @router.post("/setup-mfa")
 async def setup_mfa(
     current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
@@ -30,8 +35,9 @@ async def setup_mfa(
     qr_code = generate_qr_code(current_user.email, secret)
     backup_codes = generate_backup_codes()
 
-    current_user.mfa_secret = secret
-    current_user.mfa_backup_codes = json.dumps(backup_codes)
+    user = _writable(db, current_user)
+    user.mfa_secret = secret
+    user.mfa_backup_codes = json.dumps(backup_codes)
     db.commit()
 
     return {"secret": secret, "qr_code": qr_code, "backup_codes": backup_codes}
@@ -55,7 +61,8 @@ async def verify_mfa(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid MFA token"
         )
 
-    current_user.mfa_enabled = True
+    user = _writable(db, current_user)
+    user.mfa_enabled = True
     db.commit()
 
     return {"message": "MFA enabled successfully"}
@@ -66,9 +73,10 @@ async def disable_mfa(
     current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
 ):
     """Disable MFA for current user"""
-    current_user.mfa_enabled = False
-    current_user.mfa_secret = None
-    current_user.mfa_backup_codes = None
+    user = _writable(db, current_user)
+    user.mfa_enabled = False
+    user.mfa_secret = None
+    user.mfa_backup_codes = None
     db.commit()
 
     return {"message": "MFA disabled successfully"}
@@ -0,0 +1,340 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from io import BytesIO
+import base64
+import json
+
+import numpy as np
+
+from ..database import get_db, User, UserRole, Study, Segmentation
+from ..auth import check_medical_access
+from .. import schemas
+from ..segmentation import (
+    SegmentationError,
+    decode_runs,
+    encode_runs,
+    export_dicom_seg,
+    import_dicom_seg,
+    load_segments,
+    read_slices,
+    series_slices,
+    slice_indices,
+    validate_segments,
+    write_slices,
+)
+
+router = APIRouter(prefix="/studies", tags=["segmentations"])
+
+
+def _get_study(db: Session, study_id: str) -> Study:
+    study = db.query(Study).filter(Study.id == study_id).first()
+    if not study:
+        raise HTTPException(status_code=404, detail="Study not found")
+    return study
+
+
+def _get_segmentation(db: Session, study_id: str, segmentation_id: int) -> Segmentation:
+    segmentation = (
+        db.query(Segmentation)
+        .filter(Segmentation.id == segmentation_id, Segmentation.study_id == study_id)
+        .first()
+    )
+    if not segmentation:
+        raise HTTPException(status_code=404, detail="Segmentation not found")
+    return segmentation
+
+
+def _commit_edit(db: Session):
+    """Commit, or 409 when another edit changed the segmentation meanwhile"""
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Segmentation was changed by another edit",
+        )
+
+
+def _import_committed(db: Session, study: Study, user_id: int, data: bytes):
+    """Import and commit in the worker thread, releasing the write slot there"""
+    try:
+        segmentation = import_dicom_seg(db, study, user_id, data)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return segmentation
+
+
+def _serialize(segmentation: Segmentation, with_slices: bool = False) -> dict:
+    entry = {
+        "id": segmentation.id,
+        "study_id": segmentation.study_id,
+        "series_uid": segmentation.series_uid,
+        "label": segmentation.label,
+        "description": segmentation.description,
+        "segments": load_segments(segmentation),
+        "rows": segmentation.rows,
+        "columns": segmentation.columns,
+        "slice_count": segmentation.slice_count,
+        "version": segmentation.version,
+        "created_by_id": segmentation.created_by_id,
+        "created_at": segmentation.created_at,
+        "updated_at": segmentation.updated_at,
+    }
+    if with_slices:
+        entry["instance_uids"] = json.loads(segmentation.instance_uids)
+        entry["slice_indices"] = slice_indices(segmentation)
+    return entry
+
+
+@router.get("/{study_id}/segmentations")
+async def list_segmentations(
+    study_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Segmentations of a study (without voxel data)"""
+    study = _get_study(db, study_id)
+    segmentations = (
+        db.query(Segmentation)
+        .filter(Segmentation.study_id == study.id)
+        .order_by(Segmentation.id)
+        .all()
+    )
+    return [_serialize(segmentation) for segmentation in segmentations]
+
+
+@router.post("/{study_id}/segmentations", status_code=201)
+async def create_segmentation(
+    study_id: str,
+    request: schemas.SegmentationCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Create an empty labelmap over the slices of a series"""
+    study = _get_study(db, study_id)
+    try:
+        segments = validate_segments([s.model_dump() for s in request.segments])
+        instance_uids, rows, columns = await run_in_threadpool(
+            series_slices, db, study, request.series_uid
+        )
+    except SegmentationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    segmentation = Segmentation(
+        study_id=study.id,
+        series_uid=request.series_uid,
+        created_by_id=current_user.id,
+        label=request.label,
+        description=request.description,
+        segments=json.dumps(segments),
+        rows=rows,
+        columns=columns,
+        slice_count=len(instance_uids),
+        instance_uids=json.dumps(instance_uids),
+    )
+    db.add(segmentation)
+    db.commit()
+    db.refresh(segmentation)
+    return _serialize(segmentation, with_slices=True)
+
+
+@router.post("/{study_id}/segmentations/import", status_code=201)
+async def import_segmentation(
+    study_id: str,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Import a DICOM SEG that references a series of this study"""
+    study = _get_study(db, study_id)
+    data = await file.read()
+    try:
+        segmentation = await run_in_threadpool(
+            _import_committed, db, study, current_user.id, data
+        )
+    except SegmentationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.refresh(segmentation)
+    return _serialize(segmentation, with_slices=True)
+
+
+@router.get("/{study_id}/segmentations/{segmentation_id}")
+async def get_segmentation(
+    study_id: str,
+    segmentation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Segmentation details, including which slices hold labels"""
+    segmentation = _get_segmentation(db, study_id, segmentation_id)
+    return _serialize(segmentation, with_slices=True)
+
+
+@router.patch("/{study_id}/segmentations/{segmentation_id}")
+async def update_segmentation(
+    study_id: str,
+    segmentation_id: int,
+    request: schemas.SegmentationUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Rename a segmentation or edit its segment descriptions"""
+    segmentation = _get_segmentation(db, study_id, segmentation_id)
+    if request.label is not None:
+        segmentation.label = request.label
+    if request.description is not None:
+        segmentation.description = request.description
+    if request.segments is not None:
+        try:
+            segments = validate_segments([s.model_dump() for s in request.segments])
+        except SegmentationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        segmentation.segments = json.dumps(segments)
+    _commit_edit(db)
+    db.refresh(segmentation)
+    return _serialize(segmentation)
+
+
+@router.delete("/{study_id}/segmentations/{segmentation_id}")
+async def delete_segmentation(
+    study_id: str,
+    segmentation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Delete a segmentation (its creator or an admin)"""
+    segmentation = _get_segmentation(db, study_id, segmentation_id)
+    if (
+        segmentation.created_by_id != current_user.id
+        and current_user.role != UserRole.ADMIN
+    ):
+        raise HTTPException(
+            status_code=403, detail="Only the creator can delete a segmentation"
+        )
+    db.delete(segmentation)
+    _commit_edit(db)
+    return {"message": "Segmentation deleted"}
+
+
+@router.get("/{study_id}/segmentations/{segmentation_id}/slices")
+async def get_segmentation_slices(
+    study_id: str,
+    segmentation_id: int,
+    start: int = Query(0, ge=0),
+    stop: int = Query(None, ge=0),
+    format: str = Query("rle", pattern="^(rle|npy)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """
+    Labelmap slices ``start <= index < stop``. ``rle`` lists the non-empty
+    slices as row-major runs; ``npy`` is a dense uint8 (slices, rows, columns)
+    array of the whole range.
+    """
+    segmentation = _get_segmentation(db, study_id, segmentation_id)
+    stop = segmentation.slice_count if stop is None else min(stop, segmentation.slice_count)
+    labels = await run_in_threadpool(read_slices, segmentation, start, stop)
+    headers = {"X-Segmentation-Version": str(segmentation.version)}
+
+    if format == "npy":
+        volume = np.zeros(
+            (max(stop - start, 0), segmentation.rows, segmentation.columns),
+            dtype=np.uint8,
+        )
+        for index, slice_labels in labels.items():
+            volume[index - start] = slice_labels
+        buffer = BytesIO()
+        np.save(buffer, volume)
+        return Response(
+            content=buffer.getvalue(),
+            media_type="application/octet-stream",
+            headers=headers,
+        )
+
+    slices = []
+    for index, slice_labels in labels.items():
+        values, lengths = encode_runs(slice_labels)
+        slices.append(
+            {"index": index, "values": values.tolist(), "lengths": lengths.tolist()}
+        )
+    return {
+        "segmentation_id": segmentation.id,
+        "version": segmentation.version,
+        "rows": segmentation.rows,
+        "columns": segmentation.columns,
+        "start": start,
+        "stop": stop,
+        "slices": slices,
+    }
+
+
+@router.put("/{study_id}/segmentations/{segmentation_id}/slices")
+async def update_segmentation_slices(
+    study_id: str,
+    segmentation_id: int,
+    request: schemas.SegmentationSlicesUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Replace only the given slices; an all-zero slice clears it"""
+    segmentation = _get_segmentation(db, study_id, segmentation_id)
+    if request.version is not None and request.version != segmentation.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Segmentation is at version {segmentation.version}",
+        )
+
+    rows, columns = segmentation.rows, segmentation.columns
+    labels = {}
+    try:
+        for item in request.slices:
+            if item.data is not None:
+                raw = np.frombuffer(base64.b64decode(item.data), dtype=np.uint8)
+                if raw.size != rows * columns:
+                    raise SegmentationError(
+                        f"slice {item.index} data must be {rows * columns} bytes"
+                    )
+                labels[item.index] = raw.reshape(rows, columns)
+            else:
+                labels[item.index] = decode_runs(
+                    item.values or [], item.lengths or [], rows, columns
+                )
+        write_slices(db, segmentation, labels)
+    except (SegmentationError, ValueError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    _commit_edit(db)
+    return {
+        "segmentation_id": segmentation.id,
+        "version": segmentation.version,
+        "updated_slices": sorted(labels),
+    }
+
+
+@router.get("/{study_id}/segmentations/{segmentation_id}/dicom-seg")
+async def export_segmentation(
+    study_id: str,
+    segmentation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Export as a binary DICOM Segmentation object"""
+    segmentation = _get_segmentation(db, study_id, segmentation_id)
+    try:
+        content = await run_in_threadpool(export_dicom_seg, db, segmentation)
+    except SegmentationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(
+        content=content,
+        media_type="application/dicom",
+        headers={
+            "Content-Disposition": f'attachment; filename="seg_{segmentation.id}.dcm"'
+        },
+    )
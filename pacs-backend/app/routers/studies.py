@@ -1,6 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Header,
+    status,
+    UploadFile,
+    File,
+    Form,
+    Query,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, selectinload
 from typing import List, Optional
 import os
 import uuid
@@ -9,7 +22,9 @@ import pydicom
 from datetime import datetime
 
 from ..database import (
+    engine,
     get_db,
+    get_async_db,
     User,
     Study,
     Patient,
@@ -18,6 +33,7 @@ from ..database import (
     StudyStatus,
     DeletionRequest,
     DiagnosticCenter,
+    WorklistEntry,
 )
 from ..auth import (
     get_current_user, 
@@ -31,10 +47,23 @@ from .. import schemas
 from ..upload_config import validate_upload_file, validate_batch_upload, MAX_UPLOAD_SIZE
 from ..audit import log_audit_event, anonymize_phi
 from ..utils import generate_study_id
+from ..cache import instance_cache
+from ..prefetch import prefetch_queue
+from ..pagination import keyset_page, keyset_page_async
+from ..replicas import get_async_read_db, get_read_db
+from ..search import parse_terms, search_hits, search_page
+from ..storage import UPLOAD_DIR, derived_dir
+from ..transcoding import (
+    ANY_SYNTAX,
+    negotiate,
+    parse_accept,
+    stored_syntax,
+    supported_syntaxes,
+    transcode,
+)
 
 router = APIRouter(prefix="/studies", tags=["studies"])
 
-UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
@@ -261,53 +290,175 @@ async def upload_study(
         print(f"Failed to generate AI report: {e}")
 
     try:
-        from ..celery_app import process_dicom_study_async
+        from ..celery_app import process_dicom_study_async, postprocess_study_async
 
         process_dicom_study_async.delay(study.id)
+        postprocess_study_async.delay(study.id)
     except Exception as e:
         print(f"Background processing unavailable: {e}")
 
     return study
 
 
-@router.get("/", response_model=List[schemas.Study])
-async def get_studies(
-    skip: int = 0,
-    limit: int = 100,
-    status_filter: Optional[StudyStatus] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    query = db.query(Study)
+def _study_response_options():
+    """
+    Eager loads for the relationships schemas.Study serializes; an
+    AsyncSession cannot lazy-load them during serialization
+    """
+    return [
+        selectinload(Study.patient),
+        selectinload(Study.diagnostic_center),
+        selectinload(Study.uploaded_by),
+        selectinload(Study.assigned_doctor),
+        selectinload(Study.radiologist),
+        selectinload(Study.dicom_files),
+    ]
+
 
+def _listable_by(current_user: User):
+    """Conditions limiting study lists to what the user's role may list"""
     if current_user.role == UserRole.TECHNICIAN:
-        query = query.filter(Study.uploaded_by_id == current_user.id)
+        return [Study.uploaded_by_id == current_user.id]
     elif current_user.role == UserRole.DOCTOR:
-        query = query.filter(
+        return [
             (Study.diagnostic_center_id == current_user.diagnostic_center_id)
             | (Study.assigned_doctor_id == current_user.id)
-        )
+        ]
     elif current_user.role == UserRole.RADIOLOGIST:
-        query = query.filter(
-            Study.diagnostic_center_id == current_user.diagnostic_center_id
-        )
+        return [Study.diagnostic_center_id == current_user.diagnostic_center_id]
     elif current_user.role in [UserRole.DIAGNOSTIC_CENTER_ADMIN]:
-        query = query.filter(
-            Study.diagnostic_center_id == current_user.diagnostic_center_id
-        )
+        return [Study.diagnostic_center_id == current_user.diagnostic_center_id]
+    return []
+
+
+@router.get("/", response_model=List[schemas.Study])
+async def get_studies(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status_filter: Optional[StudyStatus] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Studies visible to the user, newest first. Pass the ``X-Next-Cursor``
+    response header back as ``cursor`` for the next page; ``skip`` is kept
+    for older clients but costs O(skip) per page.
+    """
+    query = (
+        select(Study)
+        .options(*_study_response_options())
+        .where(*_listable_by(current_user))
+    )
 
     if status_filter:
-        query = query.filter(Study.status == status_filter)
+        query = query.where(Study.status == status_filter)
+
+    if skip and not cursor:
+        result = await db.execute(
+            query.order_by(Study.created_at.desc(), Study.id.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return result.scalars().all()
 
-    studies = query.offset(skip).limit(limit).all()
+    studies, next_cursor = await keyset_page_async(db, query, Study, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return studies
 
 
+@router.get("/search")
+async def search_studies(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    center_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Studies whose description, reports or patient name contain every word of
+    ``q`` (``word*`` matches a prefix), best match first, among the studies
+    the user can list. Pass the ``X-Next-Cursor`` response header back as
+    ``cursor`` for the next page.
+    """
+    terms = parse_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+
+    hits = search_hits(engine.dialect.name, terms)
+    query = (
+        select(
+            Study.id,
+            Study.study_uid,
+            Study.study_description,
+            Study.modality,
+            Study.body_part,
+            Study.status,
+            Study.priority,
+            Study.created_at,
+            Study.diagnostic_center_id,
+            Patient.first_name,
+            Patient.last_name,
+            Patient.patient_id,
+            DiagnosticCenter.name.label("center_name"),
+            hits.c.score,
+        )
+        .join(hits, hits.c.study_id == Study.id)
+        .outerjoin(Patient, Patient.id == Study.patient_id)
+        .outerjoin(DiagnosticCenter, DiagnosticCenter.id == Study.diagnostic_center_id)
+        .where(*_listable_by(current_user))
+    )
+    if center_id:
+        query = query.where(Study.diagnostic_center_id == center_id)
+
+    rows, next_cursor = await search_page(
+        db, query, hits, engine.dialect.name, terms, cursor, limit
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return [
+        {
+            "id": row.id,
+            "study_uid": row.study_uid,
+            "patient_name": f"{row.first_name} {row.last_name}"
+            if row.patient_id
+            else "Unknown",
+            "patient_id": row.patient_id,
+            "study_description": row.study_description,
+            "modality": row.modality,
+            "body_part": row.body_part,
+            "status": row.status,
+            "priority": row.priority,
+            "created_at": row.created_at,
+            "center_id": row.diagnostic_center_id,
+            "center_name": row.center_name,
+            "score": row.score,
+            "snippet": row.snippet,
+        }
+        for row in rows
+    ]
+
+
 @router.get("/pending")
 async def get_pending_studies(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    center_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
 ):
-    """Get all pending studies with center and technician information"""
+    """
+    Get pending studies with center and technician information, most urgent
+    and then oldest first, optionally for one center. With ``limit``, pages
+    continue from the ``X-Next-Cursor`` response header passed back as
+    ``cursor``.
+    """
 
     if current_user.role not in [UserRole.RADIOLOGIST, UserRole.ADMIN]:
         raise HTTPException(
@@ -315,56 +466,132 @@ async def get_pending_studies(
             detail="Only radiologists and admins can view pending studies",
         )
 
-    studies = (
-        db.query(Study)
-        .filter(Study.status.in_([StudyStatus.QUEUED, StudyStatus.PROCESSING]))
-        .all()
+    # Names are denormalized into the worklist, no joins needed
+    query = db.query(WorklistEntry).filter(
+        WorklistEntry.status.in_([StudyStatus.QUEUED, StudyStatus.PROCESSING])
     )
+    if center_id:
+        query = query.filter(WorklistEntry.diagnostic_center_id == center_id)
+    order = [
+        (WorklistEntry.priority_rank, False, "priority_rank"),
+        (WorklistEntry.created_at, False, "created_at"),
+        (WorklistEntry.id, False, "id"),
+    ]
+    if limit:
+        rows, next_cursor = keyset_page(db, query, WorklistEntry, cursor, limit, order)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    else:
+        rows = query.order_by(
+            WorklistEntry.priority_rank, WorklistEntry.created_at, WorklistEntry.id
+        ).all()
+
+    return [
+        {
+            "id": row.id,
+            "study_uid": row.study_uid,
+            "patient_name": row.patient_name or "Unknown",
+            "patient_id_display": row.patient_mrn or "Unknown",
+            "modality": row.modality,
+            "body_part": row.body_part,
+            "study_description": row.study_description,
+            "status": row.status,
+            "created_at": row.created_at,
+            "center_name": row.center_name or "Unknown Center",
+            "technician_name": row.technician_name or "Unknown Technician",
+            "priority": row.priority or "normal",
+        }
+        for row in rows
+    ]
 
-    enriched_studies = []
-    for study in studies:
-        patient = db.query(Patient).filter(Patient.id == study.patient_id).first()
 
-        center = (
-            db.query(DiagnosticCenter)
-            .filter(DiagnosticCenter.id == study.diagnostic_center_id)
-            .first()
+@router.get("/deletion-requests", response_model=List[schemas.DeletionRequest])
+async def get_deletion_requests(
+    response: Response,
+    status_filter: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Deletion requests, newest first, with requester and patient names"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403, detail="Only admins can view deletion requests"
         )
 
-        technician = db.query(User).filter(User.id == study.uploaded_by_id).first()
-
-        study_dict = {
-            "id": study.id,
-            "study_uid": study.study_uid,
-            "patient_name": f"{patient.first_name} {patient.last_name}"
-            if patient
-            else "Unknown",
-            "patient_id_display": patient.patient_id if patient else "Unknown",
-            "modality": study.modality,
-            "body_part": study.body_part,
-            "study_description": study.study_description,
-            "status": study.status,
-            "created_at": study.created_at,
-            "center_name": center.name if center else "Unknown Center",
-            "technician_name": technician.full_name
-            if technician
-            else "Unknown Technician",
-            "priority": getattr(study, "priority", "normal"),
-        }
-        enriched_studies.append(study_dict)
-
-    return enriched_studies
+    try:
+        requester = aliased(User)
+        query = (
+            db.query(
+                DeletionRequest.id,
+                DeletionRequest.study_id,
+                DeletionRequest.reason,
+                DeletionRequest.requested_by_id,
+                DeletionRequest.status,
+                DeletionRequest.approved_by_id,
+                DeletionRequest.approved_at,
+                DeletionRequest.created_at,
+                requester.full_name.label("requested_by_name"),
+                Patient.first_name,
+                Patient.last_name,
+            )
+            .outerjoin(requester, requester.id == DeletionRequest.requested_by_id)
+            .outerjoin(Study, Study.id == DeletionRequest.study_id)
+            .outerjoin(Patient, Patient.id == Study.patient_id)
+        )
+        if status_filter:
+            query = query.filter(DeletionRequest.status == status_filter)
+
+        if limit:
+            rows, next_cursor = keyset_page(db, query, DeletionRequest, cursor, limit)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+        else:
+            rows = query.order_by(
+                DeletionRequest.created_at.desc(), DeletionRequest.id.desc()
+            ).all()
+
+        return [
+            {
+                "id": row.id,
+                "study_id": row.study_id,
+                "reason": row.reason,
+                "requested_by_id": row.requested_by_id,
+                "requested_by_name": row.requested_by_name,
+                "patient_name": f"{row.first_name} {row.last_name}"
+                if row.first_name or row.last_name
+                else None,
+                "status": row.status,
+                "approved_by_id": row.approved_by_id,
+                "approved_at": row.approved_at.isoformat()
+                if row.approved_at
+                else None,
+                "created_at": row.created_at.isoformat()
+                if row.created_at
+                else None,
+            }
+            for row in rows
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching deletion requests: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch deletion requests")
 
 
 @router.get("/{study_id}", response_model=schemas.Study)
 async def get_study(
     study_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_user),
 ):
     from ..error_handlers import NotFoundError
 
-    study = db.query(Study).filter(Study.id == study_id).first()
+    result = await db.execute(
+        select(Study).options(*_study_response_options()).where(Study.id == study_id)
+    )
+    study = result.scalars().first()
     if not study:
         raise NotFoundError("Study", study_id)
 
@@ -389,14 +616,11 @@ async def get_study(
         f"from center {study.diagnostic_center_id}"
     )
 
-    patient = db.query(Patient).filter(Patient.id == study.patient_id).first()
+    patient = study.patient
     if patient:
         study.patient_name = f"{patient.first_name} {patient.last_name}"
         study.patient_id_display = patient.patient_id
 
-    dicom_files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
-    study.dicom_files = dicom_files
-
     return study
 
 
@@ -421,6 +645,9 @@ async def assign_study(
     study.status = StudyStatus.ASSIGNED
     db.commit()
 
+    # Warm the study before the assignee opens it
+    prefetch_queue.enqueue(study.id, study.priority)
+
     return {"message": "Study assigned successfully"}
 
 
@@ -450,14 +677,15 @@ async def update_report(
 @router.get("/dicom/files/{file_id}")
 async def get_dicom_file(
     file_id: int,
-    db: Session = Depends(get_db),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    dicom_file = db.query(DicomFile).filter(DicomFile.id == file_id).first()
+    dicom_file = await db.get(DicomFile, file_id)
     if not dicom_file:
         raise HTTPException(status_code=404, detail="DICOM file not found")
 
-    study = db.query(Study).filter(Study.id == dicom_file.study_id).first()
+    study = await db.get(Study, dicom_file.study_id)
     if not study:
         raise HTTPException(status_code=404, detail="Study not found")
 
@@ -484,12 +712,113 @@ async def get_dicom_file(
     if not os.path.exists(dicom_file.file_path):
         raise HTTPException(status_code=404, detail="DICOM file not found on disk")
 
+    filename = f"dicom_{file_id}.dcm"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    requested = parse_accept(accept)
+    # A leading wildcard is the stored file, without reading its syntax
+    if requested and requested[0] != ANY_SYNTAX:
+        stored = await run_in_threadpool(stored_syntax, dicom_file.file_path)
+        syntax = negotiate(requested, stored)
+        if syntax is None:
+            raise HTTPException(
+                status_code=406,
+                detail=f"Supported transfer syntaxes: {', '.join(supported_syntaxes())}",
+            )
+        if syntax != stored:
+            try:
+                content = await transcode(dicom_file.file_path, syntax)
+            except Exception as e:
+                print(f"Transcoding of DICOM file {file_id} to {syntax} failed: {e}")
+                raise HTTPException(
+                    status_code=406, detail=f"Unable to transcode to {syntax}"
+                )
+            return Response(
+                content=content,
+                media_type=f"application/dicom; transfer-syntax={syntax}",
+                headers=headers,
+            )
+
+    content = await run_in_threadpool(instance_cache.get, dicom_file.file_path)
+    if content is not None:
+        return Response(content=content, media_type="application/dicom", headers=headers)
+
+    # Too large for the memory tier: stream from the hot copy or storage
     return FileResponse(
-        path=dicom_file.file_path,
+        path=instance_cache.resolve(dicom_file.file_path),
         media_type="application/dicom",
-        filename=f"dicom_{file_id}.dcm",
+        filename=filename,
+    )
+
+
+@router.get("/{study_id}/download")
+async def download_study(
+    study_id: str,
+    compression: str = "deflate",
+    dicomdir: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_medical_access),
+):
+    """Stream all instances of a study as a ZIP archive, optionally with a DICOMDIR"""
+    from ..study_archive import ARCHIVE_COMPRESSION, archive_entries, stream_study_archive
+
+    if compression not in ARCHIVE_COMPRESSION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported compression, use one of: {', '.join(ARCHIVE_COMPRESSION)}",
+        )
+
+    study = db.query(Study).filter(Study.id == study_id).first()
+    if not study:
+        raise HTTPException(status_code=404, detail="Study not found")
+
+    dicom_files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    if not dicom_files:
+        raise HTTPException(status_code=404, detail="Study has no DICOM files")
+
+    entries = archive_entries(study, dicom_files, include_dicomdir=dicomdir)
+
+    log_audit_event(
+        db=db,
+        action="STUDY_DOWNLOADED",
+        user=current_user,
+        resource_type="study",
+        resource_id=str(study.id),
+        details={
+            "files_count": len(entries),
+            "compression": compression,
+            "dicomdir": dicomdir,
+        },
     )
 
+    return StreamingResponse(
+        stream_study_archive(
+            entries,
+            compression=ARCHIVE_COMPRESSION[compression],
+            include_dicomdir=dicomdir,
+            fileset_id=study.id,
+        ),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="study_{study.id}.zip"'
+        },
+    )
+
+
+def _remove_study_files(file_paths: List[str], derived: str):
+    """Delete a study's instances and derived artifacts, and their cached copies"""
+    derived_files = [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(derived)
+        for name in names
+    ]
+    for path in [*file_paths, *derived_files]:
+        instance_cache.discard(path)
+    for path in file_paths:
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(derived, ignore_errors=True)
+
 
 @router.delete("/{study_id}")
 async def delete_study(
@@ -520,9 +849,9 @@ async def delete_study(
     anonymized_details = anonymize_phi(audit_details)
 
     dicom_files = db.query(DicomFile).filter(DicomFile.study_id == study_id).all()
+    file_paths = [dicom_file.file_path for dicom_file in dicom_files]
+    derived = derived_dir(study)
     for dicom_file in dicom_files:
-        if os.path.exists(dicom_file.file_path):
-            os.remove(dicom_file.file_path)
         db.delete(dicom_file)
 
     db.delete(study)
@@ -538,6 +867,7 @@ async def delete_study(
     )
 
     db.commit()
+    await run_in_threadpool(_remove_study_files, file_paths, derived)
 
     return {"message": "Study deleted successfully"}
 
@@ -569,44 +899,6 @@ async def create_deletion_request(
     return deletion_request
 
 
-@router.get("/deletion-requests", response_model=List[schemas.DeletionRequest])
-async def get_deletion_requests(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
-):
-    if current_user.role != UserRole.ADMIN:
-        raise HTTPException(
-            status_code=403, detail="Only admins can view deletion requests"
-        )
-
-    try:
-        requests = db.query(DeletionRequest).all()
-        if not requests:
-            return []
-
-        result = []
-        for req in requests:
-            result.append(
-                {
-                    "id": req.id,
-                    "study_id": req.study_id,
-                    "reason": req.reason,
-                    "requested_by_id": req.requested_by_id,
-                    "status": req.status,
-                    "approved_by_id": req.approved_by_id,
-                    "approved_at": req.approved_at.isoformat()
-                    if req.approved_at
-                    else None,
-                    "created_at": req.created_at.isoformat()
-                    if req.created_at
-                    else None,
-                }
-            )
-        return result
-    except Exception as e:
-        print(f"Error fetching deletion requests: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch deletion requests")
-
-
 @router.put("/deletion-requests/{request_id}/approve")
 async def approve_deletion_request(
     request_id: int,
@@ -683,18 +975,43 @@ async def assign_study_to_self(
     study.status = StudyStatus.ASSIGNED
     db.commit()
 
+    # Warm the study before the assignee opens it
+    prefetch_queue.enqueue(study.id, study.priority)
+
     return {"message": "Study assigned successfully"}
 
 
 @router.get("/{study_id}/status")
 async def get_study_status(
     study_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """Get detailed status information for a study"""
 
-    study = db.query(Study).filter(Study.id == study_id).first()
+    technician = aliased(User)
+    radiologist = aliased(User)
+    study = (
+        db.query(
+            Study.id,
+            Study.status,
+            Study.diagnostic_center_id,
+            Study.created_at,
+            Study.updated_at,
+            Patient.first_name,
+            Patient.last_name,
+            Patient.id.label("patient_pk"),
+            DiagnosticCenter.name.label("center_name"),
+            technician.full_name.label("technician_name"),
+            radiologist.full_name.label("radiologist_name"),
+        )
+        .outerjoin(Patient, Patient.id == Study.patient_id)
+        .outerjoin(DiagnosticCenter, DiagnosticCenter.id == Study.diagnostic_center_id)
+        .outerjoin(technician, technician.id == Study.uploaded_by_id)
+        .outerjoin(radiologist, radiologist.id == Study.radiologist_id)
+        .filter(Study.id == study_id)
+        .first()
+    )
     if not study:
         raise HTTPException(status_code=404, detail="Study not found")
 
@@ -718,28 +1035,15 @@ async def get_study_status(
         f"from center {study.diagnostic_center_id}"
     )
 
-    patient = db.query(Patient).filter(Patient.id == study.patient_id).first()
-    center = (
-        db.query(DiagnosticCenter)
-        .filter(DiagnosticCenter.id == study.diagnostic_center_id)
-        .first()
-    )
-    technician = db.query(User).filter(User.id == study.uploaded_by_id).first()
-    radiologist = (
-        db.query(User).filter(User.id == study.radiologist_id).first()
-        if study.radiologist_id
-        else None
-    )
-
     status_info = {
         "study_id": study.id,
         "status": study.status,
-        "patient_name": f"{patient.first_name} {patient.last_name}"
-        if patient
+        "patient_name": f"{study.first_name} {study.last_name}"
+        if study.patient_pk
         else "Unknown",
-        "center_name": center.name if center else "Unknown",
-        "uploaded_by": technician.full_name if technician else "Unknown",
-        "assigned_radiologist": radiologist.full_name if radiologist else None,
+        "center_name": study.center_name or "Unknown",
+        "uploaded_by": study.technician_name or "Unknown",
+        "assigned_radiologist": study.radiologist_name,
         "created_at": study.created_at,
         "updated_at": study.updated_at,
         "timeline": [
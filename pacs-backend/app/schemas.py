@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from .database import UserRole, StudyStatus
 
@@ -206,6 +206,43 @@ class Annotation(AnnotationBase):
         from_attributes = True
 
 
+class MeasurementData(BaseModel):
+    """
+    A measurement or other annotation as the viewer sends it. Fields beyond
+    these (series/instance UIDs, labels, styling) are kept as given.
+    """
+
+    annotation_type: str = "measurement"  # measurement, roi, text, etc.
+    type: Optional[str] = None  # length, angle, rectangle, ellipse, freehand, cobb
+    imageIndex: Optional[int] = None
+    value: Optional[float] = None
+    unit: Optional[str] = None
+    coordinates: Optional[List[List[float]]] = None
+    annotation: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+
+class MeasurementUpdate(MeasurementData):
+    version: Optional[int] = None  # rejected with 409 if the measurement changed
+
+
+class MeasurementSyncOperation(BaseModel):
+    op: str  # create, update, delete
+    id: Optional[int] = None
+    client_id: Optional[str] = None
+    base_version: Optional[int] = None
+    measurement: Optional[MeasurementData] = None
+
+
+class MeasurementSyncRequest(BaseModel):
+    """Batch of edits plus the {id: version} vector the client already holds"""
+
+    versions: Dict[int, int] = {}
+    operations: List[MeasurementSyncOperation] = []
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -258,6 +295,8 @@ class DeletionRequestUpdate(BaseModel):
 class DeletionRequest(DeletionRequestBase):
     id: int
     requested_by_id: int
+    requested_by_name: Optional[str] = None
+    patient_name: Optional[str] = None
     status: str
     approved_by_id: Optional[int] = None
     approved_at: Optional[datetime] = None
@@ -286,3 +325,89 @@ class SystemSettings(SystemSettingsBase):
 
     class Config:
         from_attributes = True
+
+
+class RoiStatsRequest(BaseModel):
+    """
+    2D region on one frame, in image pixel coordinates ``[column, row]``:
+    a polygon (``points``), a rectangle (two corner ``points``) or an
+    ellipse (``center`` and ``radii``).
+    """
+
+    shape: str  # polygon, rectangle, ellipse
+    points: Optional[List[List[float]]] = None
+    center: Optional[List[float]] = None
+    radii: Optional[List[float]] = None
+    frame: int = 0
+    bins: int = 64
+
+
+class VolumeRoiStatsRequest(BaseModel):
+    """
+    3D region of a series volume: a sphere (``center`` in patient
+    coordinates and ``radius`` in mm) or a base64 ``np.packbits`` voxel
+    ``mask`` with the volume's (slices, rows, columns) shape.
+    """
+
+    shape: str  # sphere, mask
+    center: Optional[List[float]] = None
+    radius: Optional[float] = None
+    mask: Optional[str] = None
+    bins: int = 64
+
+
+class SegmentDescription(BaseModel):
+    number: int
+    label: Optional[str] = None
+    color: Optional[List[int]] = None  # RGB
+
+
+class SegmentationCreate(BaseModel):
+    series_uid: str
+    label: str
+    description: Optional[str] = None
+    segments: List[SegmentDescription]
+
+
+class SegmentationUpdate(BaseModel):
+    label: Optional[str] = None
+    description: Optional[str] = None
+    segments: Optional[List[SegmentDescription]] = None
+
+
+class SegmentationSliceData(BaseModel):
+    """
+    One slice's labelmap, either as row-major runs (``values``/``lengths``)
+    or as base64 ``data`` of rows x columns uint8 labels.
+    """
+
+    index: int
+    values: Optional[List[int]] = None
+    lengths: Optional[List[int]] = None
+    data: Optional[str] = None
+
+
+class SegmentationSlicesUpdate(BaseModel):
+    slices: List[SegmentationSliceData]
+    version: Optional[int] = None  # rejected with 409 if the segmentation changed
+
+
+class ResliceRequest(BaseModel):
+    """
+    Reformat of a series volume. Points and directions are in patient
+    coordinates (mm); omitted values default to an axial plane through the
+    volume center.
+    """
+
+    mode: str = "mpr"  # mpr, mip, minip, avg, curved
+    center: Optional[List[float]] = None
+    row_direction: Optional[List[float]] = None
+    column_direction: Optional[List[float]] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    spacing: Optional[float] = None
+    thickness: float = 0.0
+    points: Optional[List[List[float]]] = None  # curved reformat polyline
+    window_center: Optional[float] = None
+    window_width: Optional[float] = None
+    format: str = "png"  # png, jpeg, npy
@@ -0,0 +1,170 @@
+"""
+Full-text search over studies.
+
+Each study has one search document holding its description, its doctor,
+radiologist and final reports and its patient's name. Database triggers keep
+the documents current in the same transaction as the write, whichever code
+path changes a study or renames a patient:
+
+- PostgreSQL: ``study_search_documents.document`` is a weighted ``tsvector``
+  (patient name, then description, then reports) behind a GIN index, ranked
+  with ``ts_rank_cd``.
+- SQLite: ``study_search_documents`` is the external content table of the
+  FTS5 index ``study_search``, ranked with ``bm25``.
+
+The schema ships as migration 0003, which also indexes existing studies.
+
+Queries are words that must all occur, in any field; ``word*`` matches a
+prefix. Both databases stem English words (``fractures`` finds
+``fracture``).
+
+A ``ts_rank_cd`` score depends only on its document and the query, so
+PostgreSQL pages on a (score, study id) cursor. ``bm25`` weighs terms by
+their frequency across all documents, so a write between two requests
+re-scores every hit; SQLite pages by offset instead, over at most
+``SEARCH_MAX_RESULTS`` hits. Snippets are highlighted for the rows of the
+returned page only.
+"""
+
+from typing import List, Optional
+import os
+import re
+
+from fastapi import HTTPException
+from sqlalchemy import Float, Select, String, and_, column, func, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Subquery
+
+from .database import Study
+from .pagination import decode_cursor, encode_cursor
+
+# Deepest hit reachable by paging on SQLite, where pages are offsets
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))
+# bm25 weights of (description, reports, patient_name)
+SQLITE_COLUMN_WEIGHTS = (2.0, 1.0, 4.0)
+HIGHLIGHT = ("<mark>", "</mark>")
+
+documents = table(
+    "study_search_documents",
+    column("id"),
+    column("study_id", String),
+    column("document"),
+)
+study_search = literal_column("study_search")
+
+
+def parse_terms(q: str) -> List[str]:
+    """Words of a query, ``word*`` kept as a prefix term"""
+    return [word + star for word, star in re.findall(r"(\w+)(\*?)", q)][:32]
+
+
+def _sqlite_match(terms: List[str]) -> str:
+    return " ".join(
+        f'"{term[:-1]}"*' if term.endswith("*") else f'"{term}"' for term in terms
+    )
+
+
+def _postgres_query(terms: List[str]):
+    expression = " & ".join(
+        f"{term[:-1]}:*" if term.endswith("*") else term for term in terms
+    )
+    return func.to_tsquery(literal_column("'english'"), expression)
+
+
+def search_hits(dialect: str, terms: List[str]) -> Subquery:
+    """Subquery of matching studies as ``(study_id, score)``, higher scores first"""
+    if dialect == "postgresql":
+        query = _postgres_query(terms)
+        hits = select(
+            documents.c.study_id,
+            func.ts_rank_cd(documents.c.document, query, type_=Float).label("score"),
+        ).where(documents.c.document.op("@@")(query))
+        return hits.subquery("hits")
+
+    hits = (
+        select(
+            documents.c.study_id,
+            # bm25 is lower for better matches
+            (-func.bm25(study_search, *SQLITE_COLUMN_WEIGHTS, type_=Float)).label("score"),
+        )
+        .select_from(table("study_search"))
+        .join(documents, documents.c.id == literal_column("study_search.rowid"))
+        .where(study_search.op("MATCH")(_sqlite_match(terms)))
+    )
+    return hits.subquery("hits")
+
+
+def _with_snippets(dialect: str, terms: List[str], page: Subquery) -> Select:
+    """The rows of ``page`` with a highlighted snippet of each study's text"""
+    if dialect == "postgresql":
+        text = func.concat_ws(
+            " ",
+            Study.study_description,
+            Study.doctor_report,
+            Study.radiologist_report,
+            Study.final_report,
+        )
+        snippet = func.ts_headline(
+            literal_column("'english'"),
+            text,
+            _postgres_query(terms),
+            f"StartSel={HIGHLIGHT[0]}, StopSel={HIGHLIGHT[1]}, "
+            "MaxFragments=1, MaxWords=24, MinWords=8",
+        )
+        return select(page, snippet.label("snippet")).join(Study, Study.id == page.c.id)
+
+    snippet = func.snippet(study_search, -1, *HIGHLIGHT, "…", 12)
+    return (
+        select(page, snippet.label("snippet"))
+        .join(documents, documents.c.study_id == page.c.id)
+        .join(table("study_search"), literal_column("study_search.rowid") == documents.c.id)
+        .where(study_search.op("MATCH")(_sqlite_match(terms)))
+    )
+
+
+async def search_page(
+    db: AsyncSession,
+    statement: Select,
+    hits: Subquery,
+    dialect: str,
+    terms: List[str],
+    cursor: Optional[str],
+    limit: int,
+):
+    """
+    One page of ``statement`` (a select over ``hits`` exposing ``id`` and
+    ``score``) in rank order with each row's ``snippet``, and the cursor of
+    the next page
+    """
+    score, study_id = hits.c.score, hits.c.study_id
+    offset = 0
+    if dialect == "postgresql":
+        if cursor:
+            values, last_id = decode_cursor(cursor)
+            if len(values) != 1:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            statement = statement.where(
+                or_(score < values[0], and_(score == values[0], study_id > last_id))
+            )
+    else:
+        if cursor:
+            values, _ = decode_cursor(cursor)
+            if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            offset = values[0]
+        limit = max(min(limit, SEARCH_MAX_RESULTS - offset), 0)
+        statement = statement.offset(offset)
+
+    page = statement.order_by(score.desc(), study_id).limit(limit + 1).subquery("page")
+    result = await db.execute(
+        _with_snippets(dialect, terms, page).order_by(page.c.score.desc(), page.c.id)
+    )
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if dialect == "postgresql":
+            next_cursor = encode_cursor([rows[-1].score], rows[-1].id)
+        elif offset + limit < SEARCH_MAX_RESULTS:
+            next_cursor = encode_cursor([offset + limit], rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,502 @@
+"""
+Compact storage of segmentation labelmaps.
+
+A segmentation is a uint8 labelmap (0 = background, 1..255 = segment number)
+over the slices of one series. Each non-empty slice is stored as its own
+``segmentation_slices`` row holding the run-length encoding of the row-major
+labels (run count, values as uint8, lengths as little-endian uint32),
+zlib-compressed. Slices can be read by range and edits rewrite only the
+slices they touch; empty slices have no row at all.
+
+DICOM Segmentation objects (binary, one frame per segment and slice) are
+imported and exported with pydicom.
+"""
+
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import struct
+import zlib
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.pixels import pack_bits
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+from sqlalchemy.orm import Session
+
+from .database import DicomFile, Segmentation, SegmentationSlice, Study
+from .imaging import frame_count, is_color, read_dataset
+from .series import group_by_series, slice_normal
+from .volume import build_series_volume, load_geometry
+
+logger = logging.getLogger(__name__)
+
+SEGMENTATION_STORAGE = "1.2.840.10008.5.1.4.1.1.66.4"
+MAX_SEGMENTS = 255
+
+# Generic codes used when a segment carries no property codes of its own
+_CATEGORY_CODE = ("91723000", "SCT", "Anatomical structure")
+_TYPE_CODE = ("85756007", "SCT", "Tissue")
+
+# Patient/study attributes copied from the source series into an export
+_STUDY_KEYWORDS = (
+    "PatientName",
+    "PatientID",
+    "PatientBirthDate",
+    "PatientSex",
+    "StudyInstanceUID",
+    "StudyDate",
+    "StudyTime",
+    "StudyID",
+    "AccessionNumber",
+    "ReferringPhysicianName",
+    "FrameOfReferenceUID",
+)
+
+
+class SegmentationError(ValueError):
+    """Invalid segmentation data"""
+
+
+def encode_runs(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Run values and lengths of a labelmap in row-major order"""
+    flat = np.ascontiguousarray(labels, dtype=np.uint8).ravel()
+    starts = np.concatenate([[0], np.nonzero(np.diff(flat))[0] + 1])
+    lengths = np.diff(np.concatenate([starts, [flat.size]]))
+    return flat[starts], lengths.astype(np.uint32)
+
+
+def decode_runs(values, lengths, rows: int, columns: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint8)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if values.shape != lengths.shape or lengths.sum() != rows * columns:
+        raise SegmentationError(f"runs must cover exactly {rows}x{columns} pixels")
+    return np.repeat(values, lengths).reshape(rows, columns)
+
+
+def encode_slice(labels: np.ndarray) -> bytes:
+    values, lengths = encode_runs(labels)
+    packed = struct.pack("<I", len(values)) + values.tobytes()
+    return zlib.compress(packed + lengths.astype("<u4").tobytes())
+
+
+def decode_slice(data: bytes, rows: int, columns: int) -> np.ndarray:
+    packed = zlib.decompress(data)
+    (count,) = struct.unpack_from("<I", packed)
+    values = np.frombuffer(packed, dtype=np.uint8, count=count, offset=4)
+    lengths = np.frombuffer(packed, dtype="<u4", count=count, offset=4 + count)
+    return decode_runs(values, lengths, rows, columns)
+
+
+def load_segments(segmentation: Segmentation) -> List[dict]:
+    return json.loads(segmentation.segments or "[]")
+
+
+def validate_segments(segments: List[dict]) -> List[dict]:
+    """Segment descriptions with unique numbers in 1..255"""
+    numbers = [int(segment.get("number", 0)) for segment in segments]
+    if not segments or len(set(numbers)) != len(numbers):
+        raise SegmentationError("segments must have unique numbers")
+    if min(numbers) < 1 or max(numbers) > MAX_SEGMENTS:
+        raise SegmentationError(f"segment numbers must be between 1 and {MAX_SEGMENTS}")
+    return [
+        {
+            "number": number,
+            "label": str(segment.get("label") or f"Segment {number}"),
+            "color": segment.get("color"),
+        }
+        for number, segment in zip(numbers, segments)
+    ]
+
+
+def series_slices(
+    db: Session, study: Study, series_uid: str
+) -> Tuple[List[str], int, int]:
+    """
+    Source instance per slice index, rows and columns of a series. Slices
+    follow the series volume (geometric order) when one can be assembled,
+    else the single-frame images in slice-number order.
+    """
+    instances = (
+        db.query(DicomFile)
+        .filter(DicomFile.study_id == study.id, DicomFile.series_uid == series_uid)
+        .all()
+    )
+    if not instances:
+        raise SegmentationError("Series not found")
+
+    geometry = load_geometry(study, series_uid) or build_series_volume(
+        study, series_uid, instances
+    )
+    if geometry:
+        _, rows, columns = geometry["shape"]
+        return geometry["instance_uids"], rows, columns
+
+    instance_uids, size = [], None
+    for dicom_file in group_by_series(instances)[series_uid]:
+        try:
+            ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+        except Exception as e:
+            logger.warning(f"Unable to read {dicom_file.file_path}: {e}")
+            continue
+        if not ds.get("Rows") or is_color(ds) or frame_count(ds) > 1:
+            continue
+        size = size or (int(ds.Rows), int(ds.Columns))
+        if (int(ds.Rows), int(ds.Columns)) == size:
+            instance_uids.append(dicom_file.instance_uid)
+    if not instance_uids:
+        raise SegmentationError("Series has no single-frame grayscale images")
+    return instance_uids, size[0], size[1]
+
+
+def write_slices(db: Session, segmentation: Segmentation, labels: Dict[int, np.ndarray]):
+    """Replace the given slices; all-background slices are removed"""
+    for index, slice_labels in labels.items():
+        if not 0 <= index < segmentation.slice_count:
+            raise SegmentationError(
+                f"slice index must be between 0 and {segmentation.slice_count - 1}"
+            )
+        if slice_labels.shape != (segmentation.rows, segmentation.columns):
+            raise SegmentationError(
+                f"slice {index} must be {segmentation.rows}x{segmentation.columns}"
+            )
+
+    existing = {
+        row.slice_index: row
+        for row in segmentation.slices.filter(
+            SegmentationSlice.slice_index.in_(list(labels))
+        )
+    }
+    for index, slice_labels in labels.items():
+        row = existing.get(index)
+        if not slice_labels.any():
+            if row:
+                db.delete(row)
+            continue
+        data = encode_slice(slice_labels)
+        if row:
+            row.data = data
+        else:
+            db.add(
+                SegmentationSlice(
+                    segmentation_id=segmentation.id, slice_index=index, data=data
+                )
+            )
+    segmentation.version += 1
+    segmentation.updated_at = datetime.utcnow()
+
+
+def read_slices(
+    segmentation: Segmentation, start: int = 0, stop: Optional[int] = None
+) -> Dict[int, np.ndarray]:
+    """Stored (non-empty) slices with ``start <= index < stop``"""
+    stop = segmentation.slice_count if stop is None else stop
+    rows = (
+        segmentation.slices.filter(
+            SegmentationSlice.slice_index >= start,
+            SegmentationSlice.slice_index < stop,
+        )
+        .order_by(SegmentationSlice.slice_index)
+        .all()
+    )
+    return {
+        row.slice_index: decode_slice(row.data, segmentation.rows, segmentation.columns)
+        for row in rows
+    }
+
+
+def slice_indices(segmentation: Segmentation) -> List[int]:
+    return [
+        index
+        for (index,) in segmentation.slices.with_entities(
+            SegmentationSlice.slice_index
+        ).order_by(SegmentationSlice.slice_index)
+    ]
+
+
+def _code(value: str, scheme: str, meaning: str) -> Dataset:
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = scheme
+    item.CodeMeaning = meaning
+    return item
+
+
+def _source_headers(db: Session, instance_uids: List[str]) -> Dict[str, Dataset]:
+    files = db.query(DicomFile).filter(DicomFile.instance_uid.in_(instance_uids)).all()
+    headers = {}
+    for dicom_file in files:
+        try:
+            headers[dicom_file.instance_uid] = read_dataset(
+                dicom_file.file_path, stop_before_pixels=True
+            )
+        except Exception as e:
+            logger.warning(f"Unable to read {dicom_file.file_path}: {e}")
+    return headers
+
+
+def export_dicom_seg(db: Session, segmentation: Segmentation) -> bytes:
+    """Binary DICOM Segmentation with one frame per segment and non-empty slice"""
+    instance_uids = json.loads(segmentation.instance_uids)
+    labels = read_slices(segmentation)
+    if not labels:
+        raise SegmentationError("Segmentation is empty")
+    headers = _source_headers(db, [instance_uids[i] for i in labels])
+    if not headers:
+        raise SegmentationError("Source images are no longer available")
+    source = next(iter(headers.values()))
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SEGMENTATION_STORAGE
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    for keyword in _STUDY_KEYWORDS:
+        if keyword in source:
+            setattr(ds, keyword, source.data_element(keyword).value)
+    now = datetime.now()
+    ds.SOPClassUID = SEGMENTATION_STORAGE
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.SeriesInstanceUID = generate_uid()
+    ds.Modality = "SEG"
+    ds.SeriesNumber = 9000 + segmentation.id % 1000
+    ds.SeriesDescription = segmentation.label
+    ds.InstanceNumber = 1
+    ds.ContentDate = now.strftime("%Y%m%d")
+    ds.ContentTime = now.strftime("%H%M%S")
+    ds.ContentLabel = "".join(
+        c if c.isalnum() else "_" for c in segmentation.label.upper()
+    )[:16] or "SEGMENTATION"
+    ds.ContentDescription = segmentation.description or segmentation.label
+    ds.ContentCreatorName = ""
+    ds.Manufacturer = "PACS"
+    ds.ImageType = ["DERIVED", "PRIMARY"]
+    ds.SegmentationType = "BINARY"
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.Rows = segmentation.rows
+    ds.Columns = segmentation.columns
+    ds.BitsAllocated = 1
+    ds.BitsStored = 1
+    ds.HighBit = 0
+    ds.PixelRepresentation = 0
+    ds.LossyImageCompression = "00"
+
+    segments = load_segments(segmentation)
+    ds.SegmentSequence = Sequence()
+    for segment in segments:
+        item = Dataset()
+        item.SegmentNumber = segment["number"]
+        item.SegmentLabel = segment["label"]
+        item.SegmentAlgorithmType = "MANUAL"
+        item.SegmentedPropertyCategoryCodeSequence = Sequence([_code(*_CATEGORY_CODE)])
+        item.SegmentedPropertyTypeCodeSequence = Sequence([_code(*_TYPE_CODE)])
+        ds.SegmentSequence.append(item)
+
+    measures = Dataset()
+    if "PixelSpacing" in source:
+        measures.PixelSpacing = source.PixelSpacing
+    if "SliceThickness" in source:
+        measures.SliceThickness = source.SliceThickness
+    shared = Dataset()
+    shared.PixelMeasuresSequence = Sequence([measures])
+    if "ImageOrientationPatient" in source:
+        orientation = Dataset()
+        orientation.ImageOrientationPatient = source.ImageOrientationPatient
+        shared.PlaneOrientationSequence = Sequence([orientation])
+    ds.SharedFunctionalGroupsSequence = Sequence([shared])
+
+    ds.DimensionOrganizationSequence = Sequence([Dataset()])
+    ds.DimensionOrganizationSequence[0].DimensionOrganizationUID = generate_uid()
+    dimension_uid = ds.DimensionOrganizationSequence[0].DimensionOrganizationUID
+    ds.DimensionIndexSequence = Sequence()
+    for pointer, group in (
+        ("ReferencedSegmentNumber", "SegmentIdentificationSequence"),
+        ("ImagePositionPatient", "PlanePositionSequence"),
+    ):
+        item = Dataset()
+        item.DimensionOrganizationUID = dimension_uid
+        item.DimensionIndexPointer = pydicom.datadict.tag_for_keyword(pointer)
+        item.FunctionalGroupPointer = pydicom.datadict.tag_for_keyword(group)
+        ds.DimensionIndexSequence.append(item)
+
+    frames, per_frame = [], Sequence()
+    for segment in segments:
+        for index, slice_labels in labels.items():
+            mask = slice_labels == segment["number"]
+            header = headers.get(instance_uids[index])
+            if header is None or not mask.any():
+                continue
+            frames.append(mask)
+
+            item = Dataset()
+            source_image = Dataset()
+            source_image.ReferencedSOPClassUID = header.SOPClassUID
+            source_image.ReferencedSOPInstanceUID = header.SOPInstanceUID
+            source_image.PurposeOfReferenceCodeSequence = Sequence(
+                [_code("121322", "DCM", "Source image for image processing operation")]
+            )
+            derivation = Dataset()
+            derivation.DerivationCodeSequence = Sequence(
+                [_code("113076", "DCM", "Segmentation")]
+            )
+            derivation.SourceImageSequence = Sequence([source_image])
+            item.DerivationImageSequence = Sequence([derivation])
+
+            content = Dataset()
+            content.DimensionIndexValues = [segment["number"], index + 1]
+            item.FrameContentSequence = Sequence([content])
+            if "ImagePositionPatient" in header:
+                position = Dataset()
+                position.ImagePositionPatient = header.ImagePositionPatient
+                item.PlanePositionSequence = Sequence([position])
+            identification = Dataset()
+            identification.ReferencedSegmentNumber = segment["number"]
+            item.SegmentIdentificationSequence = Sequence([identification])
+            per_frame.append(item)
+
+    if not frames:
+        raise SegmentationError("Segmentation has no labelled segment voxels")
+    ds.PerFrameFunctionalGroupsSequence = per_frame
+    ds.NumberOfFrames = len(frames)
+    # Frames are packed back to back without per-frame padding
+    ds.PixelData = pack_bits(np.stack(frames).astype(np.uint8))
+
+    referenced = Dataset()
+    referenced.SeriesInstanceUID = source.SeriesInstanceUID
+    referenced.ReferencedInstanceSequence = Sequence()
+    for uid, header in headers.items():
+        item = Dataset()
+        item.ReferencedSOPClassUID = header.SOPClassUID
+        item.ReferencedSOPInstanceUID = uid
+        referenced.ReferencedInstanceSequence.append(item)
+    ds.ReferencedSeriesSequence = Sequence([referenced])
+
+    buffer = BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def _frame_slice(
+    item: Dataset,
+    uid_index: Dict[str, int],
+    normal: Optional[np.ndarray],
+    locations: Optional[np.ndarray],
+) -> Optional[int]:
+    """Slice index of a SEG frame, by source image reference or plane position"""
+    for derivation in item.get("DerivationImageSequence", []):
+        for source in derivation.get("SourceImageSequence", []):
+            index = uid_index.get(str(source.get("ReferencedSOPInstanceUID", "")))
+            if index is not None:
+                return index
+
+    positions = item.get("PlanePositionSequence")
+    if positions and normal is not None and locations is not None:
+        location = float(
+            np.dot(np.array(positions[0].ImagePositionPatient, dtype=float), normal)
+        )
+        nearest = int(np.argmin(np.abs(locations - location)))
+        spacing = np.median(np.abs(np.diff(locations))) if len(locations) > 1 else 1.0
+        if abs(locations[nearest] - location) <= spacing / 2:
+            return nearest
+    return None
+
+
+def _referenced_series(db: Session, study: Study, ds: Dataset) -> str:
+    for series in ds.get("ReferencedSeriesSequence", []):
+        return str(series.SeriesInstanceUID)
+    for item in ds.get("PerFrameFunctionalGroupsSequence", []):
+        for derivation in item.get("DerivationImageSequence", []):
+            for source in derivation.get("SourceImageSequence", []):
+                dicom_file = (
+                    db.query(DicomFile)
+                    .filter(
+                        DicomFile.study_id == study.id,
+                        DicomFile.instance_uid == str(source.ReferencedSOPInstanceUID),
+                    )
+                    .first()
+                )
+                if dicom_file:
+                    return dicom_file.series_uid
+    raise SegmentationError("SEG does not reference a series of this study")
+
+
+def import_dicom_seg(
+    db: Session, study: Study, user_id: int, data: bytes
+) -> Segmentation:
+    """Create a segmentation from a DICOM SEG referencing a series of the study"""
+    try:
+        ds = pydicom.dcmread(BytesIO(data))
+    except Exception as e:
+        raise SegmentationError(f"Not a DICOM file: {e}")
+    if str(ds.get("SOPClassUID", "")) != SEGMENTATION_STORAGE:
+        raise SegmentationError("Not a DICOM Segmentation object")
+    if str(ds.get("StudyInstanceUID", "")) != study.study_uid:
+        raise SegmentationError("SEG belongs to a different study")
+
+    series_uid = _referenced_series(db, study, ds)
+    instance_uids, rows, columns = series_slices(db, study, series_uid)
+    if (int(ds.Rows), int(ds.Columns)) != (rows, columns):
+        raise SegmentationError(
+            f"SEG is {ds.Rows}x{ds.Columns} but the series is {rows}x{columns}"
+        )
+
+    geometry = load_geometry(study, series_uid)
+    normal = locations = None
+    if geometry:
+        normal = slice_normal(geometry["orientation"])
+        locations = np.array(geometry["slice_locations"], dtype=float)
+    uid_index = {uid: index for index, uid in enumerate(instance_uids)}
+
+    segments = validate_segments(
+        [
+            {"number": int(item.SegmentNumber), "label": item.get("SegmentLabel")}
+            for item in ds.SegmentSequence
+        ]
+    )
+    pixels = ds.pixel_array
+    if pixels.ndim == 2:
+        pixels = pixels[None]
+    threshold = 0
+    if ds.get("SegmentationType") == "FRACTIONAL":
+        threshold = int(ds.get("MaximumFractionalValue", 255)) // 2
+
+    labels: Dict[int, np.ndarray] = {}
+    skipped = 0
+    for frame, item in zip(pixels, ds.PerFrameFunctionalGroupsSequence):
+        index = _frame_slice(item, uid_index, normal, locations)
+        if index is None:
+            skipped += 1
+            continue
+        number = int(item.SegmentIdentificationSequence[0].ReferencedSegmentNumber)
+        target = labels.setdefault(index, np.zeros((rows, columns), dtype=np.uint8))
+        # Overlapping segments: the higher-numbered one wins in the labelmap,
+        # whatever order the frames come in
+        mask = np.where(frame > threshold, number, 0).astype(np.uint8)
+        np.maximum(target, mask, out=target)
+    if skipped:
+        logger.warning(f"{skipped} SEG frames did not match a slice of {series_uid}")
+
+    segmentation = Segmentation(
+        study_id=study.id,
+        series_uid=series_uid,
+        created_by_id=user_id,
+        label=str(ds.get("SeriesDescription") or ds.get("ContentLabel") or "SEG"),
+        description=str(ds.get("ContentDescription") or ""),
+        segments=json.dumps(segments),
+        rows=rows,
+        columns=columns,
+        slice_count=len(instance_uids),
+        instance_uids=json.dumps(instance_uids),
+    )
+    db.add(segmentation)
+    db.flush()
+    write_slices(db, segmentation, labels)
+    segmentation.version = 1
+    return segmentation
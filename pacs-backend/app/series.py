@@ -0,0 +1,144 @@
+"""
+Series-level grouping and ordering of stored instances
+"""
+
+from collections import Counter, OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from pydicom import Dataset
+
+from .database import DicomFile
+
+
+def slice_sort_key(dicom_file: DicomFile):
+    return (
+        dicom_file.slice_number is None,
+        dicom_file.slice_number or 0,
+        dicom_file.id or 0,
+    )
+
+
+def group_by_series(files: List[DicomFile]) -> "OrderedDict[str, List[DicomFile]]":
+    """Group instances by series, each series ordered by slice number"""
+    series: "OrderedDict[str, List[DicomFile]]" = OrderedDict()
+    for dicom_file in files:
+        series.setdefault(dicom_file.series_uid or "", []).append(dicom_file)
+    for instances in series.values():
+        instances.sort(key=slice_sort_key)
+    return series
+
+
+def slice_key(ds: Dataset) -> tuple:
+    """Size and orientation of a slice; the slices of one stack share it"""
+    try:
+        orientation = [float(v) for v in ds.get("ImageOrientationPatient") or []]
+    except (TypeError, ValueError):
+        orientation = []
+    return (
+        int(ds.get("Rows", 0) or 0),
+        int(ds.get("Columns", 0) or 0),
+        tuple(round(v, 3) for v in orientation),
+    )
+
+
+def dominant_slices(headers: List[Dataset]) -> List[int]:
+    """Indices of the slices of the most common size/orientation (drops localizers)"""
+    if not headers:
+        return []
+    keys = [slice_key(ds) for ds in headers]
+    dominant, _ = Counter(keys).most_common(1)[0]
+    return [i for i, key in enumerate(keys) if key == dominant]
+
+
+def slice_normal(orientation) -> Optional[np.ndarray]:
+    """Unit normal of the image plane from ImageOrientationPatient"""
+    if orientation is None or len(orientation) != 6:
+        return None
+    row = np.array(orientation[:3], dtype=float)
+    column = np.array(orientation[3:], dtype=float)
+    normal = np.cross(row, column)
+    length = np.linalg.norm(normal)
+    return normal / length if length else None
+
+
+def slice_location(position, normal: np.ndarray) -> Optional[float]:
+    """Distance of a slice along the normal, from ImagePositionPatient"""
+    if position is None or len(position) != 3:
+        return None
+    return float(np.dot(np.array(position, dtype=float), normal))
+
+
+def geometric_order(headers: List[Dataset]) -> Optional[List[int]]:
+    """
+    Indices of ``headers`` sorted along the slice normal, or None when the
+    slices lack position/orientation or are not parallel.
+    """
+    if not headers:
+        return None
+    normal = slice_normal(headers[0].get("ImageOrientationPatient"))
+    if normal is None:
+        return None
+
+    locations = []
+    for ds in headers:
+        other = slice_normal(ds.get("ImageOrientationPatient"))
+        if other is None or abs(float(np.dot(normal, other))) < 0.999:
+            return None
+        location = slice_location(ds.get("ImagePositionPatient"), normal)
+        if location is None:
+            return None
+        locations.append(location)
+    return sorted(range(len(headers)), key=locations.__getitem__)
+
+
+def slice_spacing(locations: List[float]) -> dict:
+    """
+    Spacing summary of sorted slice locations: median step, whether it is
+    uniform, gaps (steps well above the median) and coincident positions.
+    """
+    steps = np.diff(np.asarray(locations, dtype=float))
+    distinct = steps[steps > 1e-3]
+    if not len(distinct):
+        return {
+            "slice_spacing": None,
+            "uniform_spacing": False,
+            "gaps": [],
+            "duplicate_positions": int(len(steps)),
+        }
+    spacing = float(np.median(distinct))
+    gaps = [
+        {"after": int(index), "spacing": float(step)}
+        for index, step in enumerate(steps)
+        if step > 1.5 * spacing
+    ]
+    return {
+        "slice_spacing": spacing,
+        "uniform_spacing": bool(
+            len(distinct) == len(steps) and np.ptp(distinct) < 0.01 * spacing
+        ),
+        "gaps": gaps,
+        "duplicate_positions": int(len(steps) - len(distinct)),
+    }
+
+
+def progressive_order(count: int) -> List[int]:
+    """
+    Coarse-to-fine fetch order for a stack: the middle slice, then every
+    ``2**k``-th slice from the coarsest stride down to every slice, middle-out
+    within each pass, so the first requests already span the whole stack.
+    """
+    if count <= 0:
+        return []
+    middle = (count - 1) / 2
+    # The middle slice is the most useful single image to show first
+    order: List[int] = [count // 2]
+    seen = set(order)
+    stride = 1 << max(count - 1, 1).bit_length()
+    while stride >= 1:
+        level = [i for i in range(0, count, stride) if i not in seen]
+        level.sort(key=lambda i: (abs(i - middle), i))
+        order.extend(level)
+        seen.update(level)
+        stride //= 2
+    return order
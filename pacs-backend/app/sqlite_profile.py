@@ -0,0 +1,152 @@
+"""
+Tuned SQLite profile for single-node deployments.
+
+WAL lets readers run while a write commits, and ``synchronous=NORMAL`` is
+safe under WAL (a power cut may lose the last commits, never the file).
+Memory-mapped I/O and a larger page cache cut read syscalls, and
+``busy_timeout`` makes a connection wait for another process's writer
+instead of failing at once.
+
+SQLite admits one writer at a time. Within a process, sessions queue for
+that slot in arrival order on ``SQLiteWriteQueue`` from their first flush
+until their transaction ends, instead of racing in SQLite's busy handler
+(the "database is locked" errors under concurrent uploads and audit
+inserts). Other processes such as Celery workers are still coordinated by
+``busy_timeout``.
+
+The queue never waits on the event loop thread: the session holding the slot
+may itself need the loop to reach its commit. A session flushing there takes
+the slot if it is free and otherwise fails at once with ``WriteSlotTimeout``,
+answered with 503; worker threads wait up to ``SQLITE_WRITE_QUEUE_TIMEOUT``.
+Handlers must therefore not hold a flushed, uncommitted session across an
+``await``, and work run in the threadpool commits before it returns.
+"""
+
+from collections import deque
+from typing import List, Tuple
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# "tuned" applies the pragmas and write queue below, "default" leaves SQLite as is
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned")
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024**2)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_WRITE_QUEUE_TIMEOUT = float(os.getenv("SQLITE_WRITE_QUEUE_TIMEOUT", "30"))
+
+
+def sqlite_pragmas() -> List[Tuple[str, object]]:
+    return [
+        ("journal_mode", SQLITE_JOURNAL_MODE),
+        ("synchronous", SQLITE_SYNCHRONOUS),
+        ("mmap_size", SQLITE_MMAP_SIZE),
+        ("cache_size", -SQLITE_CACHE_SIZE_KB),  # negative: KiB rather than pages
+        ("busy_timeout", SQLITE_BUSY_TIMEOUT_MS),
+        ("temp_store", "MEMORY"),
+    ]
+
+
+def apply_sqlite_pragmas(engine):
+    """Set the profile's pragmas on every new connection of ``engine``"""
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class WriteSlotTimeout(TimeoutError):
+    """No write slot: the wait timed out, or it would block the event loop"""
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class SQLiteWriteQueue:
+    """First-come, first-served single-writer slot shared by a process's sessions"""
+
+    def __init__(self, timeout: float = SQLITE_WRITE_QUEUE_TIMEOUT):
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._owner = None
+
+    def acquire(self, owner):
+        with self._condition:
+            if self._owner is owner:
+                return
+            if _on_event_loop():
+                # Never wait here; a free slot is taken ahead of waiting
+                # threads, which the loop's short transaction barely delays
+                if self._owner is not None:
+                    raise WriteSlotTimeout(
+                        "SQLite write queue: slot busy, not waiting on the event loop"
+                    )
+                self._owner = owner
+                return
+            self._waiting.append(owner)
+            deadline = time.monotonic() + self.timeout
+            while self._owner is not None or self._waiting[0] is not owner:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(owner)
+                    self._condition.notify_all()
+                    raise WriteSlotTimeout(
+                        f"SQLite write queue: no write slot within {self.timeout:g}s"
+                    )
+                self._condition.wait(remaining)
+            self._waiting.popleft()
+            self._owner = owner
+
+    def release(self, owner):
+        with self._condition:
+            if self._owner is owner:
+                self._owner = None
+                self._condition.notify_all()
+
+    @property
+    def depth(self) -> int:
+        """Sessions waiting for the write slot"""
+        return len(self._waiting)
+
+
+def attach_write_queue(session_factory, queue: SQLiteWriteQueue):
+    """Route the writes of sessions from ``session_factory`` through ``queue``"""
+
+    @event.listens_for(session_factory, "before_flush")
+    def acquire_write_slot(session, flush_context, instances):
+        queue.acquire(session)
+
+    @event.listens_for(session_factory, "after_transaction_end")
+    def release_write_slot(session, transaction):
+        if transaction.parent is None:
+            queue.release(session)
+
+
+def configure_sqlite(engine, session_factory) -> SQLiteWriteQueue:
+    """Apply the tuned profile to a SQLite engine and its session factory"""
+    queue = SQLiteWriteQueue()
+    if SQLITE_PROFILE == "tuned":
+        apply_sqlite_pragmas(engine)
+        attach_write_queue(session_factory, queue)
+        logger.info(
+            f"SQLite profile: journal_mode={SQLITE_JOURNAL_MODE}, "
+            f"synchronous={SQLITE_SYNCHRONOUS}, single-writer queue"
+        )
+    return queue
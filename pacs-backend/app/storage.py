@@ -0,0 +1,105 @@
+"""
+Storage layout for study instances and derived artifacts.
+
+Instances live in ``uploads/<study_uid>/``; everything computed from them
+(thumbnails, metadata documents, ...) goes in a ``derived`` directory next to
+the instances so it is removed together with the study.
+
+Artifacts built on request in the background carry marker files: a
+``.building`` marker while a build is queued or running, so polling clients
+do not queue duplicates, and a ``.failed`` marker holding the reason when the
+build did not produce the artifact.
+"""
+
+from typing import Optional
+import json
+import os
+import re
+import time
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+DERIVED_DIRNAME = "derived"
+# A build marker older than this was left by a worker that died
+BUILD_TIMEOUT_SECONDS = float(os.getenv("BUILD_TIMEOUT_SECONDS", "900"))
+# A failed build is reported for this long before it is attempted again
+BUILD_FAILURE_TTL_SECONDS = float(os.getenv("BUILD_FAILURE_TTL_SECONDS", "3600"))
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def safe_name(value: str, default: str = "unknown") -> str:
+    """Turn a UID or other identifier into a safe file name component"""
+    cleaned = _UNSAFE_CHARS.sub("_", value or "").strip("._")
+    return cleaned or default
+
+
+def study_dir(study) -> str:
+    """Directory holding the instances of a study"""
+    return os.path.join(UPLOAD_DIR, study.study_uid)
+
+
+def derived_dir(study, *parts: str, create: bool = False) -> str:
+    """Directory for derived artifacts of a study, e.g. ``derived_dir(study, "thumbnails")``"""
+    path = os.path.join(study_dir(study), DERIVED_DIRNAME, *parts)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_atomic(path: str, data: bytes):
+    """Write bytes so readers never observe a partially written file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def inputs_version(instances) -> str:
+    """Identifies the instance set an artifact is built from"""
+    return f"{len(instances)}:{max((i.id for i in instances), default=0)}"
+
+
+def claim_build(path: str) -> bool:
+    """Mark ``path`` as being built; False while another build holds it"""
+    marker = f"{path}.building"
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        pass
+    try:
+        if time.time() - os.path.getmtime(marker) < BUILD_TIMEOUT_SECONDS:
+            return False
+        os.utime(marker)
+    except OSError:
+        # Released meanwhile; the next request claims it
+        return False
+    return True
+
+
+def release_build(path: str):
+    try:
+        os.remove(f"{path}.building")
+    except FileNotFoundError:
+        pass
+
+
+def record_build_failure(path: str, reason: str, version: str = ""):
+    write_atomic(
+        f"{path}.failed", json.dumps({"reason": reason, "version": version}).encode()
+    )
+
+
+def build_failure(path: str, version: str = "") -> Optional[str]:
+    """Why ``path`` could not be built from the same inputs recently, if it failed"""
+    marker = f"{path}.failed"
+    try:
+        if time.time() - os.path.getmtime(marker) >= BUILD_FAILURE_TTL_SECONDS:
+            return None
+        with open(marker) as f:
+            failure = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return failure["reason"] if failure.get("version") == version else None
@@ -0,0 +1,317 @@
+"""
+Streaming ZIP export of a whole study.
+
+The archive is produced chunk by chunk straight from the stored instances: no
+temporary file is written and at most one read chunk plus its compressed output
+is held in memory. With ``include_dicomdir`` the instances are laid out as a
+DICOM File-set (``PT000000/ST000000/SE000000/IM000000``) and a DICOMDIR
+describing them is appended as the last entry.
+"""
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import logging
+import os
+import zipfile
+
+import pydicom
+from pydicom import Dataset, FileMetaDataset
+from pydicom.filebase import DicomBytesIO
+from pydicom.filewriter import write_dataset, write_file_meta_info
+from pydicom.tag import ItemTag, ItemDelimiterTag, SequenceDelimiterTag, Tag
+from pydicom.uid import (
+    ExplicitVRLittleEndian,
+    MediaStorageDirectoryStorage,
+    PYDICOM_IMPLEMENTATION_UID,
+    generate_uid,
+)
+from starlette.concurrency import iterate_in_threadpool
+
+from .cache import instance_cache
+from .database import DicomFile, Study
+from .storage import safe_name
+from .series import group_by_series
+from .upload_config import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COMPRESSION = {
+    "deflate": zipfile.ZIP_DEFLATED,
+    "store": zipfile.ZIP_STORED,
+}
+
+# Leaf directory record types for non-image instances (PS3.3 F.5)
+LEAF_RECORD_TYPES = {
+    "SR": "SR DOCUMENT",
+    "KO": "KEY OBJECT DOC",
+    "PR": "PRESENTATION",
+    "RTSTRUCT": "RT STRUCTURE SET",
+    "RTPLAN": "RT PLAN",
+    "RTDOSE": "RT DOSE",
+    "DOC": "ENCAP DOC",
+}
+
+
+@dataclass
+class ArchiveEntry:
+    arcname: str
+    path: str
+    file_id: Optional[List[str]] = None  # DICOMDIR Referenced File ID components
+
+
+def archive_entries(
+    study: Study, files: List[DicomFile], include_dicomdir: bool = False
+) -> List[ArchiveEntry]:
+    """Lay out the instances of a study inside the archive, series by series"""
+    entries = []
+    for series_index, (series_uid, instances) in enumerate(
+        group_by_series(files).items()
+    ):
+        for instance_index, dicom_file in enumerate(instances):
+            if include_dicomdir:
+                file_id = [
+                    "PT000000",
+                    "ST000000",
+                    f"SE{series_index:06d}",
+                    f"IM{instance_index:06d}",
+                ]
+                arcname = "/".join(file_id)
+            else:
+                file_id = None
+                arcname = "/".join(
+                    [
+                        study.id,
+                        f"{series_index + 1:03d}_{safe_name(series_uid)[:48]}",
+                        os.path.basename(dicom_file.file_path),
+                    ]
+                )
+            entries.append(ArchiveEntry(arcname, dicom_file.file_path, file_id))
+    return entries
+
+
+class _ZipSink:
+    """Write-only, non-seekable buffer that ``zipfile`` streams into"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_study_archive(
+    entries: List[ArchiveEntry],
+    compression: int = zipfile.ZIP_DEFLATED,
+    include_dicomdir: bool = False,
+    fileset_id: str = "",
+) -> Iterator[bytes]:
+    """Yield the ZIP archive of ``entries`` chunk by chunk"""
+    sink = _ZipSink()
+    headers: List[Tuple[List[str], Dataset]] = []
+
+    with zipfile.ZipFile(sink, "w", compression=compression, allowZip64=True) as zf:
+        for entry in entries:
+            if not os.path.exists(entry.path):
+                logger.warning(f"Skipping missing instance {entry.path}")
+                continue
+
+            info = zipfile.ZipInfo.from_file(entry.path, entry.arcname)
+            info.compress_type = compression
+            # Read a hot copy if there is one, without admitting the bulk read
+            with open(instance_cache.resolve(entry.path), "rb") as src:
+                if include_dicomdir:
+                    try:
+                        headers.append(
+                            (
+                                entry.file_id,
+                                pydicom.dcmread(
+                                    src, stop_before_pixels=True, force=True
+                                ),
+                            )
+                        )
+                    except Exception as e:
+                        logger.warning(f"Unable to index {entry.path}: {e}")
+                    src.seek(0)
+
+                with zf.open(info, "w") as dst:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            yield sink.drain()
+
+        if include_dicomdir and headers:
+            zf.writestr("DICOMDIR", build_dicomdir(headers, fileset_id))
+
+    # Closing the archive writes the central directory
+    yield sink.drain()
+
+
+async def stream_study_archive(
+    entries: List[ArchiveEntry],
+    compression: int = zipfile.ZIP_DEFLATED,
+    include_dicomdir: bool = False,
+    fileset_id: str = "",
+) -> AsyncIterator[bytes]:
+    """
+    Async wrapper running the archive generator in the threadpool. When the
+    client disconnects the response task is cancelled and the generator is
+    closed, which releases the instance file it was reading.
+    """
+    chunks = iter_study_archive(entries, compression, include_dicomdir, fileset_id)
+    try:
+        async for chunk in iterate_in_threadpool(chunks):
+            if chunk:
+                yield chunk
+    finally:
+        chunks.close()
+
+
+class _DirectoryRecord:
+    def __init__(self, ds: Dataset):
+        self.ds = ds
+        self.children: List["_DirectoryRecord"] = []
+        self.offset = 0
+
+
+def _new_record(record_type: str, source: Dataset, keywords: List[str]) -> Dataset:
+    record = Dataset()
+    record.OffsetOfTheNextDirectoryRecord = 0
+    record.RecordInUseFlag = 0xFFFF
+    record.OffsetOfReferencedLowerLevelDirectoryEntity = 0
+    record.DirectoryRecordType = record_type
+    if "SpecificCharacterSet" in source:
+        record.SpecificCharacterSet = source.SpecificCharacterSet
+    for keyword in keywords:
+        setattr(record, keyword, source.get(keyword, ""))
+    return record
+
+
+def build_dicomdir(
+    instances: List[Tuple[List[str], Dataset]], fileset_id: str = ""
+) -> bytes:
+    """Encode a DICOMDIR for instances given as (Referenced File ID, header)"""
+    roots: List[_DirectoryRecord] = []
+    patients: Dict[str, _DirectoryRecord] = {}
+    studies: Dict[str, _DirectoryRecord] = {}
+    series: Dict[str, _DirectoryRecord] = {}
+
+    for file_id, ds in instances:
+        patient_key = str(ds.get("PatientID", ""))
+        if patient_key not in patients:
+            patients[patient_key] = _DirectoryRecord(
+                _new_record("PATIENT", ds, ["PatientName", "PatientID"])
+            )
+            roots.append(patients[patient_key])
+
+        study_key = str(ds.get("StudyInstanceUID", ""))
+        if study_key not in studies:
+            studies[study_key] = _DirectoryRecord(
+                _new_record(
+                    "STUDY",
+                    ds,
+                    [
+                        "StudyDate",
+                        "StudyTime",
+                        "AccessionNumber",
+                        "StudyDescription",
+                        "StudyInstanceUID",
+                        "StudyID",
+                    ],
+                )
+            )
+            patients[patient_key].children.append(studies[study_key])
+
+        series_key = str(ds.get("SeriesInstanceUID", ""))
+        if series_key not in series:
+            series[series_key] = _DirectoryRecord(
+                _new_record(
+                    "SERIES", ds, ["Modality", "SeriesInstanceUID", "SeriesNumber"]
+                )
+            )
+            studies[study_key].children.append(series[series_key])
+
+        modality = str(ds.get("Modality", "")).upper()
+        leaf = _new_record(
+            LEAF_RECORD_TYPES.get(modality, "IMAGE"), ds, ["InstanceNumber"]
+        )
+        leaf.ReferencedFileID = file_id
+        leaf.ReferencedSOPClassUIDInFile = ds.get("SOPClassUID", "")
+        leaf.ReferencedSOPInstanceUIDInFile = ds.get("SOPInstanceUID", "")
+        file_meta = getattr(ds, "file_meta", None)
+        if file_meta is not None and "TransferSyntaxUID" in file_meta:
+            leaf.ReferencedTransferSyntaxUIDInFile = file_meta.TransferSyntaxUID
+        series[series_key].children.append(_DirectoryRecord(leaf))
+
+    ordered: List[_DirectoryRecord] = []
+
+    def visit(nodes: List[_DirectoryRecord]):
+        for node in nodes:
+            ordered.append(node)
+            visit(node.children)
+
+    visit(roots)
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = MediaStorageDirectoryStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    meta.ImplementationClassUID = PYDICOM_IMPLEMENTATION_UID
+
+    # Record offsets are fixed-size UL values, so a first pass with zeroed
+    # offsets yields the byte position of every record for the second pass
+    for _ in range(2):
+        for siblings in [roots] + [node.children for node in ordered]:
+            for index, node in enumerate(siblings):
+                node.ds.OffsetOfTheNextDirectoryRecord = (
+                    siblings[index + 1].offset if index + 1 < len(siblings) else 0
+                )
+                node.ds.OffsetOfReferencedLowerLevelDirectoryEntity = (
+                    node.children[0].offset if node.children else 0
+                )
+
+        header = Dataset()
+        header.FileSetID = fileset_id[:16]
+        header.OffsetOfTheFirstDirectoryRecordOfTheRootDirectoryEntity = (
+            roots[0].offset if roots else 0
+        )
+        header.OffsetOfTheLastDirectoryRecordOfTheRootDirectoryEntity = (
+            roots[-1].offset if roots else 0
+        )
+        header.FileSetConsistencyFlag = 0
+
+        fp = DicomBytesIO()
+        fp.is_little_endian = True
+        fp.is_implicit_VR = False
+        fp.write(b"\x00" * 128 + b"DICM")
+        write_file_meta_info(fp, meta)
+        write_dataset(fp, header)
+
+        # Directory Record Sequence, undefined length
+        fp.write_tag(Tag(0x0004, 0x1220))
+        fp.write(b"SQ\x00\x00")
+        fp.write_UL(0xFFFFFFFF)
+        for node in ordered:
+            node.offset = fp.tell()
+            fp.write_tag(ItemTag)
+            fp.write_UL(0xFFFFFFFF)
+            write_dataset(fp, node.ds)
+            fp.write_tag(ItemDelimiterTag)
+            fp.write_UL(0)
+        fp.write_tag(SequenceDelimiterTag)
+        fp.write_UL(0)
+
+    return fp.getvalue()
@@ -0,0 +1,204 @@
+"""
+Per-study metadata document for viewer bootstrap.
+
+The document carries the DICOM JSON header (PS3.18 F.2) of every instance,
+grouped by series, without pixel data or other bulk binary elements. It is
+stored gzip-compressed under ``derived/metadata`` and keyed by an ETag derived
+from the study row, its instance set and the document format, so any study
+update, new instance or format change produces a new document.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+from pydicom import Dataset
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .database import DicomFile, Study
+from .imaging import frame_count, read_dataset
+from .pixel_stats import load_study_stats, stats_path
+from .series import (
+    dominant_slices,
+    geometric_order,
+    group_by_series,
+    progressive_order,
+    slice_location,
+    slice_normal,
+    slice_spacing,
+)
+from .storage import derived_dir, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Binary elements above this size are left out of the document
+BULK_DATA_THRESHOLD = 1024
+BINARY_VRS = {"OB", "OD", "OF", "OL", "OV", "OW", "UN"}
+# Part of the ETag; bump whenever the document content changes so cached
+# documents and clients' ETags from the previous format are replaced
+METADATA_FORMAT = 2
+
+
+def study_etag(db: Session, study: Study) -> str:
+    """Version key of the study's metadata; changes with the study row or its instances"""
+    count, max_id = (
+        db.query(func.count(DicomFile.id), func.max(DicomFile.id))
+        .filter(DicomFile.study_id == study.id)
+        .one()
+    )
+    version = study.updated_at or study.created_at
+    key = (
+        f"{METADATA_FORMAT}:{study.id}:{version.isoformat() if version else ''}"
+        f":{count}:{max_id}"
+    )
+    # Statistics computed after the document was first built must invalidate it
+    stats_file = stats_path(study)
+    if os.path.exists(stats_file):
+        key += f":{os.path.getmtime(stats_file)}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def metadata_path(study: Study, etag: str) -> str:
+    return os.path.join(derived_dir(study, "metadata"), f"{etag}.json.gz")
+
+
+def instance_metadata(file_path: str) -> dict:
+    """DICOM JSON of an instance header, without pixel data and bulk binaries"""
+    return header_metadata(read_dataset(file_path, stop_before_pixels=True))
+
+
+def header_metadata(ds: Dataset) -> dict:
+    """DICOM JSON of a header read without pixel data; drops bulk binaries in place"""
+    for elem in list(ds):
+        if elem.VR in BINARY_VRS and elem.value is not None:
+            if len(elem.value) > BULK_DATA_THRESHOLD:
+                del ds[elem.tag]
+    return ds.to_json_dict()
+
+
+def order_series(
+    entries: List[dict], headers: List[Optional[Dataset]]
+) -> Tuple[List[dict], dict]:
+    """
+    Entries sorted along the slice normal (the stack's images first; others,
+    such as localizers, after in slice-number order) and the series' spacing
+    summary. The stack is the images of the dominant size/orientation, as in
+    the series volume. Falls back to InstanceNumber order when the stack has
+    no consistent geometry.
+    """
+    images = [
+        i
+        for i, ds in enumerate(headers)
+        if ds is not None and ds.get("Rows") and frame_count(ds) == 1
+    ]
+    images = [images[i] for i in dominant_slices([headers[i] for i in images])]
+    image_set = set(images)
+    others = [i for i in range(len(entries)) if i not in image_set]
+    order = geometric_order([headers[i] for i in images]) if len(images) > 1 else None
+    if order is None:
+        return entries, {"method": "instance_number"}
+
+    sorted_images = [images[i] for i in order]
+    normal = slice_normal(headers[sorted_images[0]].ImageOrientationPatient)
+    locations = [
+        slice_location(headers[i].ImagePositionPatient, normal) for i in sorted_images
+    ]
+    for i, location in zip(sorted_images, locations):
+        entries[i]["slice_location"] = location
+    return [entries[i] for i in sorted_images + others], {
+        "method": "geometric",
+        **slice_spacing(locations),
+    }
+
+
+def build_metadata_document(
+    study: Study, files: List[DicomFile], etag: str
+) -> dict:
+    stats = load_study_stats(study) or {"instances": {}, "series": {}}
+    series = []
+    for series_uid, instances in group_by_series(files).items():
+        entries, headers = [], []
+        for dicom_file in instances:
+            entry = {
+                "file_id": dicom_file.id,
+                "instance_uid": dicom_file.instance_uid,
+                "slice_number": dicom_file.slice_number,
+                "url": f"/studies/dicom/files/{dicom_file.id}",
+                "pixel_stats": stats["instances"].get(dicom_file.instance_uid),
+            }
+            try:
+                ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+                entry["metadata"] = header_metadata(ds)
+            except Exception as e:
+                logger.warning(f"Unable to read header of {dicom_file.file_path}: {e}")
+                ds = None
+                entry["metadata"] = None
+            entries.append(entry)
+            headers.append(ds)
+
+        entries, ordering = order_series(entries, headers)
+        for index, entry in enumerate(entries):
+            entry["slice_index"] = index
+
+        series.append(
+            {
+                "series_uid": series_uid,
+                "modality": instances[0].modality_dicom,
+                "instance_count": len(instances),
+                "window_preset": stats["series"].get(series_uid),
+                "ordering": ordering,
+                # Indices into "instances" for low-density-first loading
+                "fetch_order": progressive_order(len(entries)),
+                "instances": entries,
+            }
+        )
+
+    return {
+        "study_id": study.id,
+        "study_uid": study.study_uid,
+        "etag": etag,
+        "generated_at": datetime.utcnow().isoformat(),
+        "series": series,
+    }
+
+
+def generate_study_metadata(
+    study: Study, files: List[DicomFile], etag: str
+) -> str:
+    """Write the compressed document for ``etag`` and drop older versions"""
+    path = metadata_path(study, etag)
+    if os.path.exists(path):
+        return path
+
+    document = build_metadata_document(study, files, etag)
+    payload = json.dumps(document, separators=(",", ":")).encode()
+    write_atomic(path, gzip.compress(payload, compresslevel=6))
+
+    for old_path in glob.glob(os.path.join(os.path.dirname(path), "*.json.gz")):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    logger.info(
+        f"Metadata document for study {study.id}: {len(files)} instances, "
+        f"{len(payload)} bytes ({os.path.getsize(path)} compressed)"
+    )
+    return path
+
+
+def ensure_study_metadata(db: Session, study: Study) -> Optional[str]:
+    """Path of the current metadata document, generating it if needed"""
+    etag = study_etag(db, study)
+    path = metadata_path(study, etag)
+    if os.path.exists(path):
+        return path
+    files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    return generate_study_metadata(study, files, etag)
@@ -0,0 +1,131 @@
+"""
+Per-series thumbnail generation.
+
+One small JPEG per series is rendered from a key image (if the study carries a
+Key Object Selection document) or from the middle slice, and stored under
+``derived/thumbnails`` next to the instances.
+"""
+
+from typing import Dict, List, Optional, Set
+import logging
+import os
+
+from sqlalchemy.orm import Session
+
+from .database import DicomFile, Study
+from .imaging import (
+    encode_image,
+    get_frame,
+    read_dataset,
+    resize_to_fit,
+    to_display,
+)
+from .series import group_by_series
+from .storage import derived_dir, safe_name, write_atomic
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "128"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+# Series of these modalities carry no pixel data
+NON_IMAGE_MODALITIES = {"KO", "SR", "PR", "REG", "RTSTRUCT", "RTPLAN", "DOC"}
+
+
+def key_image_uids(files: List[DicomFile]) -> Set[str]:
+    """SOP Instance UIDs flagged by Key Object Selection documents in the study"""
+    uids: Set[str] = set()
+    for dicom_file in files:
+        if (dicom_file.modality_dicom or "").upper() != "KO":
+            continue
+        try:
+            ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+        except Exception as e:
+            logger.warning(f"Unable to read key object {dicom_file.file_path}: {e}")
+            continue
+        for evidence in ds.get("CurrentRequestedProcedureEvidenceSequence", []):
+            for series in evidence.get("ReferencedSeriesSequence", []):
+                for sop in series.get("ReferencedSOPSequence", []):
+                    uid = sop.get("ReferencedSOPInstanceUID")
+                    if uid:
+                        uids.add(str(uid))
+    return uids
+
+
+def representative_instance(
+    instances: List[DicomFile], key_uids: Optional[Set[str]] = None
+) -> DicomFile:
+    """Key image of the series if there is one, otherwise the middle slice"""
+    if key_uids:
+        for dicom_file in instances:
+            if dicom_file.instance_uid in key_uids:
+                return dicom_file
+    return instances[len(instances) // 2]
+
+
+def thumbnail_path(study: Study, series_uid: str) -> str:
+    return os.path.join(
+        derived_dir(study, "thumbnails"), f"{safe_name(series_uid)}.jpg"
+    )
+
+
+def render_thumbnail(file_path: str, size: int = THUMBNAIL_SIZE) -> bytes:
+    """Render the middle frame of an instance as a JPEG thumbnail"""
+    ds = read_dataset(file_path)
+    if "PixelData" not in ds:
+        raise ValueError("Instance has no pixel data")
+    image = to_display(ds, get_frame(ds))
+    return encode_image(resize_to_fit(image, size), ".jpg", THUMBNAIL_QUALITY)
+
+
+def generate_series_thumbnail(
+    study: Study,
+    series_uid: str,
+    instances: List[DicomFile],
+    key_uids: Optional[Set[str]] = None,
+    overwrite: bool = False,
+) -> Optional[str]:
+    """Create the thumbnail of one series, returning its path"""
+    path = thumbnail_path(study, series_uid)
+    if os.path.exists(path) and not overwrite:
+        return path
+
+    candidates = [
+        f
+        for f in instances
+        if (f.modality_dicom or "").upper() not in NON_IMAGE_MODALITIES
+    ]
+    if not candidates:
+        return None
+
+    # Fall back to neighbouring slices if the preferred one cannot be rendered
+    first = representative_instance(candidates, key_uids)
+    ordered = [first] + [f for f in candidates if f is not first]
+    for dicom_file in ordered[:3]:
+        try:
+            write_atomic(path, render_thumbnail(dicom_file.file_path))
+            return path
+        except Exception as e:
+            logger.warning(
+                f"Thumbnail rendering failed for {dicom_file.file_path}: {e}"
+            )
+    return None
+
+
+def generate_study_thumbnails(
+    db: Session, study: Study, overwrite: bool = False
+) -> Dict[str, str]:
+    """Create thumbnails for every series of a study"""
+    files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    key_uids = key_image_uids(files)
+
+    generated = {}
+    for series_uid, instances in group_by_series(files).items():
+        path = generate_series_thumbnail(
+            study, series_uid, instances, key_uids, overwrite=overwrite
+        )
+        if path:
+            generated[series_uid] = path
+
+    logger.info(f"Generated {len(generated)} thumbnails for study {study.id}")
+    return generated
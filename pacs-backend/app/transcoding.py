@@ -0,0 +1,158 @@
+"""
+Transfer syntax negotiation and transcoding of stored instances.
+
+Clients ask for a syntax with ``Accept: application/dicom; transfer-syntax=<uid>``
+(PS3.18 8.7.3). Instances are transcoded in a process pool, since pixel codecs
+hold the GIL, and the result is cached as a variant of the stored file in the
+hot cache tier. Only lossless target syntaxes are offered so a transcoded
+instance is diagnostically identical to the stored one.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+import pydicom
+from pydicom import uid
+from pydicom.pixels import get_encoder
+
+from .cache import hot_cache
+
+logger = logging.getLogger(__name__)
+
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+
+UNCOMPRESSED_SYNTAXES = {
+    uid.ImplicitVRLittleEndian,
+    uid.ExplicitVRLittleEndian,
+    uid.DeflatedExplicitVRLittleEndian,
+}
+# Compressed lossless targets; each is offered only if its encoder is installed
+LOSSLESS_SYNTAXES = [
+    uid.RLELossless,
+    uid.JPEGLSLossless,
+    uid.JPEG2000Lossless,
+]
+
+# "*" in the Accept header means: whatever is stored
+ANY_SYNTAX = "*"
+
+
+def _encoder_available(syntax: str) -> bool:
+    try:
+        return get_encoder(syntax).is_available
+    except Exception:
+        return False
+
+
+def supported_syntaxes() -> List[str]:
+    return sorted(UNCOMPRESSED_SYNTAXES) + [
+        syntax for syntax in LOSSLESS_SYNTAXES if _encoder_available(syntax)
+    ]
+
+
+def parse_accept(accept: Optional[str]) -> List[str]:
+    """
+    Transfer syntaxes requested for ``application/dicom``, best first.
+    An empty list means the client expressed no preference.
+    """
+    ranked: List[Tuple[float, int, str]] = []
+    for index, media_range in enumerate((accept or "").split(",")):
+        parts = [part.strip() for part in media_range.split(";")]
+        if parts[0].lower() not in ("application/dicom", "application/*", "*/*"):
+            continue
+
+        params = {}
+        for param in parts[1:]:
+            if "=" in param:
+                key, value = param.split("=", 1)
+                params[key.strip().lower()] = value.strip().strip('"')
+        try:
+            quality = float(params.get("q", "1"))
+        except ValueError:
+            quality = 1.0
+        if quality <= 0:
+            continue
+
+        # Without the parameter existing clients keep receiving the stored bytes
+        ranked.append((-quality, index, params.get("transfer-syntax") or ANY_SYNTAX))
+
+    return [syntax for _, _, syntax in sorted(ranked)]
+
+
+def negotiate(requested: List[str], stored: str) -> Optional[str]:
+    """
+    Syntax to send: the best-ranked request that is the stored syntax, any
+    syntax or a supported one. None means nothing requested can be produced
+    (406).
+    """
+    if not requested:
+        return stored
+    supported = supported_syntaxes()
+    for syntax in requested:
+        if syntax in (stored, ANY_SYNTAX):
+            return stored
+        if syntax in supported:
+            return syntax
+    return None
+
+
+def stored_syntax(path: str) -> str:
+    ds = pydicom.dcmread(path, force=True, stop_before_pixels=True)
+    file_meta = getattr(ds, "file_meta", None)
+    if file_meta is not None and "TransferSyntaxUID" in file_meta:
+        return str(file_meta.TransferSyntaxUID)
+    return uid.ImplicitVRLittleEndian
+
+
+def transcode_file(path: str, syntax: str) -> bytes:
+    """Re-encode an instance in ``syntax``; runs in a worker process"""
+    ds = pydicom.dcmread(path, force=True)
+    target = uid.UID(syntax)
+
+    if "PixelData" in ds:
+        if ds.file_meta.TransferSyntaxUID.is_compressed:
+            ds.decompress()
+        if target.is_compressed:
+            ds.compress(target)
+
+    ds.file_meta.TransferSyntaxUID = target
+    buffer = BytesIO()
+    ds.save_as(
+        buffer,
+        implicit_vr=target.is_implicit_VR,
+        little_endian=target.is_little_endian,
+        enforce_file_format=True,
+    )
+    return buffer.getvalue()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS)
+    return _pool
+
+
+async def transcode(path: str, syntax: str) -> bytes:
+    """Transcoded instance, from the variant cache or the worker pool"""
+    cached = hot_cache.lookup(path, variant=syntax)
+    if cached:
+        try:
+            with open(cached, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another process since the lookup
+            pass
+
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(_get_pool(), transcode_file, path, syntax)
+    await loop.run_in_executor(None, hot_cache.put, path, data, syntax)
+    logger.info(f"Transcoded {path} to {uid.UID(syntax).name} ({len(data)} bytes)")
+    return data
@@ -0,0 +1,249 @@
+"""
+Series volume assembly for MPR/3D.
+
+A series is sorted along its slice normal and written as one contiguous
+``(slices, rows, columns)`` array in modality units to
+``derived/volumes/<series>.npy``, with a ``.json`` geometry file next to it.
+The array can be memory-mapped server-side (reslicing, ROI statistics) and is
+served as a single ranged payload to the browser viewers.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import os
+
+import numpy as np
+from numpy.lib import format as npy_format
+from pydicom import Dataset
+from pydicom.pixels import apply_modality_lut
+from sqlalchemy.orm import Session
+
+from .cache import instance_cache
+from .database import DicomFile, Study
+from .imaging import first_value, frame_count, is_color, modality_units, read_dataset
+from .series import (
+    dominant_slices,
+    geometric_order,
+    group_by_series,
+    slice_location,
+    slice_normal,
+)
+from .storage import (
+    claim_build,
+    derived_dir,
+    inputs_version,
+    record_build_failure,
+    release_build,
+    safe_name,
+    write_atomic,
+)
+
+logger = logging.getLogger(__name__)
+
+# Series with fewer slices are not worth assembling at ingest
+VOLUME_MIN_SLICES = int(os.getenv("VOLUME_MIN_SLICES", "16"))
+
+
+def volume_path(study: Study, series_uid: str) -> str:
+    return os.path.join(derived_dir(study, "volumes"), f"{safe_name(series_uid)}.npy")
+
+
+def geometry_path(study: Study, series_uid: str) -> str:
+    return os.path.join(derived_dir(study, "volumes"), f"{safe_name(series_uid)}.json")
+
+
+def load_geometry(study: Study, series_uid: str) -> Optional[dict]:
+    path = geometry_path(study, series_uid)
+    if not os.path.exists(path) or not os.path.exists(volume_path(study, series_uid)):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def open_volume(study: Study, series_uid: str) -> np.ndarray:
+    """Memory-mapped, read-only view of an assembled volume"""
+    return np.load(instance_cache.resolve(volume_path(study, series_uid)), mmap_mode="r")
+
+
+def _float_list(value) -> Optional[List[float]]:
+    if value is None:
+        return None
+    try:
+        return [float(v) for v in value]
+    except (TypeError, ValueError):
+        return None
+
+
+def _output_dtype(headers: List[Dataset]) -> np.dtype:
+    """Smallest dtype holding every slice's stored range after rescale"""
+    bounds = []
+    for ds in headers:
+        slope = float(ds.get("RescaleSlope", 1) or 1)
+        intercept = float(ds.get("RescaleIntercept", 0) or 0)
+        if not slope.is_integer() or not intercept.is_integer():
+            return np.dtype(np.float32)
+        bits = int(ds.get("BitsStored", 16) or 16)
+        if int(ds.get("PixelRepresentation", 0) or 0):
+            low, high = -(2 ** (bits - 1)), 2 ** (bits - 1) - 1
+        else:
+            low, high = 0, 2**bits - 1
+        bounds.extend([low * slope + intercept, high * slope + intercept])
+
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= min(bounds) and max(bounds) <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.float32)
+
+
+def _select_slices(
+    instances: List[DicomFile],
+) -> Tuple[List[DicomFile], List[Dataset]]:
+    """Single-frame grayscale slices of the dominant size/orientation (drops localizers)"""
+    candidates = []
+    for dicom_file in instances:
+        try:
+            ds = read_dataset(dicom_file.file_path, stop_before_pixels=True)
+        except Exception as e:
+            logger.warning(f"Unable to read {dicom_file.file_path}: {e}")
+            continue
+        if is_color(ds) or frame_count(ds) > 1 or not ds.get("Rows"):
+            continue
+        candidates.append((dicom_file, ds))
+    selected = [candidates[i] for i in dominant_slices([ds for _, ds in candidates])]
+    return [f for f, _ in selected], [ds for _, ds in selected]
+
+
+def build_series_volume(
+    study: Study,
+    series_uid: str,
+    instances: List[DicomFile],
+    overwrite: bool = False,
+) -> Optional[dict]:
+    """Assemble one series into a volume; returns its geometry or None if not possible"""
+    if not overwrite:
+        geometry = load_geometry(study, series_uid)
+        if geometry:
+            return geometry
+
+    files, headers = _select_slices(instances)
+    if len(files) < 2:
+        return None
+
+    order = geometric_order(headers)
+    if order is None:
+        logger.warning(f"Series {series_uid} has no usable slice geometry")
+        return None
+    files = [files[i] for i in order]
+    headers = [headers[i] for i in order]
+
+    first = headers[0]
+    rows, columns = int(first.Rows), int(first.Columns)
+    orientation = _float_list(first.ImageOrientationPatient)
+    normal = slice_normal(orientation)
+    locations = [slice_location(ds.ImagePositionPatient, normal) for ds in headers]
+    steps = np.diff(locations)
+    dtype = _output_dtype(headers)
+
+    path = volume_path(study, series_uid)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    volume = npy_format.open_memmap(
+        tmp_path, mode="w+", dtype=dtype, shape=(len(files), rows, columns)
+    )
+    try:
+        for index, dicom_file in enumerate(files):
+            ds = read_dataset(dicom_file.file_path)
+            volume[index] = apply_modality_lut(ds.pixel_array, ds)
+        volume.flush()
+    except Exception:
+        del volume
+        os.remove(tmp_path)
+        raise
+    del volume
+    os.replace(tmp_path, path)
+
+    with open(path, "rb") as f:
+        if npy_format.read_magic(f) == (1, 0):
+            npy_format.read_array_header_1_0(f)
+        else:
+            npy_format.read_array_header_2_0(f)
+        data_offset = f.tell()
+
+    pixel_spacing = _float_list(first.get("PixelSpacing")) or [1.0, 1.0]
+    geometry = {
+        "series_uid": series_uid,
+        "shape": [len(files), rows, columns],
+        "dtype": dtype.str,
+        "data_offset": data_offset,
+        "origin": _float_list(first.ImagePositionPatient),
+        "orientation": orientation,
+        "normal": normal.tolist(),
+        "pixel_spacing": pixel_spacing,
+        "slice_spacing": float(np.median(steps)) if len(steps) else None,
+        "slice_thickness": first_value(first.get("SliceThickness")),
+        "slice_locations": locations,
+        "uniform_spacing": bool(
+            len(steps) and np.ptp(steps) < 0.01 * abs(np.median(steps))
+        ),
+        "instance_uids": [f.instance_uid for f in files],
+        "units": modality_units(first),
+        "window_center": first_value(first.get("WindowCenter")),
+        "window_width": first_value(first.get("WindowWidth")),
+    }
+    write_atomic(geometry_path(study, series_uid), json.dumps(geometry).encode())
+    logger.info(
+        f"Assembled volume {geometry['shape']} {dtype} for series {series_uid} "
+        f"of study {study.id}"
+    )
+    return geometry
+
+
+def build_requested_volume(
+    study: Study, series_uid: str, instances: List[DicomFile]
+) -> Optional[dict]:
+    """
+    Assemble a volume claimed with ``claim_build`` by a viewer request,
+    recording why when it cannot be built, and release the claim
+    """
+    path = volume_path(study, series_uid)
+    try:
+        geometry = build_series_volume(study, series_uid, instances)
+        if not geometry:
+            record_build_failure(
+                path,
+                "Series cannot be assembled into a volume",
+                inputs_version(instances),
+            )
+        return geometry
+    except Exception as e:
+        record_build_failure(path, f"Volume assembly failed: {e}", inputs_version(instances))
+        raise
+    finally:
+        release_build(path)
+
+
+def generate_study_volumes(
+    db: Session, study: Study, overwrite: bool = False
+) -> Dict[str, dict]:
+    """Assemble a volume for every series with enough slices"""
+    files = db.query(DicomFile).filter(DicomFile.study_id == study.id).all()
+    built = {}
+    for series_uid, instances in group_by_series(files).items():
+        if len(instances) < VOLUME_MIN_SLICES:
+            continue
+        path = volume_path(study, series_uid)
+        # A viewer request may already be assembling it
+        if not claim_build(path):
+            continue
+        try:
+            geometry = build_series_volume(study, series_uid, instances, overwrite)
+        except Exception as e:
+            logger.warning(f"Volume assembly failed for series {series_uid}: {e}")
+            continue
+        finally:
+            release_build(path)
+        if geometry:
+            built[series_uid] = geometry
+    return built
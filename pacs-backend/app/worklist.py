@@ -0,0 +1,187 @@
+"""
+Denormalized worklist read model.
+
+``WorklistEntry`` holds one row per study with the patient, center,
+technician and radiologist names the worklist screens show, so those reads
+are single-table index scans instead of four-way joins. Every ORM flush that
+inserts, deletes or changes a listed field of a study, or renames a patient,
+user or center, rewrites the affected rows in the same transaction (uploads,
+assignment, reporting and status changes all go through the ORM).
+
+Writes outside the ORM (bulk loads, SQL run by hand) are not seen;
+``reconcile_worklist`` rebuilds every row from the base tables and Celery
+beat runs it every ``WORKLIST_RECONCILE_SECONDS``.
+"""
+
+from typing import Set
+import os
+
+from sqlalchemy import (
+    case,
+    delete,
+    event,
+    func,
+    inspect,
+    insert,
+    literal,
+    or_,
+    select,
+    text,
+    true,
+)
+from sqlalchemy.orm import Session, aliased
+
+from .database import DiagnosticCenter, Patient, Study, User, WorklistEntry
+from .prefetch import PRIORITY_ORDER
+
+WORKLIST_RECONCILE_SECONDS = float(os.getenv("WORKLIST_RECONCILE_SECONDS", "3600"))
+
+# Study columns copied into the worklist; a change to any refreshes the row
+STUDY_FIELDS = (
+    "study_uid",
+    "status",
+    "priority",
+    "modality",
+    "body_part",
+    "study_description",
+    "patient_id",
+    "diagnostic_center_id",
+    "uploaded_by_id",
+    "radiologist_id",
+    "assigned_doctor_id",
+)
+NAME_FIELDS = {
+    Patient: ("first_name", "last_name", "patient_id"),
+    User: ("full_name",),
+    DiagnosticCenter: ("name",),
+}
+
+
+def priority_rank(priority):
+    """SQL rank of a priority, most urgent first (unknown values rank as normal)"""
+    return case(
+        *[(func.lower(priority) == name, rank) for name, rank in PRIORITY_ORDER.items()],
+        else_=PRIORITY_ORDER["normal"],
+    )
+
+
+def _projection(condition):
+    """SELECT of worklist rows for the studies matching ``condition``"""
+    technician = aliased(User)
+    radiologist = aliased(User)
+    return (
+        select(
+            Study.id,
+            Study.study_uid,
+            Study.status,
+            Study.priority,
+            priority_rank(Study.priority),
+            Study.modality,
+            Study.body_part,
+            Study.study_description,
+            Patient.patient_id,
+            Patient.first_name + literal(" ") + Patient.last_name,
+            Study.diagnostic_center_id,
+            DiagnosticCenter.name,
+            Study.uploaded_by_id,
+            technician.full_name,
+            Study.radiologist_id,
+            radiologist.full_name,
+            Study.assigned_doctor_id,
+            Study.created_at,
+            Study.updated_at,
+        )
+        .outerjoin(Patient, Patient.id == Study.patient_id)
+        .outerjoin(DiagnosticCenter, DiagnosticCenter.id == Study.diagnostic_center_id)
+        .outerjoin(technician, technician.id == Study.uploaded_by_id)
+        .outerjoin(radiologist, radiologist.id == Study.radiologist_id)
+        .where(condition)
+    )
+
+
+COLUMNS = [
+    "id",
+    "study_uid",
+    "status",
+    "priority",
+    "priority_rank",
+    "modality",
+    "body_part",
+    "study_description",
+    "patient_mrn",
+    "patient_name",
+    "diagnostic_center_id",
+    "center_name",
+    "technician_id",
+    "technician_name",
+    "radiologist_id",
+    "radiologist_name",
+    "assigned_doctor_id",
+    "created_at",
+    "updated_at",
+]
+
+
+def refresh_worklist(connection, condition):
+    """Rewrite the worklist rows of the studies matching ``condition``"""
+    connection.execute(
+        delete(WorklistEntry).where(
+            WorklistEntry.id.in_(select(Study.id).where(condition))
+        )
+    )
+    connection.execute(insert(WorklistEntry).from_select(COLUMNS, _projection(condition)))
+
+
+def reconcile_worklist(connection) -> int:
+    """Rebuild every worklist row from the studies; returns the row count"""
+    if connection.dialect.name == "postgresql":
+        # Writers' refreshes wait for the rebuild to commit, so none is lost
+        connection.execute(text("LOCK TABLE worklist IN EXCLUSIVE MODE"))
+    connection.execute(delete(WorklistEntry))
+    connection.execute(
+        insert(WorklistEntry).from_select(COLUMNS, _projection(true()))
+    )
+    return connection.execute(select(func.count()).select_from(WorklistEntry)).scalar()
+
+
+def _changed(instance, fields) -> bool:
+    state = inspect(instance)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, "after_flush")
+def sync_worklist(session, flush_context):
+    studies: Set[str] = set()
+    removed: Set[str] = set()
+    names = {model: set() for model in NAME_FIELDS}
+
+    for instance in session.new:
+        if isinstance(instance, Study):
+            studies.add(instance.id)
+    for instance in session.dirty:
+        if isinstance(instance, Study) and _changed(instance, STUDY_FIELDS):
+            studies.add(instance.id)
+        for model, fields in NAME_FIELDS.items():
+            if isinstance(instance, model) and _changed(instance, fields):
+                names[model].add(instance.id)
+    for instance in session.deleted:
+        if isinstance(instance, Study):
+            removed.add(instance.id)
+
+    conditions = []
+    if studies:
+        conditions.append(Study.id.in_(studies))
+    if names[Patient]:
+        conditions.append(Study.patient_id.in_(names[Patient]))
+    if names[User]:
+        conditions.append(Study.uploaded_by_id.in_(names[User]))
+        conditions.append(Study.radiologist_id.in_(names[User]))
+    if names[DiagnosticCenter]:
+        conditions.append(Study.diagnostic_center_id.in_(names[DiagnosticCenter]))
+
+    if removed:
+        session.connection().execute(
+            delete(WorklistEntry).where(WorklistEntry.id.in_(removed))
+        )
+    if conditions:
+        refresh_worklist(session.connection(), or_(*conditions))
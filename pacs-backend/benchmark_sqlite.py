@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Concurrent readers versus writers on SQLite, default profile against tuned.
+
+Each profile gets its own scratch database seeded with the query plan check's
+synthetic dataset. Reader processes page through study lists and open
+studies, like API workers serving viewers; writer threads of one more process
+commit upload-sized transactions (a study, its instances and an audit entry).
+Reports throughput, latency percentiles and failed operations ("database is
+locked") per profile.
+
+    python benchmark_sqlite.py [--readers 8] [--writers 1] [--seconds 10]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import AuditLog, Base, DicomFile, Study, StudyStatus
+from app.sqlite_profile import SQLiteWriteQueue, apply_sqlite_pragmas, attach_write_queue
+from check_query_plans import seed
+
+INSTANCES_PER_UPLOAD = 20
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def open_database(path: str, tuned: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    if tuned:
+        apply_sqlite_pragmas(engine)
+        attach_write_queue(factory, SQLiteWriteQueue())
+    return engine, factory
+
+
+def reader(factory, ids, stop, results):
+    while not stop.is_set():
+        started = time.perf_counter()
+        db = factory()
+        try:
+            studies = (
+                db.query(Study)
+                .filter(Study.diagnostic_center_id == ids["center_id"])
+                .order_by(Study.created_at.desc(), Study.id.desc())
+                .limit(50)
+                .all()
+            )
+            if studies:
+                db.query(DicomFile).filter(DicomFile.study_id == studies[0].id).all()
+            results["read"].append(time.perf_counter() - started)
+        except OperationalError:
+            results["read_errors"] += 1
+        finally:
+            db.close()
+
+
+def writer(factory, ids, stop, results):
+    sample = ids["study_id"]
+    while not stop.is_set():
+        started = time.perf_counter()
+        db = factory()
+        try:
+            template = db.query(Study).filter(Study.id == sample).first()
+            study_id = uuid.uuid4().hex[:8].upper()
+            db.add(
+                Study(
+                    id=study_id,
+                    study_uid=str(uuid.uuid4()),
+                    patient_id=template.patient_id,
+                    diagnostic_center_id=template.diagnostic_center_id,
+                    uploaded_by_id=template.uploaded_by_id,
+                    status=StudyStatus.QUEUED,
+                    created_at=datetime.utcnow(),
+                )
+            )
+            for number in range(INSTANCES_PER_UPLOAD):
+                db.add(
+                    DicomFile(
+                        study_id=study_id,
+                        series_uid=f"{study_id}.1",
+                        instance_uid=f"{study_id}.1.{number}",
+                        file_path=f"/nonexistent/{study_id}/{number}.dcm",
+                        slice_number=number + 1,
+                    )
+                )
+            db.commit()
+            db.add(AuditLog(action="upload_study", resource_type="study", resource_id=study_id))
+            db.commit()
+            results["write"].append(time.perf_counter() - started)
+        except OperationalError:
+            db.rollback()
+            results["write_errors"] += 1
+        finally:
+            db.close()
+
+
+def run_process(path, tuned, role, threads, ids, seconds, output):
+    """One process: ``threads`` readers or writers sharing an engine"""
+    engine, factory = open_database(path, tuned)
+    results = {"read": [], "write": [], "read_errors": 0, "write_errors": 0}
+    stop = threading.Event()
+    target = reader if role == "read" else writer
+    workers = [
+        threading.Thread(target=target, args=(factory, ids, stop, results))
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    engine.dispose()
+    output.put(results)
+
+
+def run_profile(name: str, tuned: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine, _ = open_database(path, tuned)
+        if not tuned:
+            with engine.begin() as connection:
+                connection.exec_driver_sql("PRAGMA journal_mode=DELETE")
+        Base.metadata.create_all(engine)
+        ids = seed(engine, args.studies)
+        engine.dispose()
+
+        context = multiprocessing.get_context("fork")
+        output = context.Queue()
+        processes = [
+            context.Process(
+                target=run_process,
+                args=(path, tuned, "read", 1, ids, args.seconds, output),
+            )
+            for _ in range(args.readers)
+        ] + [
+            context.Process(
+                target=run_process,
+                args=(path, tuned, "write", args.writers, ids, args.seconds, output),
+            )
+        ]
+        for process in processes:
+            process.start()
+        results = {"read": [], "write": [], "read_errors": 0, "write_errors": 0}
+        for _ in processes:
+            for key, value in output.get().items():
+                results[key] += value
+        for process in processes:
+            process.join()
+
+    return {
+        "profile": name,
+        "reads/s": len(results["read"]) / args.seconds,
+        "read p50 ms": percentile(results["read"], 0.5) * 1000,
+        "read p99 ms": percentile(results["read"], 0.99) * 1000,
+        "writes/s": len(results["write"]) / args.seconds,
+        "write p50 ms": percentile(results["write"], 0.5) * 1000,
+        "write p99 ms": percentile(results["write"], 0.99) * 1000,
+        "errors": results["read_errors"] + results["write_errors"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8, help="Reader processes")
+    parser.add_argument("--writers", type=int, default=1, help="Writer threads")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--studies", type=int, default=20000, help="Studies to seed")
+    args = parser.parse_args()
+
+    print(
+        f"{args.readers} readers, {args.writers} writer(s), {args.seconds:g}s per profile\n"
+    )
+    rows = [run_profile("default", False, args), run_profile("tuned", True, args)]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print(
+            "  ".join(
+                f"{value:>12.1f}" if isinstance(value, float) else f"{value:>12}"
+                for value in row.values()
+            )
+        )
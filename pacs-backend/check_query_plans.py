@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the list and lookup endpoints.
+
+Migrates a scratch database to head, seeds it with a large synthetic dataset,
+calls the endpoints through the API and EXPLAINs every SELECT they issue.
+Exits with status 1 when a statement reads one of the large tables with a
+sequential scan, so missing or unusable indexes fail CI before they reach
+production data volumes.
+
+    python check_query_plans.py                         # temporary SQLite file
+    python check_query_plans.py --url postgresql://...  # empty scratch database
+
+Unbounded whole-table reads (no WHERE and no LIMIT, e.g. dashboard totals)
+scan by design and are not reported.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the app directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from alembic import command
+from alembic.config import Config
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, pool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.auth import create_access_token
+from app.database import (
+    get_async_db,
+    get_db,
+    Annotation,
+    AuditLog,
+    DeletionRequest,
+    DiagnosticCenter,
+    DicomFile,
+    Patient,
+    Study,
+    StudyStatus,
+    User,
+    UserRole,
+    async_database_url,
+    normalize_database_url,
+)
+from app.replicas import get_async_read_db, get_read_db
+from app.worklist import reconcile_worklist
+from app.rollups import reconcile_rollups
+from app.routers import admin, audit, imaging, measurements, segmentations, studies
+
+LARGE_TABLES = {
+    "studies",
+    "patients",
+    "dicom_files",
+    "annotations",
+    "audit_logs",
+    "deletion_requests",
+    "study_search_documents",
+    "worklist",
+    "activity_rollups",
+}
+AUDIT_ACTIONS = [
+    "login",
+    "logout",
+    "view_study",
+    "download_study",
+    "upload_study",
+    "update_report",
+    "assign_study",
+    "delete_study",
+]
+# Mostly finished work with a thin worklist, as in production
+STATUS_WEIGHTS = {
+    StudyStatus.QUEUED: 1,
+    StudyStatus.PROCESSING: 1,
+    StudyStatus.UPLOADED: 4,
+    StudyStatus.ASSIGNED: 4,
+    StudyStatus.IN_PROGRESS: 4,
+    StudyStatus.COMPLETED: 60,
+    StudyStatus.REVIEWED: 26,
+}
+
+DESCRIPTIONS = [
+    "CT chest with contrast",
+    "Chest X-ray PA and lateral",
+    "MRI brain without contrast",
+    "CT abdomen and pelvis",
+    "Ultrasound abdomen",
+    "CT head trauma protocol",
+]
+FINDINGS = [
+    "No acute cardiopulmonary abnormality.",
+    "Small left apical pneumothorax. No mediastinal shift.",
+    "Right lower lobe consolidation consistent with pneumonia.",
+    "No intracranial hemorrhage or mass effect.",
+    "Simple renal cyst. Otherwise unremarkable.",
+]
+
+def migrate(url: str):
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    config.set_main_option(
+        "script_location",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations"),
+    )
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+def insert(connection, model, rows, batch=10000):
+    for start in range(0, len(rows), batch):
+        connection.execute(model.__table__.insert(), rows[start:start + batch])
+
+
+def seed(engine, study_count: int) -> dict:
+    """Synthetic dataset; returns the ids the endpoint calls refer to"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    def moment(days=730):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    centers = [{"id": i, "name": f"Center {i}"} for i in range(1, 6)]
+    users = [
+        {
+            "id": 1,
+            "email": "admin@check.example",
+            "username": "admin",
+            "full_name": "Admin",
+            "hashed_password": "-",
+            "role": UserRole.ADMIN,
+        }
+    ]
+    staff = {}
+    for center in centers:
+        for role, count in (
+            (UserRole.DIAGNOSTIC_CENTER_ADMIN, 1),
+            (UserRole.TECHNICIAN, 4),
+            (UserRole.DOCTOR, 4),
+            (UserRole.RADIOLOGIST, 2),
+        ):
+            for _ in range(count):
+                user_id = len(users) + 1
+                users.append(
+                    {
+                        "id": user_id,
+                        "email": f"user{user_id}@check.example",
+                        "username": f"user{user_id}",
+                        "full_name": f"User {user_id}",
+                        "hashed_password": "-",
+                        "role": role,
+                        "diagnostic_center_id": center["id"],
+                    }
+                )
+                staff.setdefault((center["id"], role), []).append(user_id)
+
+    patient_count = max(1, study_count // 3)
+    patients = [
+        {
+            "id": i,
+            "patient_id": f"P{i:08d}",
+            "first_name": "Patient",
+            "last_name": str(i),
+            "created_at": moment(),
+        }
+        for i in range(1, patient_count + 1)
+    ]
+
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    study_rows, file_rows, annotation_rows, deletion_rows = [], [], [], []
+    for i in range(study_count):
+        center_id = rng.choice(centers)["id"]
+        study_id = f"S{i:07d}"
+        created = moment()
+        study_rows.append(
+            {
+                "id": study_id,
+                "study_uid": f"1.2.826.0.1.{i}",
+                "patient_id": rng.randint(1, patient_count),
+                "diagnostic_center_id": center_id,
+                "uploaded_by_id": rng.choice(staff[(center_id, UserRole.TECHNICIAN)]),
+                "assigned_doctor_id": rng.choice(staff[(center_id, UserRole.DOCTOR)]),
+                "radiologist_id": rng.choice(staff[(center_id, UserRole.RADIOLOGIST)]),
+                "modality": rng.choice(["CT", "MR", "CR", "US"]),
+                "study_description": rng.choice(DESCRIPTIONS),
+                "final_report": rng.choice(FINDINGS) if i % 3 == 0 else None,
+                "priority": rng.choice(["normal"] * 8 + ["urgent", "stat"]),
+                "status": rng.choices(statuses, weights)[0],
+                "created_at": created,
+            }
+        )
+        for series in range(2):
+            for number in range(2):
+                file_rows.append(
+                    {
+                        "study_id": study_id,
+                        "series_uid": f"1.2.826.0.1.{i}.{series}",
+                        "instance_uid": f"1.2.826.0.1.{i}.{series}.{number}",
+                        "file_path": f"/nonexistent/{study_id}/{series}-{number}.dcm",
+                        "slice_number": number + 1,
+                        "modality_dicom": study_rows[-1]["modality"],
+                        "created_at": created,
+                    }
+                )
+        if i % 5 == 0:
+            annotation_rows.append(
+                {
+                    "study_id": study_id,
+                    "user_id": study_rows[-1]["radiologist_id"],
+                    "annotation_type": "length",
+                    "annotation_data": "{}",
+                    "version": 1,
+                    "created_at": created,
+                }
+            )
+        if i % 25 == 0:
+            deletion_rows.append(
+                {
+                    "study_id": study_id,
+                    "requested_by_id": study_rows[-1]["uploaded_by_id"],
+                    "reason": "duplicate",
+                    "status": rng.choice(["approved"] * 9 + ["pending"]),
+                    "created_at": created,
+                }
+            )
+
+    audit_rows = [
+        {
+            "user_id": rng.randint(1, len(users)),
+            "action": rng.choice(AUDIT_ACTIONS),
+            "resource_type": "study",
+            "resource_id": f"S{rng.randrange(study_count):07d}",
+            "timestamp": moment(),
+        }
+        for _ in range(study_count * 4)
+    ]
+
+    with engine.begin() as connection:
+        insert(connection, DiagnosticCenter, centers)
+        insert(connection, User, users)
+        insert(connection, Patient, patients)
+        insert(connection, Study, study_rows)
+        insert(connection, DicomFile, file_rows)
+        insert(connection, Annotation, annotation_rows)
+        insert(connection, DeletionRequest, deletion_rows)
+        insert(connection, AuditLog, audit_rows)
+        reconcile_worklist(connection)
+        reconcile_rollups(connection)
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+    sample = study_rows[len(study_rows) // 2]
+    return {
+        "study_id": sample["id"],
+        "series_uid": f"{sample['study_uid']}.0",
+        "users": {
+            role: staff[(sample["diagnostic_center_id"], role)][0]
+            for role in (
+                UserRole.DIAGNOSTIC_CENTER_ADMIN,
+                UserRole.TECHNICIAN,
+                UserRole.DOCTOR,
+                UserRole.RADIOLOGIST,
+            )
+        },
+        "center_id": sample["diagnostic_center_id"],
+    }
+
+
+def endpoint_calls(ids: dict):
+    """(label, username, path, query params, follow X-Next-Cursor once)"""
+    study_id = ids["study_id"]
+    users = {role: f"user{user_id}" for role, user_id in ids["users"].items()}
+    return [
+        ("studies (admin)", "admin", "/studies/", {"limit": 50}, True),
+        ("studies by status", "admin", "/studies/", {"limit": 50, "status_filter": "queued"}, True),
+        ("studies (technician)", users[UserRole.TECHNICIAN], "/studies/", {"limit": 50}, True),
+        ("studies (doctor)", users[UserRole.DOCTOR], "/studies/", {"limit": 50}, True),
+        ("studies (radiologist)", users[UserRole.RADIOLOGIST], "/studies/", {"limit": 50}, True),
+        ("studies (center admin)", users[UserRole.DIAGNOSTIC_CENTER_ADMIN], "/studies/", {"limit": 50}, True),
+        ("pending worklist", "admin", "/studies/pending", {"limit": 50}, True),
+        ("pending worklist by center", users[UserRole.RADIOLOGIST], "/studies/pending", {"limit": 50, "center_id": ids["center_id"]}, True),
+        ("deletion requests", "admin", "/studies/deletion-requests", {"limit": 50}, True),
+        ("pending deletion requests", "admin", "/studies/deletion-requests", {"limit": 50, "status_filter": "pending"}, True),
+        ("study search", "admin", "/studies/search", {"q": "pneumothorax", "limit": 20}, True),
+        ("study search by center", users[UserRole.RADIOLOGIST], "/studies/search", {"q": "chest pneumo*", "center_id": ids["center_id"]}, True),
+        ("study", "admin", f"/studies/{study_id}", {}, False),
+        ("study status", "admin", f"/studies/{study_id}/status", {}, False),
+        ("measurements", "admin", f"/studies/{study_id}/measurements", {}, False),
+        ("segmentations", "admin", f"/studies/{study_id}/segmentations", {}, False),
+        ("thumbnails", "admin", f"/studies/{study_id}/thumbnails", {}, False),
+        ("series thumbnail", "admin", f"/studies/{study_id}/thumbnails/{ids['series_uid']}", {}, False),
+        ("audit logs", "admin", "/admin/audit-logs", {"limit": 50}, False),
+        ("audit logs by action", "admin", "/admin/audit-logs", {"limit": 50, "action": "delete_study"}, False),
+        ("audit logs by user", "admin", "/admin/audit-logs", {"limit": 50, "user_id": ids["users"][UserRole.DOCTOR]}, False),
+        ("system monitoring", "admin", "/admin/system-monitoring", {}, False),
+        ("center analytics", "admin", f"/admin/center-analytics/{ids['center_id']}", {}, False),
+    ]
+
+
+def sqlite_scans(cursor, statement, parameters):
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    scans = []
+    for row in cursor.fetchall():
+        match = re.match(r"SCAN (\w+)(?: AS (\w+))?$", row[-1])
+        if match:
+            scans.append(match.group(1))
+    return scans
+
+
+def postgres_scans(cursor, statement, parameters):
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        import json
+
+        plan = json.loads(plan)
+    scans, nodes = [], [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def check(url: str, study_count: int) -> int:
+    url = normalize_database_url(url)
+    print(f"Migrating {url} ...")
+    migrate(url)
+    engine = create_engine(url)
+    print(f"Seeding {study_count} studies ...")
+    ids = seed(engine, study_count)
+
+    ScratchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # TestClient may run each request on a new event loop, so no pooling
+    async_engine = create_async_engine(async_database_url(url), poolclass=pool.NullPool)
+    AsyncScratchSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def scratch_db():
+        db = ScratchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def async_scratch_db():
+        async with AsyncScratchSession() as db:
+            yield db
+
+    app = FastAPI()
+    for router in (studies, admin, audit, imaging, measurements, segmentations):
+        app.include_router(router.router)
+    app.dependency_overrides[get_db] = scratch_db
+    app.dependency_overrides[get_read_db] = scratch_db
+    app.dependency_overrides[get_async_db] = async_scratch_db
+    app.dependency_overrides[get_async_read_db] = async_scratch_db
+    client = TestClient(app, raise_server_exceptions=False)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((current[0], statement, parameters))
+
+    for source in (engine, async_engine.sync_engine):
+        event.listen(source, "before_cursor_execute", capture)
+
+    current = [None]
+    errors = []
+    for label, username, path, params, follow in endpoint_calls(ids):
+        current[0] = label
+        headers = {"Authorization": "Bearer " + create_access_token({"sub": username})}
+        response = client.get(path, params=params, headers=headers)
+        print(f"  {response.status_code} {label}")
+        if response.status_code >= 500:
+            errors.append(label)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if follow and next_cursor:
+            current[0] = f"{label}, next page"
+            client.get(path, params={**params, "cursor": next_cursor}, headers=headers)
+    for source in (engine, async_engine.sync_engine):
+        event.remove(source, "before_cursor_execute", capture)
+
+    explain = sqlite_scans if engine.dialect.name == "sqlite" else postgres_scans
+    failures, seen = [], set()
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for label, statement, parameters in statements:
+            if (statement, label) in seen:
+                continue
+            seen.add((statement, label))
+            flat = " ".join(statement.upper().split())
+            if " WHERE " not in flat and " LIMIT " not in flat:
+                continue
+            for name in explain(cursor, statement, parameters):
+                table = re.sub(r"_\d+$", "", name)
+                if table in LARGE_TABLES:
+                    failures.append((label, table, " ".join(statement.split())))
+    finally:
+        raw.close()
+
+    print(f"\nExplained {len(seen)} statements")
+    for label in errors:
+        print(f"\n✗ {label}: server error, its queries were not all exercised")
+    for label, table, statement in failures:
+        print(f"\n✗ {label}: sequential scan on {table}\n  {statement[:400]}")
+    if failures:
+        print(f"\n{len(failures)} statement(s) scan a large table")
+    if failures or errors:
+        return 1
+    print("✓ No sequential scans on large tables")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--studies", type=int, default=50000, help="Studies to seed")
+    args = parser.parse_args()
+
+    if args.url:
+        sys.exit(check(args.url, args.studies))
+    with tempfile.TemporaryDirectory() as directory:
+        sys.exit(check(f"sqlite:///{os.path.join(directory, 'check.db')}", args.studies))
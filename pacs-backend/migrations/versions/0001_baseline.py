@@ -0,0 +1,358 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+The tables, columns and single-column indexes the application built with
+``Base.metadata.create_all`` before it used migrations, including the
+measurement sync columns of ``annotations``. Databases created that way
+already hold most of it, so every table, column and index is only created
+when missing and ``alembic upgrade head`` works on both empty and existing
+databases. Composite indexes for hot query paths are built by 0002.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+USER_ROLES = (
+    "ADMIN",
+    "DIAGNOSTIC_CENTER_ADMIN",
+    "DOCTOR",
+    "TECHNICIAN",
+    "RADIOLOGIST",
+)
+STUDY_STATUSES = (
+    "QUEUED",
+    "PROCESSING",
+    "UPLOADED",
+    "ASSIGNED",
+    "IN_PROGRESS",
+    "COMPLETED",
+    "REVIEWED",
+)
+
+# (name, table, columns, unique)
+INDEXES = [
+    ("ix_diagnostic_centers_id", "diagnostic_centers", ["id"], False),
+    ("ix_users_id", "users", ["id"], False),
+    ("ix_users_email", "users", ["email"], True),
+    ("ix_users_username", "users", ["username"], True),
+    ("ix_patients_id", "patients", ["id"], False),
+    ("ix_patients_patient_id", "patients", ["patient_id"], True),
+    ("ix_studies_id", "studies", ["id"], False),
+    ("ix_studies_study_uid", "studies", ["study_uid"], True),
+    ("ix_dicom_files_id", "dicom_files", ["id"], False),
+    ("ix_annotations_id", "annotations", ["id"], False),
+    ("ix_segmentations_id", "segmentations", ["id"], False),
+    ("ix_segmentations_study_id", "segmentations", ["study_id"], False),
+    ("ix_segmentation_slices_id", "segmentation_slices", ["id"], False),
+    (
+        "ix_segmentation_slices_segmentation_id",
+        "segmentation_slices",
+        ["segmentation_id"],
+        False,
+    ),
+    ("ix_audit_logs_id", "audit_logs", ["id"], False),
+    ("ix_system_settings_id", "system_settings", ["id"], False),
+    ("ix_deletion_requests_id", "deletion_requests", ["id"], False),
+]
+
+# Columns added to annotations after its first release (measurement sync)
+ANNOTATION_COLUMNS = [
+    ("client_id", sa.String(), {"nullable": True}),
+    ("version", sa.Integer(), {"nullable": False, "server_default": "1"}),
+    ("updated_at", sa.DateTime(timezone=True), {"nullable": True}),
+]
+
+
+def _timestamps():
+    return [
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    ]
+
+
+def _tables():
+    """Table definitions in dependency order"""
+    return [
+        (
+            "diagnostic_centers",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column("name", sa.String(), nullable=False),
+                sa.Column("address", sa.Text()),
+                sa.Column("phone", sa.String()),
+                sa.Column("email", sa.String()),
+                sa.Column("is_active", sa.Boolean()),
+                sa.Column("storage_quota_gb", sa.Integer()),
+                sa.Column("storage_used_gb", sa.Integer()),
+                *_timestamps(),
+            ],
+        ),
+        (
+            "users",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column("email", sa.String(), nullable=False),
+                sa.Column("username", sa.String(), nullable=False),
+                sa.Column("full_name", sa.String(), nullable=False),
+                sa.Column("hashed_password", sa.String(), nullable=False),
+                sa.Column("role", sa.Enum(*USER_ROLES, name="userrole"), nullable=False),
+                sa.Column("is_active", sa.Boolean()),
+                sa.Column(
+                    "diagnostic_center_id",
+                    sa.Integer(),
+                    sa.ForeignKey("diagnostic_centers.id"),
+                ),
+                sa.Column("mfa_enabled", sa.Boolean()),
+                sa.Column("mfa_secret", sa.String()),
+                sa.Column("mfa_backup_codes", sa.Text()),
+                sa.Column("last_login", sa.DateTime(timezone=True)),
+                sa.Column("failed_login_attempts", sa.Integer()),
+                sa.Column("locked_until", sa.DateTime(timezone=True)),
+                sa.Column("medical_license_number", sa.String()),
+                sa.Column("board_certification", sa.String()),
+                sa.Column("certification_expiry", sa.DateTime()),
+                *_timestamps(),
+            ],
+        ),
+        (
+            "patients",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column("patient_id", sa.String(), nullable=False),
+                sa.Column("first_name", sa.String(), nullable=False),
+                sa.Column("last_name", sa.String(), nullable=False),
+                sa.Column("date_of_birth", sa.DateTime()),
+                sa.Column("gender", sa.String()),
+                sa.Column("phone", sa.String()),
+                sa.Column("email", sa.String()),
+                sa.Column("address", sa.Text()),
+                *_timestamps(),
+            ],
+        ),
+        (
+            "studies",
+            [
+                sa.Column("id", sa.String(8), primary_key=True),
+                sa.Column("study_uid", sa.String(), nullable=False),
+                sa.Column(
+                    "patient_id",
+                    sa.Integer(),
+                    sa.ForeignKey("patients.id"),
+                    nullable=False,
+                ),
+                sa.Column(
+                    "diagnostic_center_id",
+                    sa.Integer(),
+                    sa.ForeignKey("diagnostic_centers.id"),
+                    nullable=False,
+                ),
+                sa.Column(
+                    "uploaded_by_id",
+                    sa.Integer(),
+                    sa.ForeignKey("users.id"),
+                    nullable=False,
+                ),
+                sa.Column("assigned_doctor_id", sa.Integer(), sa.ForeignKey("users.id")),
+                sa.Column("radiologist_id", sa.Integer(), sa.ForeignKey("users.id")),
+                sa.Column("study_date", sa.DateTime()),
+                sa.Column("modality", sa.String()),
+                sa.Column("body_part", sa.String()),
+                sa.Column("study_description", sa.Text()),
+                sa.Column("priority", sa.String()),
+                sa.Column("status", sa.Enum(*STUDY_STATUSES, name="studystatus")),
+                sa.Column("ai_report", sa.Text()),
+                sa.Column("doctor_report", sa.Text()),
+                sa.Column("radiologist_report", sa.Text()),
+                sa.Column("final_report", sa.Text()),
+                *_timestamps(),
+            ],
+        ),
+        (
+            "dicom_files",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column(
+                    "study_id",
+                    sa.String(8),
+                    sa.ForeignKey("studies.id"),
+                    nullable=False,
+                ),
+                sa.Column("series_uid", sa.String(), nullable=False),
+                sa.Column("instance_uid", sa.String(), nullable=False, unique=True),
+                sa.Column("file_path", sa.String(), nullable=False),
+                sa.Column("file_size", sa.Integer()),
+                sa.Column("slice_number", sa.Integer()),
+                sa.Column("patient_name", sa.String()),
+                sa.Column("patient_id_dicom", sa.String()),
+                sa.Column("study_date_dicom", sa.String()),
+                sa.Column("modality_dicom", sa.String()),
+                sa.Column("body_part_dicom", sa.String()),
+                sa.Column(
+                    "created_at",
+                    sa.DateTime(timezone=True),
+                    server_default=sa.func.now(),
+                ),
+            ],
+        ),
+        (
+            "annotations",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column(
+                    "study_id",
+                    sa.String(8),
+                    sa.ForeignKey("studies.id"),
+                    nullable=False,
+                ),
+                sa.Column(
+                    "user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False
+                ),
+                sa.Column("annotation_type", sa.String()),
+                sa.Column("annotation_data", sa.Text()),
+                sa.Column("notes", sa.Text()),
+                sa.Column("client_id", sa.String()),
+                sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+                *_timestamps(),
+            ],
+        ),
+        (
+            "segmentations",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column(
+                    "study_id",
+                    sa.String(8),
+                    sa.ForeignKey("studies.id"),
+                    nullable=False,
+                ),
+                sa.Column("series_uid", sa.String(), nullable=False),
+                sa.Column(
+                    "created_by_id",
+                    sa.Integer(),
+                    sa.ForeignKey("users.id"),
+                    nullable=False,
+                ),
+                sa.Column("label", sa.String(), nullable=False),
+                sa.Column("description", sa.Text()),
+                sa.Column("segments", sa.Text()),
+                sa.Column("rows", sa.Integer(), nullable=False),
+                sa.Column("columns", sa.Integer(), nullable=False),
+                sa.Column("slice_count", sa.Integer(), nullable=False),
+                sa.Column("instance_uids", sa.Text()),
+                sa.Column("version", sa.Integer(), nullable=False),
+                *_timestamps(),
+            ],
+        ),
+        (
+            "segmentation_slices",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column(
+                    "segmentation_id",
+                    sa.Integer(),
+                    sa.ForeignKey("segmentations.id"),
+                    nullable=False,
+                ),
+                sa.Column("slice_index", sa.Integer(), nullable=False),
+                sa.Column("data", sa.LargeBinary(), nullable=False),
+                sa.UniqueConstraint("segmentation_id", "slice_index"),
+            ],
+        ),
+        (
+            "audit_logs",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+                sa.Column("action", sa.String(), nullable=False),
+                sa.Column("resource_type", sa.String()),
+                sa.Column("resource_id", sa.String()),
+                sa.Column("ip_address", sa.String()),
+                sa.Column("user_agent", sa.String()),
+                sa.Column("details", sa.Text()),
+                sa.Column(
+                    "timestamp",
+                    sa.DateTime(timezone=True),
+                    server_default=sa.func.now(),
+                ),
+            ],
+        ),
+        (
+            "system_settings",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column("auto_backup", sa.Boolean()),
+                sa.Column("email_notifications", sa.Boolean()),
+                sa.Column("maintenance_mode", sa.Boolean()),
+                sa.Column("max_upload_size", sa.Integer()),
+                sa.Column("session_timeout", sa.Integer()),
+                sa.Column("audit_log_retention", sa.Integer()),
+                sa.Column("updated_at", sa.DateTime(timezone=True)),
+            ],
+        ),
+        (
+            "deletion_requests",
+            [
+                sa.Column("id", sa.Integer(), primary_key=True),
+                sa.Column(
+                    "study_id",
+                    sa.String(8),
+                    sa.ForeignKey("studies.id"),
+                    nullable=False,
+                ),
+                sa.Column(
+                    "requested_by_id",
+                    sa.Integer(),
+                    sa.ForeignKey("users.id"),
+                    nullable=False,
+                ),
+                sa.Column("reason", sa.Text(), nullable=False),
+                sa.Column("status", sa.String()),
+                sa.Column("approved_by_id", sa.Integer(), sa.ForeignKey("users.id")),
+                sa.Column("approved_at", sa.DateTime(timezone=True)),
+                sa.Column(
+                    "created_at",
+                    sa.DateTime(timezone=True),
+                    server_default=sa.func.now(),
+                ),
+            ],
+        ),
+    ]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+
+    for name, columns in _tables():
+        if name not in existing:
+            op.create_table(name, *columns)
+
+    if "annotations" in existing:
+        present = {column["name"] for column in inspector.get_columns("annotations")}
+        missing = [c for c in ANNOTATION_COLUMNS if c[0] not in present]
+        if missing:
+            with op.batch_alter_table("annotations") as batch:
+                for name, type_, options in missing:
+                    batch.add_column(sa.Column(name, type_, **options))
+
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+
+
+def downgrade():
+    for name, _ in reversed(_tables()):
+        op.drop_table(name)
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        sa.Enum(name="studystatus").drop(bind, checkfirst=True)
+        sa.Enum(name="userrole").drop(bind, checkfirst=True)
@@ -0,0 +1,93 @@
+"""Indexes for hot query paths
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Composite indexes matching the router queries: newest-first study lists,
+overall and per status, uploader, center and assigned doctor; instance
+lookups by study and series in slice order; measurements by study and user
+or client id; newest-first audit log and deletion request views. On
+PostgreSQL they are built with CREATE INDEX CONCURRENTLY outside the
+migration transaction, so large tables stay writable while the migration
+runs. An interrupted concurrent build leaves an INVALID index behind; drop
+it before running the upgrade again.
+"""
+
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns)
+INDEXES = [
+    ("ix_studies_created", "studies", ["created_at", "id"]),
+    ("ix_studies_status_created", "studies", ["status", "created_at", "id"]),
+    (
+        "ix_studies_uploader_created",
+        "studies",
+        ["uploaded_by_id", "created_at", "id"],
+    ),
+    (
+        "ix_studies_center_created",
+        "studies",
+        ["diagnostic_center_id", "created_at", "id"],
+    ),
+    (
+        "ix_studies_doctor_created",
+        "studies",
+        ["assigned_doctor_id", "created_at", "id"],
+    ),
+    (
+        "ix_dicom_files_study_series",
+        "dicom_files",
+        ["study_id", "series_uid", "slice_number"],
+    ),
+    ("ix_dicom_files_created", "dicom_files", ["created_at"]),
+    ("ix_annotations_study_user", "annotations", ["study_id", "user_id"]),
+    ("ix_annotations_study_client", "annotations", ["study_id", "client_id"]),
+    ("ix_audit_logs_timestamp", "audit_logs", ["timestamp"]),
+    ("ix_audit_logs_action_timestamp", "audit_logs", ["action", "timestamp"]),
+    ("ix_audit_logs_user_timestamp", "audit_logs", ["user_id", "timestamp"]),
+    ("ix_deletion_requests_created", "deletion_requests", ["created_at", "id"]),
+    (
+        "ix_deletion_requests_status_created",
+        "deletion_requests",
+        ["status", "created_at", "id"],
+    ),
+]
+
+
+def _concurrently() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def upgrade():
+    if _concurrently():
+        # CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(
+                    name,
+                    table,
+                    columns,
+                    postgresql_concurrently=True,
+                    if_not_exists=True,
+                )
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    if _concurrently():
+        with op.get_context().autocommit_block():
+            for name, table, _ in INDEXES:
+                op.drop_index(
+                    name, table_name=table, postgresql_concurrently=True, if_exists=True
+                )
+    else:
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,235 @@
+"""Full-text search index over studies
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+One search document per study (description, reports, patient name), kept
+current by triggers on studies and patients and filled for existing studies.
+PostgreSQL stores a weighted tsvector under a GIN index; SQLite uses an FTS5
+index over an external content table. See app/search.py.
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    """
+    CREATE TABLE IF NOT EXISTS study_search_documents (
+        id INTEGER PRIMARY KEY,
+        study_id VARCHAR(8) NOT NULL UNIQUE,
+        description TEXT,
+        reports TEXT,
+        patient_name TEXT
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS study_search USING fts5(
+        description, reports, patient_name,
+        content='study_search_documents', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS study_search_documents_ai
+    AFTER INSERT ON study_search_documents BEGIN
+        INSERT INTO study_search (rowid, description, reports, patient_name)
+        VALUES (new.id, new.description, new.reports, new.patient_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS study_search_documents_ad
+    AFTER DELETE ON study_search_documents BEGIN
+        INSERT INTO study_search (study_search, rowid, description, reports, patient_name)
+        VALUES ('delete', old.id, old.description, old.reports, old.patient_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS study_search_documents_au
+    AFTER UPDATE ON study_search_documents BEGIN
+        INSERT INTO study_search (study_search, rowid, description, reports, patient_name)
+        VALUES ('delete', old.id, old.description, old.reports, old.patient_name);
+        INSERT INTO study_search (rowid, description, reports, patient_name)
+        VALUES (new.id, new.description, new.reports, new.patient_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS studies_search_ai
+    AFTER INSERT ON studies BEGIN
+        INSERT INTO study_search_documents (study_id, description, reports, patient_name)
+        VALUES (
+            new.id,
+            new.study_description,
+            trim(coalesce(new.doctor_report, '') || ' ' || coalesce(new.radiologist_report, '')
+                 || ' ' || coalesce(new.final_report, '')),
+            (SELECT first_name || ' ' || last_name FROM patients WHERE id = new.patient_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS studies_search_au
+    AFTER UPDATE OF study_description, doctor_report, radiologist_report, final_report,
+        patient_id ON studies BEGIN
+        UPDATE study_search_documents SET
+            description = new.study_description,
+            reports = trim(coalesce(new.doctor_report, '') || ' '
+                           || coalesce(new.radiologist_report, '') || ' '
+                           || coalesce(new.final_report, '')),
+            patient_name = (
+                SELECT first_name || ' ' || last_name FROM patients WHERE id = new.patient_id
+            )
+        WHERE study_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS studies_search_ad
+    AFTER DELETE ON studies BEGIN
+        DELETE FROM study_search_documents WHERE study_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patients_search_au
+    AFTER UPDATE OF first_name, last_name ON patients BEGIN
+        UPDATE study_search_documents
+        SET patient_name = new.first_name || ' ' || new.last_name
+        WHERE study_id IN (SELECT id FROM studies WHERE patient_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO study_search_documents (study_id, description, reports, patient_name)
+    SELECT
+        s.id,
+        s.study_description,
+        trim(coalesce(s.doctor_report, '') || ' ' || coalesce(s.radiologist_report, '')
+             || ' ' || coalesce(s.final_report, '')),
+        p.first_name || ' ' || p.last_name
+    FROM studies s
+    LEFT JOIN patients p ON p.id = s.patient_id
+    WHERE NOT EXISTS (SELECT 1 FROM study_search_documents d WHERE d.study_id = s.id)
+    """,
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS patients_search_au",
+    "DROP TRIGGER IF EXISTS studies_search_ad",
+    "DROP TRIGGER IF EXISTS studies_search_au",
+    "DROP TRIGGER IF EXISTS studies_search_ai",
+    "DROP TABLE IF EXISTS study_search",
+    "DROP TABLE IF EXISTS study_search_documents",
+]
+
+POSTGRES_UPGRADE = [
+    """
+    CREATE TABLE IF NOT EXISTS study_search_documents (
+        study_id VARCHAR(8) PRIMARY KEY REFERENCES studies (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_study_search_documents_document
+    ON study_search_documents USING GIN (document)
+    """,
+    """
+    CREATE OR REPLACE FUNCTION study_search_document(
+        description text, doctor_report text, radiologist_report text,
+        final_report text, patient_name text
+    ) RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', coalesce(patient_name, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            || setweight(
+                to_tsvector('english', concat_ws(' ', doctor_report, radiologist_report, final_report)),
+                'C'
+            )
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION studies_search_refresh() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO study_search_documents (study_id, document)
+        VALUES (
+            NEW.id,
+            study_search_document(
+                NEW.study_description, NEW.doctor_report, NEW.radiologist_report,
+                NEW.final_report,
+                (SELECT first_name || ' ' || last_name FROM patients WHERE id = NEW.patient_id)
+            )
+        )
+        ON CONFLICT (study_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION patients_search_refresh() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE study_search_documents d
+        SET document = study_search_document(
+            s.study_description, s.doctor_report, s.radiologist_report, s.final_report,
+            NEW.first_name || ' ' || NEW.last_name
+        )
+        FROM studies s
+        WHERE s.patient_id = NEW.id AND d.study_id = s.id;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS studies_search_refresh ON studies",
+    """
+    CREATE TRIGGER studies_search_refresh
+    AFTER INSERT OR UPDATE OF study_description, doctor_report, radiologist_report,
+        final_report, patient_id ON studies
+    FOR EACH ROW EXECUTE FUNCTION studies_search_refresh()
+    """,
+    "DROP TRIGGER IF EXISTS patients_search_refresh ON patients",
+    """
+    CREATE TRIGGER patients_search_refresh
+    AFTER UPDATE OF first_name, last_name ON patients
+    FOR EACH ROW EXECUTE FUNCTION patients_search_refresh()
+    """,
+    """
+    INSERT INTO study_search_documents (study_id, document)
+    SELECT
+        s.id,
+        study_search_document(
+            s.study_description, s.doctor_report, s.radiologist_report, s.final_report,
+            p.first_name || ' ' || p.last_name
+        )
+    FROM studies s
+    LEFT JOIN patients p ON p.id = s.patient_id
+    ON CONFLICT (study_id) DO NOTHING
+    """,
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS patients_search_refresh ON patients",
+    "DROP TRIGGER IF EXISTS studies_search_refresh ON studies",
+    "DROP FUNCTION IF EXISTS patients_search_refresh()",
+    "DROP FUNCTION IF EXISTS studies_search_refresh()",
+    "DROP TABLE IF EXISTS study_search_documents",
+    "DROP FUNCTION IF EXISTS study_search_document(text, text, text, text, text)",
+]
+
+
+def _statements(sqlite, postgres):
+    dialect = op.get_context().dialect.name
+    if dialect == "postgresql":
+        return postgres
+    if dialect == "sqlite":
+        return sqlite
+    raise NotImplementedError(f"No search index for {dialect}")
+
+
+def upgrade():
+    for statement in _statements(SQLITE_UPGRADE, POSTGRES_UPGRADE):
+        op.execute(statement)
+
+
+def downgrade():
+    for statement in _statements(SQLITE_DOWNGRADE, POSTGRES_DOWNGRADE):
+        op.execute(statement)
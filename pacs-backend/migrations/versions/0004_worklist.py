@@ -0,0 +1,127 @@
+"""Denormalized worklist table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+One row per study with the patient, center, technician and radiologist
+names, indexed for most-urgent-first reads overall, per center and per
+radiologist. app/worklist.py keeps it current; existing studies are copied
+in here.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+STUDY_STATUSES = (
+    "QUEUED",
+    "PROCESSING",
+    "UPLOADED",
+    "ASSIGNED",
+    "IN_PROGRESS",
+    "COMPLETED",
+    "REVIEWED",
+)
+
+# (name, columns, PostgreSQL INCLUDE columns)
+INDEXES = [
+    (
+        "ix_worklist_status_rank",
+        ["status", "priority_rank", "created_at", "id"],
+        ["patient_name", "center_name", "technician_name", "modality"],
+    ),
+    (
+        "ix_worklist_center_status_rank",
+        ["diagnostic_center_id", "status", "priority_rank", "created_at", "id"],
+        [],
+    ),
+    (
+        "ix_worklist_radiologist_status_rank",
+        ["radiologist_id", "status", "priority_rank", "created_at", "id"],
+        [],
+    ),
+]
+
+BACKFILL = """
+INSERT INTO worklist (
+    id, study_uid, status, priority, priority_rank, modality, body_part,
+    study_description, patient_mrn, patient_name, diagnostic_center_id,
+    center_name, technician_id, technician_name, radiologist_id,
+    radiologist_name, assigned_doctor_id, created_at, updated_at
+)
+SELECT
+    s.id, s.study_uid, s.status, s.priority,
+    CASE lower(s.priority)
+        WHEN 'stat' THEN 0 WHEN 'urgent' THEN 1 WHEN 'high' THEN 2
+        WHEN 'low' THEN 4 ELSE 3
+    END,
+    s.modality, s.body_part, s.study_description,
+    p.patient_id, p.first_name || ' ' || p.last_name,
+    s.diagnostic_center_id, c.name,
+    s.uploaded_by_id, t.full_name,
+    s.radiologist_id, r.full_name,
+    s.assigned_doctor_id, s.created_at, s.updated_at
+FROM studies s
+LEFT JOIN patients p ON p.id = s.patient_id
+LEFT JOIN diagnostic_centers c ON c.id = s.diagnostic_center_id
+LEFT JOIN users t ON t.id = s.uploaded_by_id
+LEFT JOIN users r ON r.id = s.radiologist_id
+WHERE NOT EXISTS (SELECT 1 FROM worklist w WHERE w.id = s.id)
+"""
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("worklist"):
+        status = sa.Enum(*STUDY_STATUSES, name="studystatus").with_variant(
+            postgresql.ENUM(*STUDY_STATUSES, name="studystatus", create_type=False),
+            "postgresql",
+        )
+        op.create_table(
+            "worklist",
+            sa.Column(
+                "id",
+                sa.String(8),
+                sa.ForeignKey("studies.id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column("study_uid", sa.String(), nullable=False),
+            sa.Column("status", status),
+            sa.Column("priority", sa.String()),
+            sa.Column("priority_rank", sa.Integer(), nullable=False),
+            sa.Column("modality", sa.String()),
+            sa.Column("body_part", sa.String()),
+            sa.Column("study_description", sa.Text()),
+            sa.Column("patient_mrn", sa.String()),
+            sa.Column("patient_name", sa.String()),
+            sa.Column("diagnostic_center_id", sa.Integer()),
+            sa.Column("center_name", sa.String()),
+            sa.Column("technician_id", sa.Integer()),
+            sa.Column("technician_name", sa.String()),
+            sa.Column("radiologist_id", sa.Integer()),
+            sa.Column("radiologist_name", sa.String()),
+            sa.Column("assigned_doctor_id", sa.Integer()),
+            sa.Column("created_at", sa.DateTime(timezone=True)),
+            sa.Column("updated_at", sa.DateTime(timezone=True)),
+        )
+    for name, columns, include in INDEXES:
+        op.create_index(
+            name,
+            "worklist",
+            columns,
+            postgresql_include=include,
+            if_not_exists=True,
+        )
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    for name, _, _ in INDEXES:
+        op.drop_index(name, table_name="worklist", if_exists=True)
+    op.drop_table("worklist")
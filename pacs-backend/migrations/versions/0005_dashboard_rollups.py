@@ -0,0 +1,132 @@
+"""Dashboard rollup tables
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Counters read by the admin monitoring and center analytics endpoints:
+studies per center, modality and status; studies and files per center, per
+center and UTC hour, and studies per uploader. app/rollups.py keeps them
+current; they are counted here from the existing studies and files.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+STUDY_STATUSES = (
+    "QUEUED",
+    "PROCESSING",
+    "UPLOADED",
+    "ASSIGNED",
+    "IN_PROGRESS",
+    "COMPLETED",
+    "REVIEWED",
+)
+
+# Hour buckets in the form app/rollups.py writes them
+HOUR = {
+    "sqlite": "strftime('%Y-%m-%d %H:00:00.000000', {})",
+    "postgresql": "date_trunc('hour', {} AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'",
+}
+
+BACKFILL = [
+    """
+    INSERT INTO study_rollups (diagnostic_center_id, modality, status, studies)
+    SELECT diagnostic_center_id, coalesce(modality, ''), status, count(*)
+    FROM studies
+    WHERE status IS NOT NULL
+    GROUP BY diagnostic_center_id, coalesce(modality, ''), status
+    """,
+    """
+    INSERT INTO uploader_rollups (user_id, studies)
+    SELECT uploaded_by_id, count(*) FROM studies GROUP BY uploaded_by_id
+    """,
+    """
+    INSERT INTO center_rollups (diagnostic_center_id, studies, dicom_files)
+    SELECT center, sum(studies), sum(dicom_files) FROM (
+        SELECT diagnostic_center_id AS center, 1 AS studies, 0 AS dicom_files FROM studies
+        UNION ALL
+        SELECT s.diagnostic_center_id, 0, 1
+        FROM dicom_files f JOIN studies s ON s.id = f.study_id
+    ) items
+    GROUP BY center
+    """,
+    """
+    INSERT INTO activity_rollups (hour, diagnostic_center_id, studies, dicom_files)
+    SELECT hour, center, sum(studies), sum(dicom_files) FROM (
+        SELECT {study_hour} AS hour, diagnostic_center_id AS center,
+            1 AS studies, 0 AS dicom_files
+        FROM studies
+        UNION ALL
+        SELECT {file_hour}, s.diagnostic_center_id, 0, 1
+        FROM dicom_files f JOIN studies s ON s.id = f.study_id
+    ) items
+    WHERE hour IS NOT NULL
+    GROUP BY hour, center
+    """,
+]
+
+TABLES = ["activity_rollups", "center_rollups", "study_rollups", "uploader_rollups"]
+
+
+def _counter(name):
+    return sa.Column(name, sa.Integer(), nullable=False, server_default="0")
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    status = sa.Enum(*STUDY_STATUSES, name="studystatus").with_variant(
+        postgresql.ENUM(*STUDY_STATUSES, name="studystatus", create_type=False),
+        "postgresql",
+    )
+    if not inspector.has_table("study_rollups"):
+        op.create_table(
+            "study_rollups",
+            sa.Column("diagnostic_center_id", sa.Integer(), primary_key=True),
+            sa.Column("modality", sa.String(), primary_key=True),
+            sa.Column("status", status, primary_key=True),
+            _counter("studies"),
+        )
+    if not inspector.has_table("center_rollups"):
+        op.create_table(
+            "center_rollups",
+            sa.Column("diagnostic_center_id", sa.Integer(), primary_key=True),
+            _counter("studies"),
+            _counter("dicom_files"),
+        )
+    if not inspector.has_table("activity_rollups"):
+        op.create_table(
+            "activity_rollups",
+            sa.Column("hour", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("diagnostic_center_id", sa.Integer(), primary_key=True),
+            _counter("studies"),
+            _counter("dicom_files"),
+        )
+    if not inspector.has_table("uploader_rollups"):
+        op.create_table(
+            "uploader_rollups",
+            sa.Column("user_id", sa.Integer(), primary_key=True),
+            _counter("studies"),
+        )
+
+    hour = HOUR[bind.dialect.name]
+    for table in TABLES:
+        op.execute(f"DELETE FROM {table}")
+    for statement in BACKFILL:
+        op.execute(
+            statement.format(
+                study_hour=hour.format("created_at"), file_hour=hour.format("f.created_at")
+            )
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_table(table)
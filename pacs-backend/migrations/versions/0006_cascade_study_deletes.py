@@ -0,0 +1,63 @@
+"""Cascade study deletes to annotations and segmentations
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+Deleting a study removes its annotations and segmentations, and deleting a
+segmentation its slices, in the database as well as through the ORM
+relationships. The foreign keys are recreated with ON DELETE CASCADE;
+SQLite reflects them unnamed, so batch mode names them with the convention
+below to drop them.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table)
+FOREIGN_KEYS = [
+    ("annotations", "study_id", "studies"),
+    ("segmentations", "study_id", "studies"),
+    ("segmentation_slices", "segmentation_id", "segmentations"),
+]
+
+NAMING_CONVENTION = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"
+}
+
+
+def _existing_name(table, column, default):
+    """Name of the foreign key on ``table.column``, None when there is none"""
+    for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if foreign_key["constrained_columns"] == [column]:
+            return foreign_key["name"] or default
+    return None
+
+
+def _recreate(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        default = f"fk_{table}_{column}_{referred}"
+        name = _existing_name(table, column, default)
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            if name is not None:
+                batch.drop_constraint(name, type_="foreignkey")
+            batch.create_foreign_key(
+                name or default,
+                referred,
+                [column],
+                ["id"],
+                ondelete=ondelete,
+            )
+
+
+def upgrade():
+    _recreate("CASCADE")
+
+
+def downgrade():
+    _recreate(None)
@@ -0,0 +1,66 @@
+"""Unique measurement client ids per study
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Measurement sync creates are idempotent per client id; a unique index on
+(study_id, client_id) keeps two concurrent retries of the same create from
+both inserting. Duplicates left by earlier races are removed first, keeping
+the oldest row. On PostgreSQL the index is rebuilt CONCURRENTLY, as in 0002.
+"""
+
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+NAME = "ix_annotations_study_client"
+COLUMNS = ["study_id", "client_id"]
+
+DEDUPLICATE = """
+    DELETE FROM annotations
+    WHERE client_id IS NOT NULL
+      AND id NOT IN (
+        SELECT min(id) FROM annotations
+        WHERE client_id IS NOT NULL
+        GROUP BY study_id, client_id
+      )
+"""
+
+
+def _concurrently() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def _rebuild(unique: bool):
+    if _concurrently():
+        # CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            op.drop_index(
+                NAME,
+                table_name="annotations",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+            op.create_index(
+                NAME,
+                "annotations",
+                COLUMNS,
+                unique=unique,
+                postgresql_concurrently=True,
+            )
+    else:
+        op.drop_index(NAME, table_name="annotations", if_exists=True)
+        op.create_index(NAME, "annotations", COLUMNS, unique=unique)
+
+
+def upgrade():
+    op.execute(DEDUPLICATE)
+    _rebuild(unique=True)
+
+
+def downgrade():
+    _rebuild(unique=False)
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+
+# The application's engine is built at import; keep it off the working database
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pacs.db')}"
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, DiagnosticCenter, DicomFile, Patient, Study, User, UserRole
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def people(db):
+    """Two centers, a patient, a technician and a radiologist"""
+    centers = [DiagnosticCenter(name="North"), DiagnosticCenter(name="South")]
+    patient = Patient(
+        patient_id="MRN1", first_name="Ada", last_name="Lovelace", gender="F"
+    )
+    technician = User(
+        username="tech",
+        email="tech@example.com",
+        hashed_password="x",
+        full_name="Tess Tech",
+        role=UserRole.TECHNICIAN,
+        diagnostic_center=centers[0],
+    )
+    radiologist = User(
+        username="rad",
+        email="rad@example.com",
+        hashed_password="x",
+        full_name="Ray Diologist",
+        role=UserRole.RADIOLOGIST,
+    )
+    db.add_all([*centers, patient, technician, radiologist])
+    db.commit()
+    return {
+        "centers": centers,
+        "patient": patient,
+        "technician": technician,
+        "radiologist": radiologist,
+    }
+
+
+@pytest.fixture
+def add_file(db):
+    def add(study, number):
+        dicom_file = DicomFile(
+            study=study,
+            series_uid=f"{study.study_uid}.1",
+            instance_uid=f"{study.study_uid}.1.{number}",
+            file_path=f"uploads/{study.id}/{number}.dcm",
+            slice_number=number,
+        )
+        db.add(dicom_file)
+        return dicom_file
+
+    return add
+
+
+@pytest.fixture
+def add_study(db, people, add_file):
+    """A CT study of the patient, uploaded by the technician, with ``files`` instances"""
+
+    def add(study_id, files=0, center=0, **fields):
+        study = Study(
+            id=study_id,
+            study_uid=f"1.2.3.{study_id}",
+            patient=people["patient"],
+            diagnostic_center=people["centers"][center],
+            uploaded_by=people["technician"],
+            modality="CT",
+            **fields,
+        )
+        db.add(study)
+        for number in range(files):
+            add_file(study, number)
+        return study
+
+    return add
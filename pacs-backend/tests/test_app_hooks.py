@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_keeps_worklist_and_rollups_current(tmp_path):
+    """A fresh API process registers the flush hooks before its first write"""
+    script = textwrap.dedent(
+        """
+        import app.main
+        from sqlalchemy import func, select
+        from app.database import (
+            Base, CenterRollup, DiagnosticCenter, Patient, SessionLocal, Study,
+            User, UserRole, WorklistEntry, engine,
+        )
+
+        Base.metadata.create_all(engine)
+        db = SessionLocal()
+        center = DiagnosticCenter(name="North")
+        technician = User(
+            username="tech", email="tech@example.com", hashed_password="x",
+            full_name="Tess Tech", role=UserRole.TECHNICIAN,
+        )
+        patient = Patient(patient_id="MRN1", first_name="Ada", last_name="Lovelace")
+        db.add(Study(
+            id="S1", study_uid="1.2.3", patient=patient, diagnostic_center=center,
+            uploaded_by=technician,
+        ))
+        db.commit()
+        print(
+            db.scalar(select(func.count()).select_from(WorklistEntry)),
+            db.scalar(select(func.sum(CenterRollup.studies))),
+        )
+        """
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=tmp_path,
+        env={
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR,
+            "DATABASE_URL": f"sqlite:///{tmp_path / 'pacs.db'}",
+        },
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-2:] == ["1", "1"]
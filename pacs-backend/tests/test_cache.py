@@ -0,0 +1,25 @@
+import os
+
+from app.cache import HotCache, MemoryCache, TieredCache
+
+
+def test_discard_drops_both_tiers_and_variants(tmp_path):
+    source = tmp_path / "study" / "1.dcm"
+    source.parent.mkdir()
+    source.write_bytes(b"dicom")
+    other = tmp_path / "study" / "2.dcm"
+    other.write_bytes(b"other")
+
+    disk = HotCache(str(tmp_path / "hot"), 1024**2)
+    cache = TieredCache(MemoryCache(1024, 1024), disk)
+    assert cache.get(str(source)) == b"dicom"
+    disk.warm(str(source))
+    disk.put(str(source), b"transcoded", variant="1.2.840.10008.1.2.4.80")
+    disk.warm(str(other))
+
+    cache.discard(str(source))
+
+    assert cache.memory.get(str(source), (5, os.stat(source).st_mtime)) is None
+    assert disk.lookup(str(source)) is None
+    assert disk.lookup(str(source), variant="1.2.840.10008.1.2.4.80") is None
+    assert disk.lookup(str(other)) is not None
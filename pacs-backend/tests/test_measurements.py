@@ -0,0 +1,59 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Annotation
+from app.routers.measurements import _commit_edit, _insert_once, _touch
+
+
+@pytest.fixture
+def other(engine):
+    """A second session, standing in for a concurrent request"""
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+def measurement(study, user, client_id=None):
+    return Annotation(
+        study_id=study.id,
+        user_id=user.id,
+        annotation_type="measurement",
+        annotation_data="{}",
+        client_id=client_id,
+        version=1,
+    )
+
+
+def test_concurrent_edit_is_a_conflict(db, other, people, add_study):
+    study = add_study("S1")
+    db.add(measurement(study, people["radiologist"]))
+    db.commit()
+    mine = db.scalars(select(Annotation)).one()
+    theirs = other.scalars(select(Annotation)).one()
+
+    theirs.notes = "theirs"
+    _touch(theirs)
+    other.commit()
+
+    mine.notes = "mine"
+    _touch(mine)
+    with pytest.raises(HTTPException) as error:
+        _commit_edit(db)
+    assert error.value.status_code == 409
+    assert db.scalars(select(Annotation.notes)).one() == "theirs"
+
+
+def test_racing_create_returns_the_first_row(db, other, people, add_study):
+    study = add_study("S1")
+    db.commit()
+    first = measurement(study, people["radiologist"], client_id="c1")
+    other.add(first)
+    other.commit()
+
+    second = _insert_once(db, measurement(study, people["radiologist"], client_id="c1"))
+    db.commit()
+
+    assert second.id == first.id
+    assert db.scalar(select(func.count()).select_from(Annotation)) == 1
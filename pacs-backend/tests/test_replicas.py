@@ -0,0 +1,50 @@
+import time
+
+import redis
+
+from app.replicas import ReplicaRouter
+
+
+class SharedStore:
+    """The few Redis commands the router uses, held in memory"""
+
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, px):
+        self.keys[key] = time.monotonic() + px / 1000
+
+    def exists(self, key):
+        return int(self.keys.get(key, 0) > time.monotonic())
+
+
+class DownStore:
+    def set(self, key, value, px):
+        raise redis.ConnectionError("down")
+
+    def exists(self, key):
+        raise redis.ConnectionError("down")
+
+
+def router(tmp_path, store):
+    router = ReplicaRouter([f"sqlite:///{tmp_path / 'replica.db'}"], store=store)
+    router.replicas[0].lag = 0
+    return router
+
+
+def test_writes_are_seen_by_other_processes(tmp_path):
+    store = SharedStore()
+    writer, reader = router(tmp_path, store), router(tmp_path, store)
+    assert reader.choose("rad") is reader.replicas[0]
+
+    writer.record_write("rad")
+
+    assert reader.choose("rad") is None
+    assert reader.choose("tech") is reader.replicas[0]
+
+
+def test_unreachable_store_reads_from_primary(tmp_path):
+    reader = router(tmp_path, DownStore())
+    reader.record_write("rad")
+    assert reader.choose("rad") is None
+    assert reader.choose(None) is reader.replicas[0]
@@ -0,0 +1,70 @@
+from sqlalchemy import select
+
+from app.database import DicomFile, StudyStatus
+from app.rollups import ROLLUPS, reconcile_rollups
+
+
+def counted(db):
+    """Rollup rows with a non-zero counter (decrements leave zero rows behind)"""
+    rows = {}
+    for model in ROLLUPS:
+        table = model.__table__
+        counters = [c.name for c in table.columns if not c.primary_key]
+        rows[table.name] = sorted(
+            tuple(row)
+            for row in db.execute(select(table))
+            if any(row._mapping[name] for name in counters)
+        )
+    return rows
+
+
+def assert_reconciled(db):
+    incremental = counted(db)
+    reconcile_rollups(db.connection())
+    assert incremental == counted(db)
+    db.rollback()
+
+
+def test_counts_follow_study_and_file_writes(db, add_study, add_file):
+    first = add_study("S1", files=3)
+    second = add_study("S2", files=2, center=1, status=StudyStatus.QUEUED)
+    db.commit()
+    assert_reconciled(db)
+
+    first.status = StudyStatus.COMPLETED
+    second.modality = "MR"
+    db.commit()
+    assert_reconciled(db)
+
+    add_file(second, 9)
+    db.delete(db.scalars(select(DicomFile).where(DicomFile.study_id == "S1")).first())
+    db.commit()
+    assert_reconciled(db)
+
+
+def test_refiled_study_moves_its_files(db, people, add_study, add_file):
+    study = add_study("S1", files=3)
+    db.commit()
+
+    study.diagnostic_center = people["centers"][1]
+    db.commit()
+    assert_reconciled(db)
+
+    # Re-filed along with file changes in the same flush
+    study.diagnostic_center = people["centers"][0]
+    add_file(study, 7)
+    db.delete(study.dicom_files[0])
+    db.commit()
+    assert_reconciled(db)
+
+
+def test_deleted_study_and_files_are_uncounted(db, add_study):
+    add_study("S1", files=2)
+    doomed = add_study("S2", files=3)
+    db.commit()
+
+    for dicom_file in doomed.dicom_files:
+        db.delete(dicom_file)
+    db.delete(doomed)
+    db.commit()
+    assert_reconciled(db)
@@ -0,0 +1,160 @@
+import json
+import os
+
+import numpy as np
+import pydicom
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.pixels import pack_bits
+from pydicom.sequence import Sequence
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from app import storage
+from app.database import DicomFile, Segmentation
+from app.segmentation import (
+    SegmentationError,
+    decode_runs,
+    decode_slice,
+    encode_runs,
+    encode_slice,
+    export_dicom_seg,
+    import_dicom_seg,
+    read_slices,
+    series_slices,
+    write_slices,
+)
+
+ROWS, COLUMNS, SLICES = 8, 8, 4
+
+
+def labelmap(seed):
+    labels = np.random.RandomState(seed).choice([0, 0, 1, 2], size=(ROWS, COLUMNS))
+    return labels.astype(np.uint8)
+
+
+def test_runs_round_trip():
+    labels = labelmap(0)
+    values, lengths = encode_runs(labels)
+    assert lengths.sum() == labels.size
+    assert (values[1:] != values[:-1]).all()
+    assert (decode_runs(values, lengths, ROWS, COLUMNS) == labels).all()
+
+
+def test_runs_must_cover_the_slice():
+    with pytest.raises(SegmentationError):
+        decode_runs([0, 1], [10, 10], ROWS, COLUMNS)
+
+
+def test_slice_round_trip():
+    for labels in (labelmap(1), np.zeros((ROWS, COLUMNS), np.uint8)):
+        assert (decode_slice(encode_slice(labels), ROWS, COLUMNS) == labels).all()
+
+
+@pytest.fixture
+def series(db, people, add_study, tmp_path, monkeypatch):
+    """A CT series of SLICES axial images and a two-segment segmentation over it"""
+    monkeypatch.setattr(storage, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    study = add_study("S1")
+    study.study_uid = generate_uid()
+    series_uid = generate_uid()
+    directory = storage.study_dir(study)
+    os.makedirs(directory)
+    for index in range(SLICES):
+        meta = FileMetaDataset()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        meta.MediaStorageSOPClassUID = CTImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.StudyInstanceUID = study.study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.Modality = "CT"
+        ds.Rows, ds.Columns = ROWS, COLUMNS
+        ds.PixelSpacing = [1, 1]
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.ImagePositionPatient = [0, 0, 2.0 * index]
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 0
+        ds.PixelData = np.full((ROWS, COLUMNS), index, np.uint16).tobytes()
+        path = os.path.join(directory, f"{index}.dcm")
+        ds.save_as(path, enforce_file_format=True)
+        db.add(
+            DicomFile(
+                study=study,
+                series_uid=series_uid,
+                instance_uid=ds.SOPInstanceUID,
+                file_path=path,
+                slice_number=index + 1,
+            )
+        )
+    db.commit()
+
+    instance_uids, rows, columns = series_slices(db, study, series_uid)
+    segmentation = Segmentation(
+        study=study,
+        series_uid=series_uid,
+        created_by=people["radiologist"],
+        label="Liver",
+        segments=json.dumps(
+            [{"number": 1, "label": "Liver"}, {"number": 2, "label": "Lesion"}]
+        ),
+        rows=rows,
+        columns=columns,
+        slice_count=len(instance_uids),
+        instance_uids=json.dumps(instance_uids),
+    )
+    db.add(segmentation)
+    db.flush()
+    labels = {0: labelmap(2), 2: labelmap(3)}
+    write_slices(db, segmentation, labels)
+    db.commit()
+    return study, segmentation, labels
+
+
+def test_seg_export_import_round_trip(db, people, series):
+    study, segmentation, labels = series
+    data = export_dicom_seg(db, segmentation)
+
+    imported = import_dicom_seg(db, study, people["radiologist"].id, data)
+    db.commit()
+
+    assert imported.series_uid == segmentation.series_uid
+    assert imported.instance_uids == segmentation.instance_uids
+    assert [s["number"] for s in json.loads(imported.segments)] == [1, 2]
+    restored = read_slices(imported)
+    assert sorted(restored) == sorted(labels)
+    for index, slice_labels in labels.items():
+        assert (restored[index] == slice_labels).all()
+
+
+def test_seg_import_keeps_the_higher_segment_on_overlap(db, people, series):
+    study, segmentation, labels = series
+    data = export_dicom_seg(db, segmentation)
+    ds = pydicom.dcmread(pydicom.filebase.DicomBytesIO(data))
+    frames = ds.pixel_array.reshape(-1, ROWS, COLUMNS)
+    numbers = [
+        int(item.SegmentIdentificationSequence[0].ReferencedSegmentNumber)
+        for item in ds.PerFrameFunctionalGroupsSequence
+    ]
+    # Segment 1 covers its whole slices and comes after segment 2
+    order = sorted(range(len(numbers)), key=lambda i: -numbers[i])
+    frames = np.stack(
+        [frames[i] if numbers[i] == 2 else np.ones_like(frames[i]) for i in order]
+    )
+    ds.PerFrameFunctionalGroupsSequence = Sequence(
+        [ds.PerFrameFunctionalGroupsSequence[i] for i in order]
+    )
+    ds.PixelData = pack_bits(frames)
+    buffer = pydicom.filebase.DicomBytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+
+    imported = import_dicom_seg(db, study, people["radiologist"].id, buffer.getvalue())
+    db.commit()
+
+    for index, slice_labels in read_slices(imported).items():
+        assert (slice_labels == np.where(labels[index] == 2, 2, 1)).all()
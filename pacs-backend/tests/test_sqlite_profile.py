@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.sqlite_profile import SQLiteWriteQueue, WriteSlotTimeout
+
+
+def test_threads_wait_their_turn():
+    queue = SQLiteWriteQueue(timeout=5)
+    queue.acquire("first")
+    acquired = threading.Event()
+
+    def second():
+        queue.acquire("second")
+        acquired.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not acquired.wait(0.2)
+    assert queue.depth == 1
+    queue.release("first")
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_threads_time_out():
+    queue = SQLiteWriteQueue(timeout=0.1)
+    queue.acquire("first")
+    with pytest.raises(TimeoutError):
+        queue.acquire("second")
+    assert queue.depth == 0
+
+
+def test_event_loop_never_waits():
+    queue = SQLiteWriteQueue(timeout=30)
+    holder = threading.Thread(target=queue.acquire, args=("worker",))
+    holder.start()
+    holder.join()
+
+    async def flush():
+        started = time.monotonic()
+        with pytest.raises(WriteSlotTimeout):
+            queue.acquire("handler")
+        return time.monotonic() - started
+
+    assert asyncio.run(flush()) < 1
+
+    queue.release("worker")
+
+    async def flush_free():
+        queue.acquire("handler")
+
+    asyncio.run(flush_free())
+    queue.release("handler")
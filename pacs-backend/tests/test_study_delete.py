@@ -0,0 +1,46 @@
+from sqlalchemy import func, select
+
+from app.database import Annotation, Segmentation, SegmentationSlice, Study
+
+
+def test_deleting_a_study_removes_its_segmentations(db, people, add_study):
+    study = add_study("S1")
+    segmentation = Segmentation(
+        study=study,
+        series_uid=f"{study.study_uid}.1",
+        created_by=people["radiologist"],
+        label="Liver",
+        rows=4,
+        columns=4,
+        slice_count=2,
+    )
+    segmentation.slices.append(SegmentationSlice(slice_index=0, data=b"x"))
+    db.add(segmentation)
+    db.commit()
+
+    db.delete(study)
+    db.commit()
+
+    assert db.get(Study, "S1") is None
+    assert db.scalar(select(func.count()).select_from(Segmentation)) == 0
+    assert db.scalar(select(func.count()).select_from(SegmentationSlice)) == 0
+
+
+def test_deleting_a_study_removes_its_annotations(db, people, add_study):
+    study = add_study("S1")
+    db.add(
+        Annotation(
+            study=study,
+            user=people["radiologist"],
+            annotation_type="length",
+            annotation_data="{}",
+            client_id="m1",
+        )
+    )
+    db.commit()
+
+    db.delete(study)
+    db.commit()
+
+    assert db.get(Study, "S1") is None
+    assert db.scalar(select(func.count()).select_from(Annotation)) == 0
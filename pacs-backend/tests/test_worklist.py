@@ -0,0 +1,63 @@
+from sqlalchemy import select, true
+
+from app.database import Study, StudyStatus, WorklistEntry
+from app.worklist import COLUMNS, _projection
+
+
+def assert_current(db):
+    """The worklist equals a fresh projection of the studies"""
+    stored = db.execute(
+        select(*[WorklistEntry.__table__.c[name] for name in COLUMNS]).order_by(
+            WorklistEntry.id
+        )
+    ).all()
+    projected = db.execute(_projection(true()).order_by(Study.id)).all()
+    assert [tuple(row) for row in stored] == [tuple(row) for row in projected]
+
+
+def test_rows_follow_study_writes(db, people, add_study, add_file):
+    first = add_study("S1", files=2, priority="urgent")
+    second = add_study("S2", center=1, status=StudyStatus.QUEUED)
+    db.commit()
+    assert_current(db)
+    assert len(db.scalars(select(WorklistEntry)).all()) == 2
+
+    first.status = StudyStatus.ASSIGNED
+    first.radiologist = people["radiologist"]
+    second.priority = "stat"
+    db.commit()
+    assert_current(db)
+
+    # Re-filed, and a file added, which the worklist does not list
+    first.diagnostic_center = people["centers"][1]
+    add_file(first, 5)
+    db.commit()
+    assert_current(db)
+
+    for dicom_file in first.dicom_files:
+        db.delete(dicom_file)
+    db.delete(first)
+    db.commit()
+    assert_current(db)
+    assert db.scalars(select(WorklistEntry.id)).all() == ["S2"]
+
+
+def test_rows_follow_renames(db, people, add_study):
+    study = add_study("S1")
+    study.radiologist = people["radiologist"]
+    db.commit()
+
+    people["patient"].last_name = "Byron"
+    people["technician"].full_name = "Tessa Tech"
+    people["radiologist"].full_name = "Rae Diologist"
+    people["centers"][0].name = "North Campus"
+    db.commit()
+    assert_current(db)
+
+    entry = db.get(WorklistEntry, "S1")
+    assert (
+        entry.patient_name,
+        entry.technician_name,
+        entry.radiologist_name,
+        entry.center_name,
+    ) == ("Ada Byron", "Tessa Tech", "Rae Diologist", "North Campus")